@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#
+# Cache the MBean fields exported by each type of component so that
+# registering a component doesn't require a listGetters() call per bean
+
+import cPickle, os, threading
+
+class BeanSchema(object):
+    "MBean field lists for one type of component from one pDAQ release"
+
+    def __init__(self, compType, release, modTime, fieldDict=None):
+        """
+        compType - component name (e.g. "stringHub")
+        release - pDAQ release name
+        modTime - modification time of the component's jar file
+        fieldDict - dictionary mapping bean names to lists of field names
+        """
+        self.__compType = compType
+        self.__release = release
+        self.__modTime = modTime
+
+        if fieldDict is None:
+            self.__fieldDict = {}
+        else:
+            self.__fieldDict = fieldDict.copy()
+
+        self.__lock = threading.Lock()
+        self.__changed = False
+
+    def __str__(self):
+        return "BeanSchema[%s@%s: %d beans]" % \
+            (self.__compType, self.__release, len(self.__fieldDict))
+
+    def compType(self): return self.__compType
+
+    def fields(self, bean):
+        "Return the list of fields for 'bean', or None if it is unknown"
+        self.__lock.acquire()
+        try:
+            if not self.__fieldDict.has_key(bean):
+                return None
+            return self.__fieldDict[bean][:]
+        finally:
+            self.__lock.release()
+
+    def isChanged(self):
+        return self.__changed
+
+    def markSaved(self):
+        self.__changed = False
+
+    def modTime(self): return self.__modTime
+    def release(self): return self.__release
+
+    def setFields(self, bean, fldList):
+        "Remember the list of fields for 'bean'"
+        self.__lock.acquire()
+        try:
+            self.__fieldDict[bean] = fldList[:]
+            self.__changed = True
+        finally:
+            self.__lock.release()
+
+    def snapshot(self):
+        "Return a copy of the bean->fields dictionary"
+        self.__lock.acquire()
+        try:
+            return self.__fieldDict.copy()
+        finally:
+            self.__lock.release()
+
+class BeanSchemaCache(object):
+    """
+    Shared BeanSchema objects, keyed by component type and release.
+    Schemas are also saved to CACHE_DIR and are discarded when the
+    component's jar file has been modified (as XMLFileCache does for
+    configuration files).
+    """
+    CACHE = {}
+    CACHE_LOCK = threading.Lock()
+
+    "directory where schemas are saved (set to None to disable)"
+    if os.environ.get("HOME") is None:
+        CACHE_DIR = None
+    else:
+        CACHE_DIR = os.path.join(os.environ["HOME"], ".beanSchemas")
+
+    @staticmethod
+    def __jarModTime(compType):
+        """
+        Return the modification time of the component's jar file, or None
+        if the jar file cannot be found
+        """
+        # importing DAQLaunch locates the pDAQ tree and loads the cluster
+        # configuration code, so put it off until a schema is needed
+        from DAQLaunch import ComponentNotFoundInDatabase, RELEASE, \
+            getCompJar, metaDir
+
+        try:
+            jarName = getCompJar(compType)
+        except ComponentNotFoundInDatabase:
+            return None
+
+        for distName in ("pDAQ-%s-dist", "pDAQ-%s-dist.dir"):
+            path = os.path.join(metaDir, "target", distName % RELEASE, "bin",
+                                jarName)
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                continue
+
+        return None
+
+    @classmethod
+    def __path(cls, compType, release):
+        if cls.CACHE_DIR is None:
+            return None
+        return os.path.join(cls.CACHE_DIR, "%s-%s.schema" % (compType, release))
+
+    @classmethod
+    def __read(cls, compType, release, modTime):
+        """
+        Read a saved schema, returning None if it is missing or out of date.
+        If the jar's modification time is unknown, a saved schema can't be
+        checked so it is never used.
+        """
+        if modTime is None:
+            return None
+
+        path = cls.__path(compType, release)
+        if path is None or not os.path.exists(path):
+            return None
+
+        try:
+            fd = open(path, "rb")
+            try:
+                (savedTime, fieldDict) = cPickle.load(fd)
+            finally:
+                fd.close()
+        except:
+            return None
+
+        if savedTime != modTime or type(fieldDict) != dict:
+            return None
+
+        return BeanSchema(compType, release, modTime, fieldDict)
+
+    @classmethod
+    def load(cls, compType, release=None):
+        """
+        Return the shared schema for this component type and release
+        (defaults to the current release)
+        """
+        if release is None:
+            from DAQLaunch import RELEASE
+            release = RELEASE
+
+        modTime = cls.__jarModTime(compType)
+        key = (compType, release)
+
+        cls.CACHE_LOCK.acquire()
+        try:
+            if cls.CACHE.has_key(key):
+                schema = cls.CACHE[key]
+                if schema.modTime() == modTime:
+                    return schema
+
+            schema = cls.__read(compType, release, modTime)
+            if schema is None:
+                schema = BeanSchema(compType, release, modTime)
+            cls.CACHE[key] = schema
+            return schema
+        finally:
+            cls.CACHE_LOCK.release()
+
+    @classmethod
+    def save(cls, schema):
+        """
+        Write the schema to CACHE_DIR if anything has been added to it.
+        Schemas for components whose jar file wasn't found are not saved
+        since they couldn't be checked when they were read back.
+        """
+        if not schema.isChanged() or schema.modTime() is None:
+            return
+
+        path = cls.__path(schema.compType(), schema.release())
+        if path is None:
+            return
+
+        tmpPath = "%s.%d.%s" % (path, os.getpid(),
+                                threading.currentThread().getName())
+        try:
+            if not os.path.isdir(cls.CACHE_DIR):
+                os.makedirs(cls.CACHE_DIR)
+
+            fd = open(tmpPath, "wb")
+            try:
+                cPickle.dump((schema.modTime(), schema.snapshot()), fd,
+                             cPickle.HIGHEST_PROTOCOL)
+            finally:
+                fd.close()
+            os.rename(tmpPath, path)
+            schema.markSaved()
+        except (IOError, OSError):
+            # the cache is an optimization, so failures are not fatal
+            if os.path.exists(tmpPath):
+                try:
+                    os.remove(tmpPath)
+                except OSError:
+                    pass
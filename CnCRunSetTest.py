@@ -4,6 +4,7 @@ import shutil, tempfile, time, unittest
 
 from ActiveDOMsTask import ActiveDOMsTask
 from CnCServer import CnCServer, CnCServerException
+from DAQClient import DAQClient
 from DAQConst import DAQPort
 from DAQMocks import MockClusterConfig, MockIntervalTimer, MockLogger, \
     MockRunConfigFile, SocketReader
@@ -48,6 +49,7 @@ class MockComponent(object):
         self.__state = "idle"
         self.__order = None
         self.__beanData = {}
+        self.__id = DAQClient.ID.next()
 
     def __str__(self):
         if self.__num == 0 and not self.isSource():
@@ -75,6 +77,10 @@ class MockComponent(object):
 
     def fullName(self): return "%s#%s" % (self.__name, self.__num)
 
+    def getBeanDictionary(self):
+        # force MonitorThread to fall back to per-bean requests
+        return None
+
     def getBeanFields(self, beanName):
         if not self.__beanData.has_key(beanName):
             raise ValueError("Unknown %s bean \"%s\"" % (str(self), beanName))
@@ -98,6 +104,8 @@ class MockComponent(object):
 
         return valMap
 
+    def id(self): return self.__id
+
     def getSingleBeanField(self, beanName, fieldName):
         if not self.__beanData.has_key(beanName):
             raise ValueError("Unknown %s bean \"%s\"" % (str(self), beanName))
@@ -118,6 +126,8 @@ class MockComponent(object):
     def num(self): return self.__num
     def order(self): return self.__order
 
+    def pushesState(self): return False
+
     def reset(self):
         self.__state = "idle"
 
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-import Daemon, datetime, errno, optparse, os, signal, socket, sys, threading, \
+import Daemon, errno, optparse, os, signal, socket, sys, threading, \
     time
 
 from CnCLogger import CnCLogger
@@ -10,12 +10,11 @@ from DAQConfig import DAQConfigParser, XMLFileNotFound
 from DAQConst import DAQPort
 from DAQLive import DAQLive
 from DAQLog import DAQLog, LogSocketServer
-from DAQRPC import RPCServer
+from DAQRPC import PooledRPCServer
 from Process import processList, findProcess
 from RunSet import RunSet
 from RunSetState import RunSetState
-from SocketServer import ThreadingMixIn
-from utils import ip
+from utils import clock, ip
 
 from exc_string import exc_string, set_exc_string_encoding
 set_exc_string_encoding("ascii")
@@ -38,10 +37,39 @@ class CnCServerException(Exception): pass
 class DAQPool(object):
     "Pool of DAQClients and RunSets"
 
+    "seconds between 'Waiting for' messages while collecting components"
+    WAIT_LOG_SECS = 5
+
+    "seconds each pooled component has to answer a liveness check"
+    MONITOR_DEADLINE_SECS = 5
+    "liveness sweep period while components are registering or flapping"
+    MONITOR_MIN_SECS = 1
+    "liveness sweep period once the pool is stable"
+    MONITOR_MAX_SECS = 16
+
     def __init__(self, defaultDebugBits=None):
         "Create an empty pool"
+        # map (name, num) to a list of components (usually just one)
         self.__pool = {}
         self.__poolLock = threading.RLock()
+        self.__poolCond = threading.Condition(self.__poolLock)
+        # incremented whenever a component is added to or removed from
+        # the pool, so the liveness sweep can tell when the pool changes
+        self.__poolGeneration = 0
+        # map component ID to every registered component, whether it's
+        # in the pool or in a runset
+        self.__compIds = {}
+
+        # liveness sweep state
+        self.__monitorLock = threading.Lock()
+        self.__monitorSecs = self.MONITOR_MIN_SECS
+        self.__monitorGeneration = None
+        self.__monitorStats = { "sweeps" : 0, "sweepSecs" : 0.0,
+                                "checked" : 0, "alive" : 0, "missing" : 0,
+                                "dead" : 0, "hung" : 0,
+                                "periodSecs" : self.__monitorSecs }
+        # components whose liveness check has not yet returned
+        self.__hungMonitor = {}
 
         self.__sets = []
         self.__setsLock = threading.RLock()
@@ -52,9 +80,13 @@ class DAQPool(object):
 
     def __addInternal(self, comp):
         "This method assumes that self.__poolLock has already been acquired"
-        if not self.__pool.has_key(comp.name()):
-            self.__pool[comp.name()] = []
-        self.__pool[comp.name()].append(comp)
+        key = (comp.name(), comp.num())
+        if not self.__pool.has_key(key):
+            self.__pool[key] = []
+        self.__pool[key].append(comp)
+        self.__compIds[comp.id()] = comp
+        self.__poolGeneration += 1
+        self.__poolCond.notifyAll()
 
     def __addRunset(self, runSet):
         self.__setsLock.acquire()
@@ -84,43 +116,48 @@ class DAQPool(object):
                     num = 0
             needed.append(ComponentName(name, num))
 
-        tstart = datetime.datetime.now()
-        while len(needed) > 0:
-            waitList = []
-
-            self.__poolLock.acquire()
+        endSecs = clock.monotonic() + timeout
+        logSecs = 0
+        while True:
+            self.__poolCond.acquire()
             try:
-                for cn in needed:
-                    found = False
-                    if self.__pool.has_key(cn.name()) and \
-                            len(self.__pool[cn.name()]) > 0:
-                        for comp in self.__pool[cn.name()]:
-                            if comp.num() == cn.num():
-                                self.__pool[cn.name()].remove(comp)
-                                if len(self.__pool[cn.name()]) == 0:
-                                    del self.__pool[cn.name()]
-                                compList.append(comp)
-                                found = True
-                                break
-
-                    if not found:
-                        waitList.append(cn)
-            finally:
-                self.__poolLock.release()
+                needed = self.__takeComponents(needed, compList)
 
-            needed = waitList
+                # wait until add() returns a component to the pool
+                now = clock.monotonic()
+                if len(needed) > 0 and now < endSecs and now < logSecs:
+                    self.__poolCond.wait(min(endSecs, logSecs) - now)
+                    needed = self.__takeComponents(needed, compList)
+            finally:
+                self.__poolCond.release()
 
-            if len(needed) > 0:
-                if datetime.datetime.now()-tstart >= \
-                        datetime.timedelta(seconds=timeout):
-                    break
+            now = clock.monotonic()
+            if len(needed) == 0 or now >= endSecs:
+                break
 
+            if now >= logSecs:
                 logger.info("Waiting for " + str(needed))
-                time.sleep(5)
+                logSecs = now + self.WAIT_LOG_SECS
 
-        if len(waitList) == 0:
-            waitList = None
-        return waitList
+        if len(needed) == 0:
+            return None
+        return needed
+
+    def __forgetComponents(self, compList):
+        """
+        Drop the ID index entries for components in 'compList' which were
+        discarded rather than returned to the pool
+        """
+        self.__poolLock.acquire()
+        try:
+            for c in compList:
+                key = (c.name(), c.num())
+                if self.__pool.has_key(key) and c in self.__pool[key]:
+                    continue
+                if self.__compIds.get(c.id()) == c:
+                    del self.__compIds[c.id()]
+        finally:
+            self.__poolLock.release()
 
     def __removeRunset(self, runSet):
         """
@@ -148,6 +185,26 @@ class DAQPool(object):
         finally:
             self.__poolLock.release()
 
+    def __takeComponents(self, needed, compList):
+        """
+        Move the ComponentNames in 'needed' from the pool to 'compList' and
+        return the list of components which are not in the pool.
+        This method assumes that self.__poolLock has already been acquired
+        """
+        waitList = []
+        for cn in needed:
+            key = (cn.name(), cn.num())
+            if not self.__pool.has_key(key):
+                waitList.append(cn)
+                continue
+
+            bin = self.__pool[key]
+            compList.append(bin.pop(0))
+            if len(bin) == 0:
+                del self.__pool[key]
+
+        return waitList
+
     def add(self, comp):
         "Add the component to the config server's pool"
         self.__poolLock.acquire()
@@ -160,9 +217,8 @@ class DAQPool(object):
         compList = []
         self.__poolLock.acquire()
         try:
-            for k in self.__pool:
-                for c in self.__pool[k]:
-                    compList.append(c)
+            for bin in self.__pool.values():
+                compList += bin
         finally:
             self.__poolLock.release()
 
@@ -186,6 +242,39 @@ class DAQPool(object):
 
         return runset
 
+    def findComponents(self, idList, includeRunsets=True):
+        """
+        Return the registered components whose IDs are in 'idList', with
+        the pooled components first.  Runset components are only
+        included if 'includeRunsets' is True, and unknown IDs are ignored.
+        """
+        setComps = set()
+        if includeRunsets:
+            self.__setsLock.acquire()
+            try:
+                for rs in self.__sets:
+                    setComps.update(rs.components())
+            finally:
+                self.__setsLock.release()
+
+        poolList = []
+        setList = []
+        self.__poolLock.acquire()
+        try:
+            for cid in idList:
+                if not self.__compIds.has_key(cid):
+                    continue
+                c = self.__compIds[cid]
+                key = (c.name(), c.num())
+                if self.__pool.has_key(key) and c in self.__pool[key]:
+                    poolList.append(c)
+                elif c in setComps:
+                    setList.append(c)
+        finally:
+            self.__poolLock.release()
+
+        return poolList + setList
+
     def getRunsetsInErrorState(self):
         problems = []
         for rs in self.__sets:
@@ -222,6 +311,7 @@ class DAQPool(object):
                                      " run configuration \"%s\"" % runConfig)
 
         compList = []
+        collectStart = clock.monotonic()
         try:
             waitList = self.__collectComponents(nameList, compList, logger,
                                                 timeout)
@@ -231,7 +321,10 @@ class DAQPool(object):
             self.__returnComponents(compList, logger)
             raise
 
+        collectSecs = clock.monotonic() - collectStart
+
         setAdded = False
+        createStart = clock.monotonic()
         try:
             try:
                 runSet = self.createRunset(runConfig, compList, logger)
@@ -250,6 +343,10 @@ class DAQPool(object):
             if self.__defaultDebugBits is not None:
                 runSet.setDebugBits(self.__defaultDebugBits)
 
+            timer = runSet.phaseTimer()
+            timer.add("collectComponents", collectSecs)
+            timer.add("createRunset", clock.monotonic() - createStart)
+
             try:
                 connMap = runSet.buildConnectionMap()
                 runSet.connect(connMap, logger)
@@ -270,31 +367,127 @@ class DAQPool(object):
         return runSet
 
     def monitorClients(self, logger=None):
-        "check that all components in the pool are still alive"
+        """
+        Check that all components in the pool are still alive and return
+        the number which answered.  All components are checked in
+        parallel; a component which doesn't answer within
+        MONITOR_DEADLINE_SECS is skipped until its check finishes.
+        """
+        startSecs = clock.monotonic()
+
+        self.__poolLock.acquire()
+        try:
+            compList = []
+            for bin in self.__pool.values():
+                compList += bin
+            generation = self.__poolGeneration
+        finally:
+            self.__poolLock.release()
+
+        # don't pile more checks onto components which are still hung
+        hung = 0
+        self.__monitorLock.acquire()
+        try:
+            for c in self.__hungMonitor.keys():
+                if self.__hungMonitor[c].results()[c] == \
+                        ComponentOperation.RESULT_HANGING:
+                    hung += 1
+                    if c in compList:
+                        compList.remove(c)
+                else:
+                    del self.__hungMonitor[c]
+        finally:
+            self.__monitorLock.release()
+
+        tGroup = ComponentOperationGroup(ComponentOperation.MONITOR,
+                                         ComponentOperationGroup.MONITOR_POOL)
+        for c in compList:
+            tGroup.start(c, logger, ())
+        tGroup.wait(waitSecs=self.MONITOR_DEADLINE_SECS)
+        states = tGroup.results()
+
         count = 0
+        missing = 0
+        deadList = []
+        hungList = []
+        for c in compList:
+            state = states[c]
+            RunSet.STATE_CACHE.record(c, state)
+            if state == ComponentOperation.RESULT_HANGING:
+                hungList.append(c)
+            elif state == DAQClient.STATE_DEAD:
+                deadList.append(c)
+            elif state == DAQClient.STATE_MISSING or \
+                    state == ComponentOperation.RESULT_ERROR:
+                missing += 1
+            else:
+                count += 1
 
-        for k in self.__pool.keys():
+        for c in deadList:
+            self.remove(c)
             try:
-                bin = self.__pool[k]
-            except KeyError:
-                # bin may have been removed by daemon
-                continue
+                c.close()
+            except:
+                if logger is not None:
+                    logger.error("Could not close %s: %s" %
+                                 (c.fullName(), exc_string()))
+
+        # sweep often while the pool is changing or components are
+        # flapping, and back off once everything is stable
+        self.__monitorLock.acquire()
+        try:
+            for c in hungList:
+                self.__hungMonitor[c] = tGroup
+            hung += len(hungList)
 
-            for c in bin:
-                state = c.monitor()
-                if state == DAQClient.STATE_DEAD:
-                    self.remove(c)
-                    try:
-                        c.close()
-                    except:
-                        if logger is not None:
-                            logger.error("Could not close %s: %s" %
-                                         (c.fullName(), exc_string()))
-                elif state != DAQClient.STATE_MISSING:
-                    count += 1
+            if generation != self.__monitorGeneration or missing > 0 or \
+                    hung > 0 or len(deadList) > 0:
+                self.__monitorSecs = self.MONITOR_MIN_SECS
+            else:
+                self.__monitorSecs = min(self.__monitorSecs * 2,
+                                         self.MONITOR_MAX_SECS)
+            self.__monitorGeneration = generation
+
+            self.__monitorStats = \
+                { "sweeps" : self.__monitorStats["sweeps"] + 1,
+                  "sweepSecs" : clock.monotonic() - startSecs,
+                  "checked" : len(compList), "alive" : count,
+                  "missing" : missing, "dead" : len(deadList), "hung" : hung,
+                  "periodSecs" : self.__monitorSecs }
+        finally:
+            self.__monitorLock.release()
 
         return count
 
+    def monitorPeriod(self):
+        "Return the number of seconds until the next liveness sweep is due"
+        self.__poolLock.acquire()
+        try:
+            changed = self.__poolGeneration != self.__monitorGeneration
+        finally:
+            self.__poolLock.release()
+
+        if changed:
+            return self.MONITOR_MIN_SECS
+
+        self.__monitorLock.acquire()
+        try:
+            return self.__monitorSecs
+        finally:
+            self.__monitorLock.release()
+
+    def monitorStats(self):
+        """
+        Return a dictionary describing the most recent liveness sweep
+        (duration, number of components checked, alive, missing, dead
+        and hung) and the current sweep period
+        """
+        self.__monitorLock.acquire()
+        try:
+            return self.__monitorStats.copy()
+        finally:
+            self.__monitorLock.release()
+
     def numActiveSets(self):
         num = 0
         self.__setsLock.acquire()
@@ -312,8 +505,8 @@ class DAQPool(object):
 
         self.__poolLock.acquire()
         try:
-            for binName in self.__pool:
-                tot += len(self.__pool[binName])
+            for bin in self.__pool.values():
+                tot += len(bin)
         finally:
             self.__poolLock.release()
 
@@ -329,17 +522,73 @@ class DAQPool(object):
         "Remove a component from the pool"
         self.__poolLock.acquire()
         try:
-            if self.__pool.has_key(comp.name()):
-                self.__pool[comp.name()].remove(comp)
-                if len(self.__pool[comp.name()]) == 0:
-                    del self.__pool[comp.name()]
+            key = (comp.name(), comp.num())
+            if self.__pool.has_key(key) and comp in self.__pool[key]:
+                self.__pool[key].remove(comp)
+                if len(self.__pool[key]) == 0:
+                    del self.__pool[key]
+                if self.__compIds.get(comp.id()) == comp:
+                    del self.__compIds[comp.id()]
+                self.__poolGeneration += 1
         finally:
             self.__poolLock.release()
 
         return comp
 
+    def repairRunset(self, rs, logger, timeout=60, verbose=False,
+                     killWith9=False, eventCheck=False):
+        """
+        Restart only the runset's failed components, then reconnect and
+        reconfigure the runset.  Return False if it could not be repaired.
+        """
+        try:
+            badComps = self.repairRunsetComponents(rs, verbose=verbose,
+                                                   killWith9=killWith9,
+                                                   eventCheck=eventCheck)
+        except:
+            logger.error("Cannot restart failed components in %s: %s" %
+                         (rs, exc_string()))
+            return False
+
+        self.__forgetComponents(badComps)
+
+        compList = []
+        if len(badComps) > 0:
+            nameList = []
+            for c in badComps:
+                nameList.append(c.fullName())
+
+            try:
+                waitList = self.__collectComponents(nameList, compList, logger,
+                                                    timeout)
+            except:
+                waitList = nameList
+                logger.error("Cannot collect restarted components: %s" %
+                             exc_string())
+
+            if waitList is not None:
+                logger.error("Cannot repair %s: still waiting for %s" %
+                             (rs, waitList))
+                self.__returnComponents(compList, logger)
+                return False
+
+        try:
+            rs.replaceComponents(badComps, compList, logger)
+        except:
+            logger.error("Cannot repair %s: %s" % (rs, exc_string()))
+            return False
+
+        return True
+
+    def repairRunsetComponents(self, rs, verbose=False, killWith9=True,
+                               eventCheck=False):
+        "Placeholder for subclass method"
+        raise CnCServerException("Unimplemented for %s" % type(self))
+
     def restartRunset(self, rs, logger, verbose=False, killWith9=False,
                       eventCheck=False):
+        oldComps = rs.components()
+
         try:
             self.__removeRunset(rs)
         except ValueError:
@@ -355,6 +604,7 @@ class DAQPool(object):
                          (rs, len(self.__sets), self.__sets, exc_string()))
 
         rs.destroy(ignoreComponents=True)
+        self.__forgetComponents(oldComps)
 
     def restartRunsetComponents(self, rs, verbose=False, killWith9=True,
                                 eventCheck=False):
@@ -379,11 +629,13 @@ class DAQPool(object):
 
         savedEx = None
         for rs in removed:
+            oldComps = rs.components()
             try:
                 self.returnRunsetComponents(rs)
                 rs.destroy()
             except Exception, ex:
                 savedEx = ex
+            self.__forgetComponents(oldComps)
 
         if savedEx is not None:
             raise savedEx
@@ -398,6 +650,8 @@ class DAQPool(object):
             logger.error("Cannot remove %s (#%d available - %s)" %
                          (rs, len(self.__sets), self.__sets))
 
+        oldComps = rs.components()
+
         savedEx = None
         try:
             self.returnRunsetComponents(rs)
@@ -410,6 +664,8 @@ class DAQPool(object):
             if savedEx is None:
                 savedEx = ex
 
+        self.__forgetComponents(oldComps)
+
         if savedEx is not None:
             raise savedEx
 
@@ -421,9 +677,6 @@ class DAQPool(object):
     def runset(self, num):
         return self.__sets[num]
 
-class ThreadedRPCServer(ThreadingMixIn, RPCServer):
-    pass
-
 class Connector(object):
     "Component connector"
 
@@ -498,7 +751,8 @@ class CnCServer(DAQPool):
                  dashDir=None, defaultLogDir=None, runConfigDir=None,
                  spadeDir=None, logIP=None, logPort=None, liveIP=None,
                  livePort=None, restartOnError=True, forceRestart=True,
-                 testOnly=False, quiet=False, defaultRunsetDebug=None):
+                 testOnly=False, quiet=False, defaultRunsetDebug=None,
+                 repairOnError=False):
         "Create a DAQ command and configuration server"
         self.__name = name
         self.__versionInfo = get_version_info(SVN_ID)
@@ -514,8 +768,14 @@ class CnCServer(DAQPool):
 
         self.__restartOnError = restartOnError
         self.__forceRestart = forceRestart
+        self.__repairOnError = repairOnError
         self.__quiet = quiet
 
+        # configured runset kept for reuse by the next run (only used
+        # if components aren't forced to restart after every run)
+        self.__warmRunset = None
+        self.__warmLock = threading.Lock()
+
         self.__monitoring = False
 
         self.__live = None
@@ -530,6 +790,10 @@ class CnCServer(DAQPool):
 
         self.__log = self.createCnCLogger(quiet=(testOnly or quiet))
 
+        # report stalled operation pools
+        ComponentOperationGroup.POOL.setLogger(self.__log)
+        ComponentOperationGroup.MONITOR_POOL.setLogger(self.__log)
+
         self.__logServer = \
             self.openLogServer(DAQPort.CATCHALL, self.__defaultLogDir)
         self.__logServer.startServing()
@@ -545,11 +809,10 @@ class CnCServer(DAQPool):
         else:
             while True:
                 try:
-                    # CnCServer needs to be made thread-safe
-                    # before we can thread the XML-RPC server
+                    # a bounded pool of handlers keeps a burst of
+                    # registrations from starting a thread per request
                     #
-                    self.__server = ThreadedRPCServer(DAQPort.CNCSERVER)
-                    #self.__server = RPCServer(DAQPort.CNCSERVER)
+                    self.__server = PooledRPCServer(DAQPort.CNCSERVER)
                     break
                 except socket.error, e:
                     self.__log.error("Couldn't create server socket: %s" % e)
@@ -564,6 +827,8 @@ class CnCServer(DAQPool):
             self.__server.register_function(self.rpc_component_list_bean_fields)
             self.__server.register_function(self.rpc_component_list_dicts)
             self.__server.register_function(self.rpc_component_register)
+            self.__server.register_function(self.rpc_component_register_batch)
+            self.__server.register_function(self.rpc_component_state_changed)
             self.__server.register_function(self.rpc_cycle_live)
             self.__server.register_function(self.rpc_end_all)
             self.__server.register_function(self.rpc_ping)
@@ -574,6 +839,7 @@ class CnCServer(DAQPool):
             self.__server.register_function(self.rpc_runset_count)
             self.__server.register_function(self.rpc_runset_debug)
             self.__server.register_function(self.rpc_runset_events)
+            self.__server.register_function(self.rpc_runset_finalize_jobs)
             self.__server.register_function(self.rpc_runset_list)
             self.__server.register_function(self.rpc_runset_list_ids)
             self.__server.register_function(self.rpc_runset_make)
@@ -582,6 +848,7 @@ class CnCServer(DAQPool):
             self.__server.register_function(self.rpc_runset_state)
             self.__server.register_function(self.rpc_runset_stop_run)
             self.__server.register_function(self.rpc_runset_subrun)
+            self.__server.register_function(self.rpc_server_stats)
             self.__server.register_function(self.rpc_version)
 
         if sys.version_info > (2, 3):
@@ -612,64 +879,224 @@ class CnCServer(DAQPool):
 
         return count
 
-    def __getComponents(self, idList, getAll):
-        compList = []
+    def __findComponent(self, compId):
+        "Return the pooled component with ID 'compId'"
+        for c in self.findComponents([compId], includeRunsets=False):
+            return c
+        raise CnCServerException("Unknown component #%d" % compId)
 
+    def __getComponents(self, idList, getAll):
         if idList is None or len(idList) == 0:
-            compList += self.components()
+            compList = self.components()
         else:
-            for c in self.components():
-                for i in [j for j,cid in enumerate(idList) if cid == c.id()]:
-                    compList.append(c)
-                    del idList[i]
-                    break
+            # runset components are added below if getAll is True
+            compList = self.findComponents(idList, includeRunsets=not getAll)
 
-        if getAll or (idList is not None and len(idList) > 0):
+        if getAll:
             for rsid in self.listRunsetIDs():
                 rs = self.findRunset(rsid)
-                if getAll:
+                if rs is not None:
                     compList += rs.components()
-                else:
-                    for c in rs.components():
-                        for i in [j for j,cid in enumerate(idList)
-                                  if cid == c.id()]:
-                            compList.append(c)
-                            del idList[i]
-                            break
-                    if len(idList) == 0:
-                        break
 
         return compList
 
-    def __listComponentDicts(self, compList):
-        slst = []
+    def __validateComponent(self, name, num, connArray):
+        """
+        Check a component's registration data and return its list of
+        Connectors.  Raise CnCServerException if anything is invalid.
+        """
+        if type(name) != str or len(name) == 0:
+            raise CnCServerException("Bad component name (should be a string)")
+        if type(num) != int:
+            raise CnCServerException("Bad component number" +
+                                     " (should be an integer)")
 
-        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
-        for c in compList:
-            tGroup.start(c, self.__log, ())
-        tGroup.wait()
-        states = tGroup.results()
+        connectors = []
+        for n in range(len(connArray)):
+            d = connArray[n]
+            if type(d) != tuple and type(d) != list:
+                errMsg = "Bad %s#%d connector#%d \"%s\"%s" % \
+                    (name, num, n, str(d), str(type(d)))
+                self.__log.info(errMsg)
+                raise CnCServerException(errMsg)
+            if len(d) != 3:
+                errMsg = ("Bad %s#%d connector#%d %s (should have 3" +
+                          " elements)") % (name, num, n, str(d))
+                self.__log.info(errMsg)
+                raise CnCServerException(errMsg)
+            if type(d[0]) != str or len(d[0]) == 0:
+                errMsg = ("Bad %s#%d connector#%d %s (first element should" +
+                          " be name)") % (name, num, n, str(d))
+                self.__log.info(errMsg)
+                raise CnCServerException(errMsg)
+            if type(d[1]) != str or len(d[1]) != 1:
+                errMsg = ("Bad %s#%d connector#%d %s (second element should" +
+                          " be descrChar)") % (name, num, n, str(d))
+                self.__log.info(errMsg)
+                raise CnCServerException(errMsg)
+            if type(d[2]) != int:
+                errMsg = ("Bad %s#%d connector#%d %s (third element should" +
+                          " be int)") % (name, num, n, str(d))
+                self.__log.info(errMsg)
+                raise CnCServerException(errMsg)
+            connectors.append(Connector(d[0], d[1], d[2]))
+
+        return connectors
+
+    def __listComponentDicts(self, compList, useCache=False):
+        """
+        Return a list of component dictionaries which include each
+        component's state.  If 'useCache' is True, the most recently seen
+        state is used along with its age in seconds ("stateAge"), and only
+        components with no cached state are queried.  Otherwise states
+        may be up to RunSet.STATE_MAX_AGE_SECS old.
+        """
+        cached = {}
+        queryList = []
         for c in compList:
-            if states.has_key(c):
-                stateStr = str(states[c])
+            entry = None
+            if useCache:
+                entry = RunSet.STATE_CACHE.get(c)
+            if entry is not None:
+                cached[c] = entry
             else:
-                stateStr = DAQClient.STATE_DEAD
+                queryList.append(c)
 
+        states = RunSet.STATE_CACHE.states(queryList,
+                                           RunSet.STATE_MAX_AGE_SECS,
+                                           self.__log)
+
+        slst = []
+        for c in compList:
             cDict = c.map()
-            cDict["state"] = stateStr
+            if cached.has_key(c):
+                (cDict["state"], cDict["stateAge"]) = cached[c]
+            else:
+                if states.has_key(c):
+                    stateStr = states[c]
+                else:
+                    stateStr = DAQClient.STATE_DEAD
+
+                cDict["state"] = stateStr
+                if useCache:
+                    entry = RunSet.STATE_CACHE.get(c)
+                    if entry is None:
+                        cDict["stateAge"] = 0.0
+                    else:
+                        cDict["stateAge"] = entry[1]
 
             slst.append(cDict)
 
         return slst
 
-    def breakRunset(self, runSet):
+    def __logAddresses(self):
+        "Return the (logIP, logPort, liveIP, livePort) sent to new components"
+        logIP = ip.convertLocalhostToIpAddr(self.__log.logHost())
+
+        logPort = self.__log.logPort()
+        if logPort is None:
+            if self.__logServer is not None:
+                logPort = self.__logServer.port()
+            else:
+                logIP = ""
+                logPort = 0
+
+        liveIP = ip.convertLocalhostToIpAddr(self.__log.liveHost())
+
+        livePort = self.__log.livePort()
+        if livePort is None:
+            liveIP = ""
+            livePort = 0
+
+        return (logIP, logPort, liveIP, livePort)
+
+    def __registrationData(self, client, logAddrs):
+        "Return the dictionary sent back to a newly registered component"
+        (logIP, logPort, liveIP, livePort) = logAddrs
+        return { "id" : client.id(),
+                 "logIP" : logIP,
+                 "logPort" : logPort,
+                 "liveIP" : liveIP,
+                 "livePort" : livePort,
+                 "serverId" : self.__id }
+
+    def __takeWarmRunset(self, runConfig, strict):
+        """
+        Return the runset kept after the previous run if it can be reused
+        for 'runConfig', otherwise break it up and return None
+        """
+        self.__warmLock.acquire()
+        try:
+            runSet = self.__warmRunset
+            self.__warmRunset = None
+        finally:
+            self.__warmLock.release()
+
+        if runSet is None or runSet.isDestroyed():
+            return None
+
+        # XMLFileCache returns the same object until the file is modified
+        try:
+            cfg = DAQConfigParser.load(runConfig, self.__runConfigDir, strict)
+        except:
+            cfg = None
+
+        reason = None
+        if cfg is None or cfg is not runSet.runConfig():
+            reason = "run configuration changed"
+        elif not runSet.isReady():
+            reason = "runset is %s" % runSet.state()
+        else:
+            states = runSet.status()
+            for c in states:
+                if states[c] != RunSetState.READY:
+                    reason = "%s is %s" % (c.fullName(), states[c])
+                    break
+
+        if reason is None:
+            self.__log.info("Reusing %s for \"%s\"" % (runSet, runConfig))
+            return runSet
+
+        self.__log.info("Rebuilding %s: %s" % (runSet, reason))
+        self.breakRunset(runSet)
+        return None
+
+    def breakRunset(self, runSet, keepWarm=False):
+        """
+        Stop the runset (if necessary) and return its components to the pool.
+        If 'keepWarm' is True and the run stopped cleanly, the configured
+        runset is instead kept so makeRunsetFromRunConfig() can reuse it
+        for the next run if the run configuration is unchanged.
+        """
+        self.__warmLock.acquire()
+        try:
+            if self.__warmRunset == runSet:
+                self.__warmRunset = None
+        finally:
+            self.__warmLock.release()
+
         hadError = False
+        stopFailed = False
         if not runSet.isReady():
             try:
                 hadError = runSet.stopRun()
             except:
                 self.__log.error("While breaking %s: %s" %
                                  (runSet, exc_string()))
+                stopFailed = True
+
+        if keepWarm and not self.__forceRestart and not hadError and \
+               not stopFailed and runSet.isReady():
+            self.__warmLock.acquire()
+            try:
+                oldSet = self.__warmRunset
+                self.__warmRunset = runSet
+            finally:
+                self.__warmLock.release()
+
+            if oldSet is not None:
+                self.breakRunset(oldSet)
+            return
 
         try:
             if self.__forceRestart or (hadError and self.__restartOnError):
@@ -704,10 +1131,11 @@ class CnCServer(DAQPool):
 
         return True
 
-    def createClient(self, name, num, host, port, mbeanPort, connectors):
+    def createClient(self, name, num, host, port, mbeanPort, connectors,
+                     deferMBean=False):
         "overrideable method used for testing"
         return DAQClient(name, num, host, port, mbeanPort, connectors,
-                         self.__quiet)
+                         self.__quiet, deferMBean)
 
     def createCnCLogger(self, quiet):
         return CnCLogger(quiet=quiet)
@@ -730,6 +1158,10 @@ class CnCServer(DAQPool):
 
     def makeRunsetFromRunConfig(self, runConfig, timeout=REGISTRATION_TIMEOUT,
                                 strict=True):
+        runSet = self.__takeWarmRunset(runConfig, strict)
+        if runSet is not None:
+            return runSet
+
         try:
             runSet = self.makeRunset(self.__runConfigDir, runConfig, timeout,
                                      self.__log,
@@ -746,23 +1178,33 @@ class CnCServer(DAQPool):
         "Monitor components to ensure they're still alive"
         new = True
         lastCount = 0
+        lastSweep = None
         self.__monitoring = True
         while self.__monitoring:
-            try:
-                count = self.monitorClients(self.__log)
-            except:
-                self.__log.error("Monitoring clients: " + exc_string())
-                count = lastCount
+            now = clock.monotonic()
+            if lastSweep is None or now - lastSweep >= self.monitorPeriod():
+                lastSweep = now
+                try:
+                    count = self.monitorClients(self.__log)
+                except:
+                    self.__log.error("Monitoring clients: " + exc_string())
+                    count = lastCount
 
-            new = (lastCount != count)
-            if new and not self.__quiet:
-                print >>sys.stderr, "%d bins, %d comps" % \
-                    (self.numUnused(), count)
+                new = (lastCount != count)
+                if new and not self.__quiet:
+                    print >>sys.stderr, "%d bins, %d comps" % \
+                        (self.numUnused(), count)
 
-            lastCount = count
+                lastCount = count
 
             problems = self.getRunsetsInErrorState()
             for rs in problems:
+                if self.__repairOnError:
+                    self.__log.error("Repairing runset#%d (state=%s)" %
+                                     (rs.id(), rs.state()))
+                    if self.repairRunset(rs, self.__log):
+                        continue
+
                 self.__log.error("Returning runset#%d (state=%s)" %
                                  (rs.id(), rs.state()))
                 try:
@@ -783,6 +1225,15 @@ class CnCServer(DAQPool):
         logName = os.path.join(logDir, "catchall.log")
         return LogSocketServer(port, "CnCServer", logName, quiet=self.__quiet)
 
+    def repairRunsetComponents(self, rs, verbose=False, killWith9=True,
+                               eventCheck=False):
+        return rs.restartFailedComponents(self.getClusterConfig(),
+                                          self.__runConfigDir, self.__dashDir,
+                                          self.__log.logPort(),
+                                          self.__log.livePort(),
+                                          verbose=verbose, killWith9=killWith9,
+                                          eventCheck=eventCheck)
+
     def restartRunsetComponents(self, rs, verbose=False, killWith9=True,
                                 eventCheck=False):
         rs.restartAllComponents(self.getClusterConfig(), self.__runConfigDir,
@@ -830,10 +1281,7 @@ class CnCServer(DAQPool):
         return self.numComponents()
 
     def rpc_component_get_bean_field(self, compId, bean, field):
-        for c in self.components():
-            if c.id() == compId:
-                return c.getSingleBeanField(bean, field)
-        raise CnCServerException("Unknown component #%d" % compId)
+        return self.__findComponent(compId).getSingleBeanField(bean, field)
 
     def rpc_component_list(self, includeRunsetComponents=False):
         "return dictionary of component names -> IDs"
@@ -850,60 +1298,25 @@ class CnCServer(DAQPool):
         return idDict
 
     def rpc_component_list_beans(self, compId):
-        for c in self.components():
-            if c.id() == compId:
-                return c.getBeanNames()
-        raise CnCServerException("Unknown component #%d" % compId)
+        return self.__findComponent(compId).getBeanNames()
 
     def rpc_component_list_bean_fields(self, compId, bean):
-        for c in self.components():
-            if c.id() == compId:
-                return c.getBeanFields(bean)
-        raise CnCServerException("Unknown component #%d" % compId)
+        return self.__findComponent(compId).getBeanFields(bean)
 
-    def rpc_component_list_dicts(self, idList=None, getAll=True):
-        "list unused components"
-        return self.__listComponentDicts(self.__getComponents(idList, getAll))
+    def rpc_component_list_dicts(self, idList=None, getAll=True,
+                                 useCache=False):
+        """
+        list unused components (and runset components if 'getAll' is True).
+        If 'useCache' is True, report the last known state of each component
+        and its age in seconds instead of querying every component
+        """
+        return self.__listComponentDicts(self.__getComponents(idList, getAll),
+                                         useCache)
 
     def rpc_component_register(self, name, num, host, port, mbeanPort,
                                connArray):
         "register a component with the server"
-
-        if type(name) != str or len(name) == 0:
-            raise CnCServerException("Bad component name (should be a string)")
-        if type(num) != int:
-            raise CnCServerException("Bad component number" +
-                                     " (should be an integer)")
-
-        connectors = []
-        for n in range(len(connArray)):
-            d = connArray[n]
-            if type(d) != tuple and type(d) != list:
-                errMsg = "Bad %s#%d connector#%d \"%s\"%s" % \
-                    (name, num, n, str(d), str(type(d)))
-                self.__log.info(errMsg)
-                raise CnCServerException(errMsg)
-            if len(d) != 3:
-                errMsg = ("Bad %s#%d connector#%d %s (should have 3" +
-                          " elements)") % (name, num, n, str(d))
-                self.__log.info(errMsg)
-                raise CnCServerException(errMsg)
-            if type(d[0]) != str or len(d[0]) == 0:
-                errMsg = ("Bad %s#%d connector#%d %s (first element should" +
-                          " be name)") % (name, num, n, str(d))
-                self.__log.info(errMsg)
-                raise CnCServerException(errMsg)
-            if type(d[1]) != str or len(d[1]) != 1:
-                errMsg = ("Bad %s#%d connector#%d %s (second element should" +
-                          " be descrChar)") % (name, num, n, str(d))
-                self.__log.info(errMsg)
-                raise CnCServerException(errMsg)
-            if type(d[2]) != int:
-                errMsg = ("Bad %s#%d connector#%d %s (third element should" +
-                          " be int)") % (name, num, n, str(d))
-                self.__log.info(errMsg)
-                raise CnCServerException(errMsg)
-            connectors.append(Connector(d[0], d[1], d[2]))
+        connectors = self.__validateComponent(name, num, connArray)
 
         client = self.createClient(name, num, host, port, mbeanPort,
                                    connectors)
@@ -912,29 +1325,76 @@ class CnCServer(DAQPool):
 
         self.add(client)
 
-        logIP = ip.convertLocalhostToIpAddr(self.__log.logHost())
+        return self.__registrationData(client, self.__logAddresses())
 
-        logPort = self.__log.logPort()
-        if logPort is None:
-            if self.__logServer is not None:
-                logPort = self.__logServer.port()
-            else:
-                logIP = ""
-                logPort = 0
+    def rpc_component_register_batch(self, compArray):
+        """
+        register many components (usually all those on one host) with the
+        server.  'compArray' is a list of (name, num, host, port, mbeanPort,
+        connArray) entries, and the returned list holds either the usual
+        registration dictionary or an {"error" : message} dictionary for
+        each entry.  MBean clients are set up in the background.
+        """
+        if type(compArray) != tuple and type(compArray) != list:
+            raise CnCServerException("Bad component list (should be a list)")
+
+        # validate everything before registering anything
+        validList = []
+        for n in range(len(compArray)):
+            entry = compArray[n]
+            if (type(entry) != tuple and type(entry) != list) or \
+                    len(entry) != 6:
+                errMsg = "Bad registration entry#%d %s (should have 6" \
+                    " elements)" % (n, str(entry))
+                self.__log.info(errMsg)
+                validList.append(errMsg)
+                continue
 
-        liveIP = ip.convertLocalhostToIpAddr(self.__log.liveHost())
+            (name, num, host, port, mbeanPort, connArray) = entry
+            try:
+                connectors = self.__validateComponent(name, num, connArray)
+            except CnCServerException, cse:
+                validList.append(str(cse))
+                continue
 
-        livePort = self.__log.livePort()
-        if livePort is None:
-            liveIP = ""
-            livePort = 0
+            validList.append((name, num, host, port, mbeanPort, connectors))
 
-        return { "id" : client.id(),
-                 "logIP" : logIP,
-                 "logPort" : logPort,
-                 "liveIP" : liveIP,
-                 "livePort" : livePort,
-                 "serverId" : self.__id }
+        logAddrs = self.__logAddresses()
+
+        rtnList = []
+        for v in validList:
+            if type(v) == str:
+                rtnList.append({ "error" : v })
+                continue
+
+            (name, num, host, port, mbeanPort, connectors) = v
+            try:
+                client = self.createClient(name, num, host, port, mbeanPort,
+                                           connectors, deferMBean=True)
+            except:
+                errMsg = "Cannot register %s#%s: %s" % \
+                    (name, num, exc_string())
+                self.__log.error(errMsg)
+                rtnList.append({ "error" : errMsg })
+                continue
+
+            self.__log.debug("Registered %s" % client.fullName())
+
+            self.add(client)
+
+            rtnList.append(self.__registrationData(client, logAddrs))
+
+        return rtnList
+
+    def rpc_component_state_changed(self, compId, state):
+        """
+        a component reports that it has moved to a new state, waking
+        any runset which is waiting for the transition
+        """
+        for c in self.__getComponents([compId], False):
+            c.stateChanged(state)
+            return "OK"
+        raise CnCServerException("Unknown component #%d" % compId)
 
     def rpc_cycle_live(self):
         "Restart DAQLive thread"
@@ -1015,6 +1475,15 @@ class CnCServer(DAQPool):
 
         return runSet.events(subrunNumber)
 
+    def rpc_runset_finalize_jobs(self, id):
+        "return the names of the runset's unfinished end-of-run jobs"
+        runSet = self.findRunset(id)
+
+        if not runSet:
+            raise CnCServerException('Could not find runset#%d' % id)
+
+        return runSet.pendingFinalizeJobs()
+
     def rpc_runset_list_ids(self):
         """return a list of active runset IDs"""
         return self.listRunsetIDs()
@@ -1127,6 +1596,15 @@ class CnCServer(DAQPool):
 
         return "OK"
 
+    def rpc_server_stats(self):
+        "return XML-RPC server and component liveness sweep statistics"
+        if self.__server is None:
+            stats = {}
+        else:
+            stats = self.__server.serverStats()
+        stats["monitor"] = self.monitorStats()
+        return stats
+
     def rpc_version(self):
         "return the CnCServer release/revision info"
         return self.__versionInfo
@@ -1218,6 +1696,10 @@ if __name__ == "__main__":
     p.add_option("-D", "--dashDir", type="string", dest="dashDir",
                  action="store", default=os.path.join(metaDir, "dash"),
                  help="Directory holding Python scripts")
+    p.add_option("-e", "--repair-on-error", dest="repairOnError",
+                 action="store_true", default=False,
+                 help=("Only restart failed components when a runset" +
+                       " is in an error state"))
     p.add_option("-f", "--force-restart", dest="forceRestart",
                  action="store_true", default=True,
                  help="Force components to restart after every run")
@@ -1312,7 +1794,7 @@ if __name__ == "__main__":
                     defaultLogDir=opt.defaultLogDir, logIP=logIP,
                     logPort=logPort, liveIP=liveIP, livePort=livePort,
                     forceRestart=opt.forceRestart, testOnly=False,
-                    quiet=opt.quiet)
+                    quiet=opt.quiet, repairOnError=opt.repairOnError)
     try:
         cnc.run()
     except KeyboardInterrupt:
@@ -12,7 +12,7 @@ from RunSet import RunSet
 
 from DAQMocks \
     import MockAppender, MockClusterConfig, MockCnCLogger, MockRunConfigFile,\
-    SocketReaderFactory, SocketWriter, MockLogger
+    MockSchemaCacheDir, SocketReaderFactory, SocketWriter, MockLogger
 
 ACTIVE_WARNING = False
 
@@ -101,7 +101,8 @@ class MostlyCnCServer(CnCServer):
                                               forceRestart=forceRestart,
                                               quiet=True)
 
-    def createClient(self, name, num, host, port, mbeanPort, connectors):
+    def createClient(self, name, num, host, port, mbeanPort, connectors,
+                     deferMBean=False):
         key = '%s#%d' % (name, num)
         key = 'server'
         if not MostlyCnCServer.APPENDERS.has_key(key):
@@ -284,6 +285,7 @@ class TestCnCServer(unittest.TestCase):
         self.__copyDir = tempfile.mkdtemp()
         self.__runConfigDir = tempfile.mkdtemp()
         self.__spadeDir = tempfile.mkdtemp()
+        self.__cacheDir = MockSchemaCacheDir()
 
         self.comp = None
         self.cnc = None
@@ -314,6 +316,7 @@ class TestCnCServer(unittest.TestCase):
         if self.__spadeDir is not None:
             shutil.rmtree(self.__spadeDir, ignore_errors=True)
             self.__spadeDir = None
+        self.__cacheDir.restore()
 
         try:
             self.__logFactory.tearDown()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 
-import socket, threading
+import Queue, atexit, socket, threading
+
+from utils import clock
 
 from exc_string import exc_string, set_exc_string_encoding
 set_exc_string_encoding("ascii")
@@ -13,8 +15,11 @@ class Result(object):
 
     def __str__(self): return self.__name
 
-class ComponentOperation(threading.Thread):
-    "Thread used to communicate with a component in a run set"
+class ComponentOperation(object):
+    """
+    Operation used to communicate with a component in a run set.
+    Operations are run by an OperationPool worker thread.
+    """
 
     "result for a hanging thread"
     RESULT_HANGING = Result("hanging")
@@ -27,6 +32,8 @@ class ComponentOperation(threading.Thread):
     CONFIG_COMP = "CONFIG_COMP"
     "thread will configure the component's logging"
     CONFIG_LOGGING = "CONFIG_LOGGING"
+    "thread will tell the builder to start the subrun"
+    COMMIT_SUBRUN = "COMMIT_SUBRUN"
     "thread will connect the component's inputs and outputs"
     CONNECT = "CONNECT"
     "thread will force the running component to stop"
@@ -39,6 +46,10 @@ class ComponentOperation(threading.Thread):
     GET_SINGLE_BEAN = "GET_SINGLE_BEAN"
     "thread will get the component state"
     GET_STATE = "GET_STATE"
+    "thread will check that the pooled component is still alive"
+    MONITOR = "MONITOR"
+    "thread will tell the builder to prepare for a subrun"
+    PREPARE_SUBRUN = "PREPARE_SUBRUN"
     "thread will reset the component"
     RESET_COMP = "RESET_COMP"
     "thread will reset the component's logging"
@@ -47,36 +58,48 @@ class ComponentOperation(threading.Thread):
     STOP_LOGGING = "STOP_LOGGING"
     "thread will start the component running"
     START_RUN = "START_RUN"
+    "thread will send subrun data to the string hub"
+    START_SUBRUN = "START_SUBRUN"
     "thread will stop the running component"
     STOP_RUN = "STOP_RUN"
     "thread will terminate the component"
     TERMINATE = "TERMINATE"
 
-    def __init__(self, comp, log, operation, data):
+    def __init__(self, comp, log, operation, data, group=None):
         """
         Initialize a run set thread
         comp - component
         log - object used to log errors
         operation - RunSet operation
         data - tuple holding all data needed for the operation
+        group - ComponentOperationGroup to notify when the operation finishes
         """
         self.__comp = comp
         self.__log = log
         self.__operation = operation
         self.__data = data
+        self.__group = group
 
         self.__result = None
         self.__error = False
 
-        name = "CnCServer:Comp*%s=%s" % (str(self.__comp), self.__operation)
+        self.__done = threading.Event()
+        self.__startTime = clock.monotonic()
+        self.__startedAt = None
+        self.__elapsed = None
 
-        super(ComponentOperation, self).__init__(name=name)
-        self.setDaemon(True)
+    def __str__(self):
+        return "CnCServer:Comp*%s=%s" % (str(self.__comp), self.__operation)
 
     def __close(self):
         "Close the component's inputs and outputs"
         self.__comp.close()
 
+    def __commitSubrun(self):
+        "Tell the builder to start marking events with the subrun number"
+        self.__result = self.__comp.commitSubrun(self.__data[0],
+                                                 self.__data[1])
+
     def __configComponent(self):
         "Configure the component"
         self.__result = self.__comp.configure(self.__data[0])
@@ -115,6 +138,14 @@ class ComponentOperation(threading.Thread):
         "Get the component's current state"
         self.__result = self.__comp.state()
 
+    def __monitor(self):
+        "Check that the component is still alive"
+        self.__result = self.__comp.monitor()
+
+    def __prepareSubrun(self):
+        "Tell the builder to prepare for a subrun"
+        self.__result = self.__comp.prepareSubrun(self.__data[0])
+
     def __resetComponent(self):
         "Reset the component"
         self.__comp.reset()
@@ -127,6 +158,10 @@ class ComponentOperation(threading.Thread):
         "Start the component running"
         self.__result = self.__comp.startRun(self.__data[0])
 
+    def __startSubrun(self):
+        "Send subrun data to the string hub"
+        self.__result = self.__comp.startSubrun(self.__data[0])
+
     def __stopLogging(self):
         "Stop logging for the component"
         self.__data[self.__comp].stopServing()
@@ -143,6 +178,8 @@ class ComponentOperation(threading.Thread):
         "Execute the requested operation"
         if self.__operation == ComponentOperation.CLOSE:
             self.__close()
+        elif self.__operation == ComponentOperation.COMMIT_SUBRUN:
+            self.__commitSubrun()
         elif self.__operation == ComponentOperation.CONFIG_COMP:
             self.__configComponent()
         elif self.__operation == ComponentOperation.CONFIG_LOGGING:
@@ -159,12 +196,18 @@ class ComponentOperation(threading.Thread):
             self.__getSingleBeanField()
         elif self.__operation == ComponentOperation.GET_STATE:
             self.__getState()
+        elif self.__operation == ComponentOperation.MONITOR:
+            self.__monitor()
+        elif self.__operation == ComponentOperation.PREPARE_SUBRUN:
+            self.__prepareSubrun()
         elif self.__operation == ComponentOperation.RESET_COMP:
             self.__resetComponent()
         elif self.__operation == ComponentOperation.RESET_LOGGING:
             self.__resetLogging()
         elif self.__operation == ComponentOperation.START_RUN:
             self.__startRun()
+        elif self.__operation == ComponentOperation.START_SUBRUN:
+            self.__startSubrun()
         elif self.__operation == ComponentOperation.STOP_LOGGING:
             self.__stopLogging()
         elif self.__operation == ComponentOperation.STOP_RUN:
@@ -179,25 +222,332 @@ class ComponentOperation(threading.Thread):
     def isError(self): return self.__error
     def result(self): return self.__result
 
+    def elapsed(self):
+        """
+        Return the number of seconds between queuing and finishing this
+        operation, or None if it has not finished
+        """
+        return self.__elapsed
+
+    def startedAt(self):
+        """
+        Return the clock.monotonic() time when a worker started this
+        operation, or None if it is still queued
+        """
+        return self.__startedAt
+
+    def isAlive(self):
+        "Return True if the operation has not yet finished"
+        return not self.__done.isSet()
+
+    def join(self, timeout=None):
+        "Wait up to 'timeout' seconds for the operation to finish"
+        self.__done.wait(timeout)
+
     def run(self):
-        "Main method for thread"
+        "Execute the operation and mark it as finished"
+        self.__startedAt = clock.monotonic()
+        if self.__group is not None:
+            self.__group.operationStarted(self)
+        try:
+            try:
+                self.__runOperation()
+            except socket.error:
+                self.__error = True
+            except:
+                if self.__log is not None:
+                    self.__log.error("%s(%s): %s" % (str(self.__operation),
+                                                     str(self.__comp),
+                                                     exc_string()))
+                self.__error = True
+        finally:
+            self.__elapsed = clock.monotonic() - self.__startTime
+            self.__done.set()
+            if self.__group is not None:
+                self.__group.operationFinished(self)
+
+class OperationPool(object):
+    """
+    Bounded set of long-lived worker threads which run ComponentOperations
+    (or any other object with a run() method).
+    Workers are started as needed (up to 'maxWorkers') and any workers
+    beyond 'minWorkers' exit after sitting idle for 'idleSecs' seconds.
+
+    Operations are run in the order they were submitted.  If operations
+    are waiting while every worker has been busy for at least 'stallSecs'
+    seconds (e.g. on hung components), the pool is stalled.  A stalled
+    pool starts extra workers for the waiting operations, up to
+    'stallMaxWorkers' in all, and reports the stall to its logger.
+    """
+
+    "maximum number of worker threads"
+    MAX_WORKERS = 32
+    "number of worker threads which are never retired"
+    MIN_WORKERS = 4
+    "number of seconds an extra worker waits for work before exiting"
+    IDLE_SECS = 60
+    "number of seconds every worker must be busy before the pool is stalled"
+    STALL_SECS = 5.0
+    "maximum number of worker threads in a stalled pool"
+    STALL_MAX_WORKERS = 256
+    "number of seconds stop() waits for idle workers to exit"
+    STOP_SECS = 2.0
+
+    def __init__(self, maxWorkers=MAX_WORKERS, minWorkers=MIN_WORKERS,
+                 idleSecs=IDLE_SECS, stallSecs=STALL_SECS,
+                 stallMaxWorkers=STALL_MAX_WORKERS):
+        self.__maxWorkers = maxWorkers
+        self.__minWorkers = minWorkers
+        self.__idleSecs = idleSecs
+        self.__stallSecs = stallSecs
+        self.__stallMaxWorkers = max(stallMaxWorkers, maxWorkers)
+
+        self.__queue = Queue.Queue()
+
+        # queued once for each worker when the pool is stopped
+        self.__stopMarker = object()
+        # set when the pool is stopped, to wake the stall watcher
+        self.__stopEvent = threading.Event()
+
+        self.__logger = None
+
+        self.__lock = threading.Lock()
+        self.__threads = []
+        self.__watcher = None
+        self.__stopped = False
+        self.__numWorkers = 0
+        self.__numIdle = 0
+        self.__numPending = 0
+        self.__numCreated = 0
+        self.__peakWorkers = 0
+        self.__numStalls = 0
+
+        # map each busy worker thread to the time it took its operation
+        self.__busySince = {}
+
+    def __relieveStall(self):
+        """
+        If the pool is stalled, start workers for the waiting operations.
+        Return the number of workers started.
+        This method assumes that self.__lock has already been acquired
+        """
+        numWaiting = self.__numPending - self.__numIdle
+        if numWaiting <= 0 or self.__numWorkers < self.__maxWorkers or \
+                len(self.__busySince) < self.__numWorkers:
+            return 0
+
+        newest = max(self.__busySince.values())
+        if clock.monotonic() - newest < self.__stallSecs:
+            return 0
+
+        numNew = min(numWaiting, self.__stallMaxWorkers - self.__numWorkers)
+        for i in range(numNew):
+            self.__startWorker()
+        if numNew > 0:
+            self.__numStalls += 1
+        return numNew
+
+    def __startWorker(self):
+        "This method assumes that self.__lock has already been acquired"
+        self.__numCreated += 1
+        self.__numWorkers += 1
+        if self.__peakWorkers < self.__numWorkers:
+            self.__peakWorkers = self.__numWorkers
+
+        name = "CnCServer:OpWorker#%d" % self.__numCreated
+        thread = threading.Thread(name=name, target=self.__work)
+        thread.setDaemon(True)
+        thread.start()
+        self.__threads.append(thread)
+
+    def __watch(self):
+        "Check for a stalled pool for as long as operations are waiting"
+        while not self.__stopEvent.isSet():
+            self.__stopEvent.wait(self.__stallSecs / 2.0)
+
+            self.__lock.acquire()
+            try:
+                if self.__stopped or self.__numPending <= self.__numIdle:
+                    self.__watcher = None
+                    return
+                numWorkers = self.__numWorkers
+                numNew = self.__relieveStall()
+            finally:
+                self.__lock.release()
+
+            if numNew > 0 and self.__logger is not None:
+                self.__logger.error(("Operation pool stalled: all %d workers" +
+                                     " busy for over %.1f seconds, started" +
+                                     " %d more") %
+                                    (numWorkers, self.__stallSecs, numNew))
+
+    def __work(self):
+        "Worker thread main loop"
+        thread = threading.currentThread()
+        while True:
+            self.__lock.acquire()
+            try:
+                self.__numIdle += 1
+            finally:
+                self.__lock.release()
+
+            try:
+                op = self.__queue.get(True, self.__idleSecs)
+            except Queue.Empty:
+                op = None
+
+            self.__lock.acquire()
+            try:
+                self.__numIdle -= 1
+                if op is self.__stopMarker or \
+                        (op is None and self.__numWorkers > self.__minWorkers):
+                    self.__numWorkers -= 1
+                    self.__threads.remove(thread)
+                    return
+                if op is not None:
+                    self.__numPending -= 1
+                    self.__busySince[thread] = clock.monotonic()
+            finally:
+                self.__lock.release()
+
+            if op is not None:
+                try:
+                    op.run()
+                finally:
+                    self.__lock.acquire()
+                    try:
+                        del self.__busySince[thread]
+                    finally:
+                        self.__lock.release()
+
+    def maxWorkers(self):
+        "Number of workers the pool starts before it is considered stalled"
+        return self.__maxWorkers
+
+    def setLogger(self, logger):
+        "Report pool stalls to 'logger'"
+        self.__logger = logger
+
+    def stalls(self):
+        "Return the number of times the pool grew past maxWorkers"
+        self.__lock.acquire()
+        try:
+            return self.__numStalls
+        finally:
+            self.__lock.release()
+
+    def stats(self):
+        """
+        Return a tuple of (current workers, peak workers, workers created,
+        queued operations)
+        """
+        self.__lock.acquire()
+        try:
+            return (self.__numWorkers, self.__peakWorkers, self.__numCreated,
+                    self.__numPending)
+        finally:
+            self.__lock.release()
+
+    def stop(self, waitSecs=STOP_SECS):
+        """
+        Tell every worker to exit once the operations queued ahead of
+        this call have been run, then wait up to 'waitSecs' seconds for
+        the workers to exit.  Operations submitted after the pool has
+        been stopped are run in the caller's thread.
+        """
+        self.__lock.acquire()
+        try:
+            if self.__stopped:
+                return
+            self.__stopped = True
+            threads = self.__threads[:]
+            for t in threads:
+                self.__queue.put(self.__stopMarker)
+            if self.__watcher is not None:
+                threads.append(self.__watcher)
+        finally:
+            self.__lock.release()
+
+        self.__stopEvent.set()
+
+        endTime = clock.monotonic() + waitSecs
+        for t in threads:
+            secsLeft = endTime - clock.monotonic()
+            if secsLeft <= 0.0:
+                break
+            t.join(secsLeft)
+
+    def submit(self, op):
+        """
+        Queue an operation, starting a new worker if none are available.
+        If the pool has been stopped, run the operation immediately.
+        """
+        self.__lock.acquire()
         try:
-            self.__runOperation()
-        except socket.error:
-            self.__error = True
-        except:
-            self.__log.error("%s(%s): %s" % (str(self.__operation),
-                                             str(self.__comp),
-                                             exc_string()))
-            self.__error = True
+            if self.__stopped:
+                runNow = True
+            else:
+                runNow = False
+                self.__numPending += 1
+                if self.__numPending > self.__numIdle:
+                    if self.__numWorkers < self.__maxWorkers:
+                        self.__startWorker()
+                    elif self.__watcher is None:
+                        # every worker is busy, so watch for a stall
+                        self.__watcher = \
+                            threading.Thread(name="CnCServer:OpPoolWatcher",
+                                             target=self.__watch)
+                        self.__watcher.setDaemon(True)
+                        self.__watcher.start()
+        finally:
+            self.__lock.release()
+
+        if runNow:
+            op.run()
+        else:
+            self.__queue.put(op)
 
 class ComponentOperationGroup(object):
-    def __init__(self, op):
-        "Create a runset thread group"
+    "shared pool of workers used to run operations"
+    POOL = OperationPool()
+    """
+    pool used for periodic liveness checks, so that a sweep which is stuck
+    on hung components doesn't delay run transitions
+    """
+    MONITOR_POOL = OperationPool(maxWorkers=16, minWorkers=1)
+
+    "operations which take longer than this many seconds are reported"
+    SLOW_SECS = 1.0
+    "maximum number of slow components listed by reportErrors()"
+    NUM_SLOWEST = 5
+
+    def __init__(self, op, pool=None):
+        """
+        Create a runset thread group
+        op - operation to run on each component
+        pool - OperationPool used to run the operations (defaults to POOL)
+        """
         self.__op = op
+        if pool is None:
+            self.__pool = self.POOL
+        else:
+            self.__pool = pool
 
         self.__list = []
 
+        self.__doneCond = threading.Condition()
+        self.__numDone = 0
+
+    def completionTimes(self):
+        """
+        Return a dictionary mapping each component to the number of seconds
+        its operation took (None if the operation has not finished)
+        """
+        times = {}
+        for t in self.__list:
+            times[t.component()] = t.elapsed()
+        return times
+
     def getErrors(self):
         numAlive = 0
         numErrors = 0
@@ -228,17 +578,62 @@ class ComponentOperationGroup(object):
             logger.error("Thread group encountered %d error%s during %s" %
                          (numErrors, plural, method))
 
+        slowList = self.slowest(self.NUM_SLOWEST, self.SLOW_SECS)
+        if len(slowList) > 0:
+            slowStr = []
+            for comp, secs in slowList:
+                slowStr.append("%s(%.2fs)" % (comp, secs))
+            logger.info("Slowest %s responders: %s" %
+                        (method, ", ".join(slowStr)))
+
+    def operationFinished(self, oper):
+        "Called by each operation when it has finished"
+        self.__doneCond.acquire()
+        try:
+            self.__numDone += 1
+            self.__doneCond.notifyAll()
+        finally:
+            self.__doneCond.release()
+
+    def operationStarted(self, oper):
+        "Called by each operation when a worker starts running it"
+        self.__doneCond.acquire()
+        try:
+            self.__doneCond.notifyAll()
+        finally:
+            self.__doneCond.release()
+
+    def slowest(self, num, minSecs=0.0):
+        """
+        Return a list of up to 'num' (component, seconds) pairs for the
+        slowest finished operations which took at least 'minSecs' seconds
+        """
+        slowList = []
+        for t in self.__list:
+            secs = t.elapsed()
+            if secs is not None and secs >= minSecs:
+                slowList.append((secs, t.component()))
+        slowList.sort()
+        slowList.reverse()
+
+        rtnList = []
+        for secs, comp in slowList[:num]:
+            rtnList.append((comp, secs))
+        return rtnList
+
     def start(self, comp, logger, data):
-        "Start a thread after adding it to the group"
-        thread = ComponentOperation(comp, logger, self.__op, data)
-        self.__list.append(thread)
-        thread.start()
+        "Queue an operation on the worker pool after adding it to the group"
+        oper = ComponentOperation(comp, logger, self.__op, data, self)
+        self.__list.append(oper)
+        self.__pool.submit(oper)
 
     def results(self):
         if self.__op != ComponentOperation.GET_CONN_INFO and \
                self.__op != ComponentOperation.GET_MULTI_BEAN and \
                self.__op != ComponentOperation.GET_SINGLE_BEAN and \
-               self.__op != ComponentOperation.GET_STATE:
+               self.__op != ComponentOperation.GET_STATE and \
+               self.__op != ComponentOperation.MONITOR and \
+               self.__op != ComponentOperation.START_SUBRUN:
             raise ComponentOperationException("Cannot get results for" +
                                               " operation %s" % self.__op)
         results = {}
@@ -254,21 +649,50 @@ class ComponentOperationGroup(object):
 
     def wait(self, reps=4, waitSecs=2):
         """
-        Wait for all the threads to finish
-        reps - number of times to loop before deciding threads are hung
-        waitSecs - total number of seconds to wait
-        NOTE:
-        if all threads are hung, max wait time is (#threads * waitSecs * reps)
+        Wait for all the operations to finish, giving each operation
+        'waitSecs' seconds from the time a worker starts running it.
+        Operations still queued behind busy workers are given up on once
+        the pool has had time to work through the whole group
+        (waitSecs * ceil(operations / workers) seconds in all).
+        reps - ignored (kept for compatibility with older callers)
+        waitSecs - number of seconds to wait for each operation
         """
-        partSecs = float(waitSecs) / float(reps)
-        for i in range(reps):
-            alive = False
-            for t in self.__list:
-                if t.isAlive():
-                    t.join(partSecs)
-                    alive |= t.isAlive()
-            if not alive:
-                break
+        maxWorkers = self.__pool.maxWorkers()
+        numRounds = (len(self.__list) + maxWorkers - 1) / maxWorkers
+        endTime = clock.monotonic() + waitSecs * max(numRounds, 1)
+
+        self.__doneCond.acquire()
+        try:
+            while self.__numDone < len(self.__list):
+                now = clock.monotonic()
+                if now >= endTime:
+                    break
+
+                # wake at the earliest deadline of a running operation
+                # (or when a queued operation is started)
+                nextTime = None
+                for t in self.__list:
+                    if not t.isAlive():
+                        continue
+                    started = t.startedAt()
+                    if started is None:
+                        deadline = endTime
+                    else:
+                        deadline = min(started + waitSecs, endTime)
+                    if deadline > now and \
+                            (nextTime is None or deadline < nextTime):
+                        nextTime = deadline
+                if nextTime is None:
+                    # every unfinished operation has used up its time
+                    break
+
+                self.__doneCond.wait(nextTime - now)
+        finally:
+            self.__doneCond.release()
+
+# let idle workers exit before the interpreter starts tearing down modules
+atexit.register(ComponentOperationGroup.POOL.stop)
+atexit.register(ComponentOperationGroup.MONITOR_POOL.stop)
 
 if __name__ == "__main__":
     pass
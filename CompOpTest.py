@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+import socket, time, unittest
+
+from CompOp import ComponentOperation, ComponentOperationGroup, OperationPool
+
+class FakeLogger(object):
+    def __init__(self):
+        self.errors = []
+
+        self.infos = []
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+    def info(self, msg):
+        self.infos.append(msg)
+
+class FakeComponent(object):
+    def __init__(self, name, state="idle", delay=0.0, failure=None):
+        self.__name = name
+        self.__state = state
+        self.__delay = delay
+        self.__failure = failure
+
+    def __str__(self):
+        return self.__name
+
+    def commitSubrun(self, id, latestTime):
+        self.committed = (id, latestTime)
+
+    def prepareSubrun(self, id):
+        self.prepared = id
+
+    def startSubrun(self, data):
+        if self.__delay > 0.0:
+            time.sleep(self.__delay)
+        if self.__failure is not None:
+            raise self.__failure
+        return "%d" % len(data)
+
+    def state(self):
+        if self.__delay > 0.0:
+            time.sleep(self.__delay)
+        if self.__failure is not None:
+            raise self.__failure
+        return self.__state
+
+class TestCompOp(unittest.TestCase):
+    def testResults(self):
+        logger = FakeLogger()
+
+        good = FakeComponent("good", state="ready")
+        bad = FakeComponent("bad", failure=socket.error("refused"))
+        slow = FakeComponent("slow", delay=1.0)
+
+        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
+        for c in (good, bad, slow):
+            tGroup.start(c, logger, ())
+        tGroup.wait(reps=2, waitSecs=0.2)
+
+        results = tGroup.results()
+        self.assertEquals("ready", results[good])
+        self.assertEquals(ComponentOperation.RESULT_ERROR, results[bad])
+        self.assertEquals(ComponentOperation.RESULT_HANGING, results[slow])
+
+        self.assertEquals((1, 1), tGroup.getErrors())
+
+        self.assertEquals([], logger.errors)
+
+    def testBoundedPool(self):
+        logger = FakeLogger()
+
+        pool = OperationPool(maxWorkers=4, minWorkers=1, idleSecs=60)
+
+        compList = []
+        for i in range(20):
+            compList.append(FakeComponent("comp#%d" % i, delay=0.05))
+
+        opList = []
+        for c in compList:
+            op = ComponentOperation(c, logger, ComponentOperation.GET_STATE,
+                                    ())
+            opList.append(op)
+            pool.submit(op)
+
+        for op in opList:
+            op.join(5)
+            self.failIf(op.isAlive(), "%s did not finish" % op)
+            self.assertEquals("idle", op.result())
+
+        (numWorkers, peakWorkers, numCreated, numPending) = pool.stats()
+        self.failUnless(peakWorkers <= 4, "Pool grew to %d workers" %
+                        peakWorkers)
+        self.assertEquals(numWorkers, numCreated)
+        self.assertEquals(0, numPending)
+
+        # a second sweep reuses the existing workers
+        for c in compList:
+            op = ComponentOperation(c, logger, ComponentOperation.GET_STATE,
+                                    ())
+            pool.submit(op)
+        op.join(5)
+
+        self.assertEquals(numCreated, pool.stats()[2])
+
+        self.assertEquals([], logger.errors)
+
+    def testDeadline(self):
+        logger = FakeLogger()
+
+        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
+        for i in range(6):
+            tGroup.start(FakeComponent("hung#%d" % i, delay=1.0), logger, ())
+
+        # hung operations running in parallel time out together
+        start = time.time()
+        tGroup.wait(waitSecs=0.3)
+        self.failUnless(time.time() - start < 0.6,
+                        "wait() took %.2f seconds" % (time.time() - start))
+
+        (numAlive, numErrors) = tGroup.getErrors()
+        self.assertEquals(6, numAlive)
+
+    def testQueuedDeadline(self):
+        logger = FakeLogger()
+
+        pool = OperationPool(maxWorkers=2, minWorkers=2, idleSecs=60)
+
+        # more operations than workers, each well within its own budget
+        compList = []
+        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE, pool)
+        for i in range(6):
+            c = FakeComponent("comp#%d" % i, state="ready", delay=0.3)
+            compList.append(c)
+            tGroup.start(c, logger, ())
+
+        # queued operations are not charged for time spent in the queue
+        tGroup.wait(waitSecs=0.5)
+
+        results = tGroup.results()
+        for c in compList:
+            self.assertEquals("ready", results[c])
+        self.assertEquals((0, 0), tGroup.getErrors())
+
+        pool.stop()
+
+        self.assertEquals([], logger.errors)
+
+    def testEarlyReturn(self):
+        logger = FakeLogger()
+
+        fast = FakeComponent("fast")
+        slow = FakeComponent("slow", delay=0.2)
+
+        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
+        tGroup.start(fast, logger, ())
+        tGroup.start(slow, logger, ())
+
+        start = time.time()
+        tGroup.wait(waitSecs=5)
+        self.failUnless(time.time() - start < 1.0,
+                        "wait() did not return when operations finished")
+
+        times = tGroup.completionTimes()
+        self.failUnless(times[slow] >= 0.2)
+        self.failUnless(times[fast] < times[slow])
+
+        self.assertEquals([(slow, times[slow])], tGroup.slowest(1))
+        self.assertEquals([], tGroup.slowest(3, minSecs=1.0))
+
+        tGroup.reportErrors(logger, "getState")
+        self.assertEquals([], logger.errors)
+        self.assertEquals([], logger.infos)
+
+        ComponentOperationGroup.SLOW_SECS = 0.1
+        try:
+            tGroup.reportErrors(logger, "getState")
+        finally:
+            ComponentOperationGroup.SLOW_SECS = 1.0
+        self.assertEquals(1, len(logger.infos))
+        self.failUnless(logger.infos[0].startswith("Slowest getState" +
+                                                   " responders: slow("))
+
+    def testStarvation(self):
+        logger = FakeLogger()
+
+        pool = OperationPool(maxWorkers=2, minWorkers=1, idleSecs=60)
+        other = OperationPool(maxWorkers=2, minWorkers=1, idleSecs=60)
+
+        # hung operations tie up every worker in the pool...
+        hungGroup = ComponentOperationGroup(ComponentOperation.GET_STATE,
+                                            pool)
+        for i in range(2):
+            hungGroup.start(FakeComponent("hung#%d" % i, delay=0.5),
+                            logger, ())
+
+        # ...so later operations on the same pool must wait for them
+        fast = FakeComponent("fast")
+        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE, pool)
+        tGroup.start(fast, logger, ())
+        tGroup.wait(waitSecs=0.2)
+        self.assertEquals(ComponentOperation.RESULT_HANGING,
+                          tGroup.results()[fast])
+
+        # but operations on a separate pool are not delayed
+        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE, other)
+        tGroup.start(fast, logger, ())
+        tGroup.wait(waitSecs=0.2)
+        self.assertEquals("idle", tGroup.results()[fast])
+
+        hungGroup.wait(waitSecs=2)
+        pool.stop()
+        other.stop()
+
+        self.assertEquals([], logger.errors)
+
+    def testStall(self):
+        logger = FakeLogger()
+        poolLog = FakeLogger()
+
+        pool = OperationPool(maxWorkers=2, minWorkers=1, idleSecs=60,
+                             stallSecs=0.2)
+        pool.setLogger(poolLog)
+
+        # more hung operations than the pool has workers...
+        hungGroup = ComponentOperationGroup(ComponentOperation.GET_STATE,
+                                            pool)
+        for i in range(4):
+            hungGroup.start(FakeComponent("hung#%d" % i, delay=1.5),
+                            logger, ())
+
+        # ...stall the pool until it starts extra workers
+        fast = FakeComponent("fast")
+        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE, pool)
+        tGroup.start(fast, logger, ())
+        tGroup.wait(waitSecs=1.0)
+        self.assertEquals("idle", tGroup.results()[fast])
+
+        self.failUnless(pool.stalls() >= 1, "Pool stall was not detected")
+        self.failUnless(pool.stats()[1] > 2,
+                        "Pool did not grow past %d workers" %
+                        pool.maxWorkers())
+        self.failUnless(len(poolLog.errors) >= 1, "Pool stall was not logged")
+        self.failUnless(poolLog.errors[0].startswith("Operation pool" +
+                                                     " stalled"))
+
+        hungGroup.wait(waitSecs=3)
+        self.assertEquals(0, hungGroup.getErrors()[0])
+        pool.stop()
+
+        self.assertEquals([], logger.errors)
+
+    def testStop(self):
+        logger = FakeLogger()
+
+        pool = OperationPool(maxWorkers=4, minWorkers=4, idleSecs=60)
+
+        opList = []
+        for i in range(4):
+            op = ComponentOperation(FakeComponent("comp#%d" % i, delay=0.05),
+                                    logger, ComponentOperation.GET_STATE, ())
+            opList.append(op)
+            pool.submit(op)
+
+        # operations queued before stop() still run
+        pool.stop()
+        for op in opList:
+            self.failIf(op.isAlive(), "%s did not finish" % op)
+        self.assertEquals(0, pool.stats()[0])
+
+        # a stopped pool runs operations in the caller's thread
+        op = ComponentOperation(FakeComponent("late"), logger,
+                                ComponentOperation.GET_STATE, ())
+        pool.submit(op)
+        self.failIf(op.isAlive(), "%s did not finish" % op)
+        self.assertEquals("idle", op.result())
+
+        self.assertEquals([], logger.errors)
+
+    def testSubrun(self):
+        logger = FakeLogger()
+
+        bldr = FakeComponent("builder")
+        hub = FakeComponent("hub")
+        hung = FakeComponent("hung", delay=1.0)
+
+        tGroup = ComponentOperationGroup(ComponentOperation.PREPARE_SUBRUN)
+        tGroup.start(bldr, logger, (3, ))
+        tGroup.wait()
+        self.assertEquals(3, bldr.prepared)
+
+        startGroup = ComponentOperationGroup(ComponentOperation.START_SUBRUN)
+        for c in (hub, hung):
+            startGroup.start(c, logger, (["a", "b"], ))
+        startGroup.wait(waitSecs=0.2)
+
+        results = startGroup.results()
+        self.assertEquals("2", results[hub])
+        self.assertEquals(ComponentOperation.RESULT_HANGING, results[hung])
+        self.assertEquals(None, startGroup.completionTimes()[hung])
+
+        tGroup = ComponentOperationGroup(ComponentOperation.COMMIT_SUBRUN)
+        tGroup.start(bldr, logger, (3, "12345"))
+        tGroup.wait()
+        self.assertEquals((3, "12345"), bldr.committed)
+
+        # let the hung operation finish before the next test
+        startGroup.wait(waitSecs=2)
+
+        self.assertEquals([], logger.errors)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# Build the component-type graph for a runset's connection map and
+# compute the order in which components should be started and stopped
+
+import threading
+
+class ConnectionGraphException(Exception): pass
+
+class ConnectionGraph(object):
+    """
+    Directed graph of component types, built from a runset's connection map
+    (each component mapped to the list of Connection objects it feeds)
+    """
+
+    "cached levels, keyed by the set of types, sources and edges"
+    CACHE = {}
+    "lock protecting CACHE"
+    CACHE_LOCK = threading.Lock()
+
+    def __init__(self, compList, connMap):
+        """
+        Build the graph
+        compList - list of runset components
+        connMap - map of component to list of Connection entries
+        """
+        self.__types = set()
+        self.__sources = set()
+        self.__builders = set()
+
+        for c in compList:
+            self.__types.add(c.name())
+            if c.isSource():
+                self.__sources.add(c.name())
+
+        # only builders fed directly by sources are needed by isIgnored()
+        for comp in connMap:
+            if comp.name() in self.__sources:
+                for entry in connMap[comp]:
+                    if entry.comp.isBuilder():
+                        self.__builders.add(entry.comp.name())
+
+        self.__edges = set()
+        for comp in connMap:
+            for entry in connMap[comp]:
+                src = comp.name()
+                dst = entry.comp.name()
+                if not self.isIgnored(src, dst):
+                    self.__edges.add((src, dst))
+
+        self.__key = (frozenset(self.__types), frozenset(self.__sources),
+                      frozenset(self.__edges))
+
+    def __str__(self):
+        return "ConnectionGraph[%d types, %d edges]" % \
+            (len(self.__types), len(self.__edges))
+
+    def __computeLevels(self):
+        "Assign levels to each type using Kahn's algorithm"
+        if len(self.__sources) == 0:
+            raise ConnectionGraphException("No sources found")
+
+        inDegree = {}
+        outEdges = {}
+        for t in self.__types:
+            inDegree[t] = 0
+            outEdges[t] = []
+        for (src, dst) in self.__edges:
+            if not inDegree.has_key(dst) or not outEdges.has_key(src):
+                # ignore connections to components outside this runset
+                continue
+            inDegree[dst] += 1
+            outEdges[src].append(dst)
+
+        noInputs = [t for t in self.__types
+                    if inDegree[t] == 0 and t not in self.__sources]
+        if len(noInputs) > 0:
+            noInputs.sort()
+            raise ConnectionGraphException("No inputs found for %s" %
+                                           ", ".join(noInputs))
+
+        levels = {}
+        ready = list(self.__sources)
+        for t in ready:
+            levels[t] = 1
+
+        done = set()
+        while True:
+            if len(ready) == 0:
+                # the remaining types are all part of a loop (e.g. a
+                # feedback connection); start with the one closest to the
+                # sources and treat its unordered inputs as feedback edges
+                waiting = [(levels[t], t) for t in levels if t not in done]
+                if len(waiting) == 0:
+                    break
+                waiting.sort()
+                ready.append(waiting[0][1])
+
+            t = ready.pop()
+            done.add(t)
+            for dst in outEdges[t]:
+                if dst in done:
+                    continue
+
+                # a consumer is started after all its producers
+                if levels.get(dst, 0) < levels[t] + 1:
+                    levels[dst] = levels[t] + 1
+                inDegree[dst] -= 1
+                if inDegree[dst] == 0:
+                    ready.append(dst)
+
+        bad = [t for t in self.__types if not levels.has_key(t)]
+        if len(bad) > 0:
+            bad.sort()
+            raise ConnectionGraphException("No path from sources to %s" %
+                                           ", ".join(bad))
+
+        return levels
+
+    def edges(self):
+        "Return the set of (source type, destination type) edges"
+        return self.__edges.copy()
+
+    def isIgnored(self, src, dst):
+        """
+        Return True if the edge from 'src' to 'dst' does not affect ordering.
+        Sources are always started first, so edges into them (readout
+        requests from the builders) are dropped.  Edges from a source
+        into a builder carry readout data rather than triggers, so a
+        builder is ordered only by its trigger inputs.
+        """
+        if dst in self.__sources:
+            return True
+        return src in self.__sources and dst in self.__builders
+
+    def levels(self):
+        "Return a dictionary mapping each component type to its level"
+        self.CACHE_LOCK.acquire()
+        try:
+            if self.CACHE.has_key(self.__key):
+                return self.CACHE[self.__key].copy()
+        finally:
+            self.CACHE_LOCK.release()
+
+        levels = self.__computeLevels()
+
+        self.CACHE_LOCK.acquire()
+        try:
+            self.CACHE[self.__key] = levels
+        finally:
+            self.CACHE_LOCK.release()
+
+        return levels.copy()
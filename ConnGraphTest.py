@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+import unittest
+
+from ConnGraph import ConnectionGraph, ConnectionGraphException
+
+class FakeComponent(object):
+    def __init__(self, name, num=0):
+        self.__name = name
+        self.__num = num
+
+    def __str__(self):
+        return "%s#%d" % (self.__name, self.__num)
+
+    def isBuilder(self):
+        return self.__name.endswith("Builder")
+
+    def isSource(self):
+        return self.__name.endswith("Hub")
+
+    def name(self):
+        return self.__name
+
+class FakeConnection(object):
+    def __init__(self, comp):
+        self.comp = comp
+
+class TestConnectionGraph(unittest.TestCase):
+    def setUp(self):
+        ConnectionGraph.CACHE.clear()
+
+    def __buildMap(self, links):
+        connMap = {}
+        for (src, dst) in links:
+            connMap.setdefault(src, []).append(FakeConnection(dst))
+        return connMap
+
+    def testStandard(self):
+        hub1 = FakeComponent("stringHub", 1001)
+        hub2 = FakeComponent("stringHub", 1002)
+        iit = FakeComponent("inIceTrigger")
+        gt = FakeComponent("globalTrigger")
+        eb = FakeComponent("eventBuilder")
+        sb = FakeComponent("secondaryBuilders")
+
+        comps = [hub1, hub2, iit, gt, eb, sb]
+        connMap = self.__buildMap(((hub1, iit), (hub2, iit), (iit, gt),
+                                   (gt, eb), (hub1, eb), (hub2, eb),
+                                   (eb, hub1), (eb, hub2), (hub1, sb),
+                                   (hub2, sb)))
+
+        graph = ConnectionGraph(comps, connMap)
+        self.failIf(("stringHub", "eventBuilder") in graph.edges())
+        self.failIf(("eventBuilder", "stringHub") in graph.edges())
+
+        self.assertEquals({ "stringHub" : 1, "inIceTrigger" : 2,
+                            "secondaryBuilders" : 2, "globalTrigger" : 3,
+                            "eventBuilder" : 4 }, graph.levels())
+        self.assertEquals(1, len(ConnectionGraph.CACHE))
+
+        # a second graph with the same types should reuse the cached levels
+        hub3 = FakeComponent("stringHub", 1003)
+        connMap = self.__buildMap(((hub3, iit), (iit, gt), (gt, eb),
+                                   (hub3, sb)))
+        levels = ConnectionGraph([hub3, iit, gt, eb, sb], connMap).levels()
+        self.assertEquals(4, levels["eventBuilder"])
+        self.assertEquals(1, len(ConnectionGraph.CACHE))
+
+    def testLongestPath(self):
+        hub = FakeComponent("stringHub", 1)
+        amanda = FakeComponent("amandaHub")
+        iit = FakeComponent("inIceTrigger")
+        gt = FakeComponent("globalTrigger")
+
+        # globalTrigger must follow inIceTrigger even though amandaHub
+        # feeds it directly
+        connMap = self.__buildMap(((hub, iit), (iit, gt), (amanda, gt)))
+
+        levels = ConnectionGraph([hub, amanda, iit, gt], connMap).levels()
+        self.assertEquals(3, levels["globalTrigger"])
+        self.assertEquals(1, levels["amandaHub"])
+
+    def testNoSources(self):
+        iit = FakeComponent("inIceTrigger")
+        gt = FakeComponent("globalTrigger")
+
+        graph = ConnectionGraph([iit, gt], self.__buildMap(((iit, gt), )))
+        try:
+            graph.levels()
+            self.fail("Expected no sources to fail")
+        except ConnectionGraphException, cge:
+            self.assertEquals("No sources found", str(cge))
+
+    def testNoInputs(self):
+        hub = FakeComponent("stringHub", 1)
+        iit = FakeComponent("inIceTrigger")
+        extra = FakeComponent("extraComp")
+
+        graph = ConnectionGraph([hub, iit, extra],
+                                self.__buildMap(((hub, iit), )))
+        try:
+            graph.levels()
+            self.fail("Expected unconnected component to fail")
+        except ConnectionGraphException, cge:
+            self.assertEquals("No inputs found for extraComp", str(cge))
+
+    def testFeedback(self):
+        hub = FakeComponent("stringHub", 1)
+        foo = FakeComponent("fooTrigger")
+        bar = FakeComponent("barTrigger")
+        baz = FakeComponent("bazTrigger")
+
+        connMap = self.__buildMap(((hub, foo), (foo, bar), (bar, foo),
+                                   (bar, baz)))
+
+        levels = ConnectionGraph([hub, foo, bar, baz], connMap).levels()
+        self.assertEquals({ "stringHub" : 1, "fooTrigger" : 2,
+                            "barTrigger" : 3, "bazTrigger" : 4 }, levels)
+
+    def testUnreachable(self):
+        hub = FakeComponent("stringHub", 1)
+        foo = FakeComponent("fooTrigger")
+        bar = FakeComponent("barTrigger")
+        iit = FakeComponent("inIceTrigger")
+
+        graph = ConnectionGraph([hub, foo, bar, iit],
+                                self.__buildMap(((hub, iit), (foo, bar),
+                                                 (bar, foo))))
+        try:
+            graph.levels()
+            self.fail("Expected unreachable loop to fail")
+        except ConnectionGraphException, cge:
+            self.assertEquals("No path from sources to barTrigger," +
+                              " fooTrigger", str(cge))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 
-import os, socket, sys, threading
+import atexit, os, socket, sys, threading, xmlrpclib
 
+from BeanSchemaCache import BeanSchemaCache
 from CnCLogger import CnCLogger
+from CompOp import OperationPool
 from DAQRPC import RPCClient
 from RunSet import RunSet
 from UniqueID import UniqueID
+from utils import clock
 
 from exc_string import exc_string, set_exc_string_encoding
 set_exc_string_encoding("ascii")
@@ -25,41 +28,119 @@ SVN_ID  = "$Id: CnCServer.py 4782 2009-12-04 15:50:49Z dglo $"
 
 class BeanFieldNotFoundException(Exception): pass
 
+def _unFixString(obj):
+    "Convert a string holding an integer (of any size) to a number"
+    if obj.isdigit() or (obj[:1] == "-" and obj[1:].isdigit()):
+        return int(obj)
+    return obj
+
+def _unFixList(obj):
+    return [_UNFIX.get(type(v), _unFixOther)(v) for v in obj]
+
+def _unFixDict(obj):
+    for k, v in obj.iteritems():
+        obj[k] = _UNFIX.get(type(v), _unFixOther)(v)
+    return obj
+
+def _unFixOther(obj):
+    return obj
+
+# conversion functions for each type of value returned by an MBean server
+_UNFIX = { str : _unFixString, list : _unFixList, dict : _unFixDict }
+
+def unFixValue(obj):
+    """
+    Look for numbers masquerading as strings.  If an obj is a string
+    which holds an integer, return that integer (or long).  If obj is a
+    dict or list, recurse into it converting all such masquerading
+    strings.  All other types are unaltered.  This pairs with the
+    similarly named fix* methods in icecube.daq.juggler.mbean.XMLRPCServer
+    """
+    return _UNFIX.get(type(obj), _unFixOther)(obj)
+
+class BeanDiscoveryTask(object):
+    "Pool task which fetches the bean/field lists for an MBeanClient"
+    def __init__(self, client):
+        self.__client = client
+
+    def run(self):
+        self.__client.discover()
+
+class MBeanSetupTask(object):
+    "Pool task which creates a DAQClient's deferred MBeanClient"
+    def __init__(self, client):
+        self.__client = client
+
+    def run(self):
+        self.__client.openMBeanClient()
+
 class MBeanClient(object):
-    def __init__(self, compName, host, port):
+    """
+    Bean names are fetched from the component in the background and
+    field lists come from the schema shared by all components of the same
+    type, so creating a client doesn't wait on the component's MBean server
+    """
+
+    "workers used to discover component beans"
+    POOL = OperationPool(maxWorkers=8, minWorkers=1)
+
+    "maximum number of seconds to wait for bean discovery"
+    DISCOVERY_SECS = 30
+
+    def __init__(self, compName, host, port, compType=None):
         self.__compName = compName
         self.__client = RPCClient(host, port)
 
+        if compType is None:
+            compType = compName
+        self.__schema = BeanSchemaCache.load(compType)
+
+        self.__beanList = None
         self.__beanFields = {}
-        self.__beanList = self.__client.mbean.listMBeans()
-        for bean in self.__beanList:
-            self.__beanFields[bean] = self.__client.mbean.listGetters(bean)
-
-    @classmethod
-    def __unFixValue(cls,obj):
-
-        """ Look for numbers masquerading as strings.  If an obj is a
-        string and successfully converts to a number, return that
-        convertion.  If obj is a dict or list, recuse into it
-        converting all such masquerading strings.  All other types are
-        unaltered.  This pairs with the similarly named fix* methods in
-        icecube.daq.juggler.mbean.XMLRPCServer """
-
-        if type(obj) is dict:
-            for k in obj.keys():
-                obj[k] = cls.__unFixValue(obj[k])
-        elif type(obj) is list:
-            for i in xrange(0, len(obj)):
-                obj[i] = cls.__unFixValue(obj[i])
-        elif type(obj) is str:
-            try:
-                return int(obj)
-            except ValueError:
-                pass
-        return obj
 
+        self.__discoverCond = threading.Condition()
+        self.__discovering = False
+
+        # set to False if the MBean server has no getDictionary() method
+        self.__dictSupported = True
+
+        self.__discoverCond.acquire()
+        try:
+            self.__startDiscovery()
+        finally:
+            self.__discoverCond.release()
+
+    def __startDiscovery(self):
+        "This method assumes that self.__discoverCond has been acquired"
+        self.__discovering = True
+        self.POOL.submit(BeanDiscoveryTask(self))
+
+    def __waitForDiscovery(self):
+        """
+        Wait for bean discovery to finish, restarting it if an earlier
+        attempt failed.  Returns False if the bean list is unavailable.
+        """
+        self.__discoverCond.acquire()
+        try:
+            if self.__beanList is None and not self.__discovering:
+                self.__startDiscovery()
+
+            endTime = clock.monotonic() + self.DISCOVERY_SECS
+            while self.__beanList is None and self.__discovering:
+                waitSecs = endTime - clock.monotonic()
+                if waitSecs <= 0.0:
+                    break
+                self.__discoverCond.wait(waitSecs)
+
+            return self.__beanList is not None
+        finally:
+            self.__discoverCond.release()
 
     def checkBeanField(self, bean, fld):
+        if not self.__waitForDiscovery():
+            # can't check fields if the MBean server isn't answering
+            return
+
         if bean not in self.__beanList:
             msg = "Bean %s not in list of beans for %s" % \
                 (bean, self.__compName)
@@ -70,29 +151,87 @@ class MBeanClient(object):
                 (bean, fld, self.__compName, str(self.__beanFields[bean]))
             raise BeanFieldNotFoundException(msg)
 
+    def discover(self):
+        """
+        Fetch the list of beans from the component, asking for the fields
+        of any bean which isn't already in the shared schema
+        """
+        beanList = None
+        beanFields = {}
+        try:
+            try:
+                beanList = self.__client.mbean.listMBeans()
+                for bean in beanList:
+                    flds = self.__schema.fields(bean)
+                    if flds is None:
+                        flds = self.__client.mbean.listGetters(bean)
+                        self.__schema.setFields(bean, flds)
+                    beanFields[bean] = flds
+            except:
+                # leave the list empty so the next caller tries again
+                beanList = None
+        finally:
+            self.__discoverCond.acquire()
+            try:
+                if beanList is not None:
+                    self.__beanFields = beanFields
+                    self.__beanList = beanList
+                self.__discovering = False
+                self.__discoverCond.notifyAll()
+            finally:
+                self.__discoverCond.release()
+
+        if beanList is not None:
+            BeanSchemaCache.save(self.__schema)
+
     def get(self, bean, fld):
         self.checkBeanField(bean, fld)
 
-        return self.__unFixValue(self.__client.mbean.get(bean, fld))
+        return unFixValue(self.__client.mbean.get(bean, fld))
 
     def getAttributes(self, bean, fldList):
         attrs = self.__client.mbean.getAttributes(bean, fldList)
         if type(attrs) == dict and len(attrs) > 0:
             for k in attrs.keys():
-                attrs[k] = self.__unFixValue(attrs[k])
+                attrs[k] = unFixValue(attrs[k])
         return attrs
 
+    def getDictionary(self):
+        """
+        Return a dictionary mapping every bean name to a dictionary of
+        that bean's field values, fetched in a single call.  Returns None
+        if the component's MBean server cannot provide a snapshot.
+        """
+        if not self.__dictSupported:
+            return None
+
+        try:
+            attrs = self.__client.mbean.getDictionary()
+        except xmlrpclib.Fault:
+            # older MBean servers don't support bulk snapshots
+            self.__dictSupported = False
+            return None
+
+        if type(attrs) != dict:
+            return None
+
+        return unFixValue(attrs)
+
     def getBeanNames(self):
+        if not self.__waitForDiscovery():
+            return []
         return self.__beanList
 
     def getBeanFields(self, bean):
-        if bean not in self.__beanList:
+        if not self.__waitForDiscovery() or bean not in self.__beanList:
             msg = "Bean %s not in list of beans for %s" % \
                 (bean, self.__compName)
             raise BeanFieldNotFoundException(msg)
 
         return self.__beanFields[bean]
 
+atexit.register(MBeanClient.POOL.stop)
+
 class ComponentName(object):
     "DAQ component name"
     def __init__(self, name, num):
@@ -158,7 +297,7 @@ class DAQClient(ComponentName):
     STATE_DEAD = RunSet.STATE_DEAD
 
     def __init__(self, name, num, host, port, mbeanPort, connectors,
-                 quiet=False):
+                 quiet=False, deferMBean=False):
         """
         DAQClient constructor
         name - component name
@@ -167,6 +306,7 @@ class DAQClient(ComponentName):
         port - component port number
         mbeanPort - component MBean port number
         connectors - list of Connectors
+        deferMBean - if True, the MBean client is created in the background
         """
 
         super(DAQClient, self).__init__(name, num)
@@ -181,14 +321,22 @@ class DAQClient(ComponentName):
         self.__deadCount = 0
         self.__cmdOrder = None
 
+        # most recent state reported by the component (None if the
+        # component never reports its state changes)
+        self.__pushedState = None
+
         self.__log = self.createLogger(quiet=quiet)
 
         self.__client = self.createClient(host, port)
 
-        try:
-            self.__mbean = self.createMBeanClient(host, mbeanPort)
-        except:
-            self.__mbean = None
+        self.__mbean = None
+        self.__mbeanOpened = False
+        self.__mbeanLock = threading.Lock()
+
+        if deferMBean:
+            MBeanClient.POOL.submit(MBeanSetupTask(self))
+        else:
+            self.openMBeanClient()
 
     def __str__(self):
         "String description"
@@ -217,10 +365,12 @@ class DAQClient(ComponentName):
             (self.__id, self.fullName(), hpStr, mbeanStr, extraStr)
 
     def checkBeanField(self, bean, field):
-        if self.__mbean is not None:
-            self.__mbean.checkBeanField(bean, field)
+        mbean = self.openMBeanClient()
+        if mbean is not None:
+            mbean.checkBeanField(bean, field)
 
     def close(self):
+        RunSet.STATE_CACHE.forget(self)
         self.__log.close()
 
     def commitSubrun(self, subrunNum, latestTime):
@@ -264,7 +414,8 @@ class DAQClient(ComponentName):
         return CnCLogger(quiet=quiet)
 
     def createMBeanClient(self, host, mbeanPort):
-        return MBeanClient(self.fullName(), host, mbeanPort)
+        return MBeanClient(self.fullName(), host, mbeanPort,
+                           compType=self.name())
 
     def events(self, subrunNumber):
         "Get the number of events in the specified subrun"
@@ -286,20 +437,34 @@ class DAQClient(ComponentName):
             return None
 
     def getBeanFields(self, bean):
-        if self.__mbean is None:
+        mbean = self.openMBeanClient()
+        if mbean is None:
             return []
-        return self.__mbean.getBeanFields(bean)
+        return mbean.getBeanFields(bean)
+
+    def getBeanDictionary(self):
+        """
+        Return all bean field values in a single call, or None if the
+        component doesn't support bulk snapshots
+        """
+        mbean = self.openMBeanClient()
+        if mbean is None:
+            return None
+
+        return mbean.getDictionary()
 
     def getBeanNames(self):
-        if self.__mbean is None:
+        mbean = self.openMBeanClient()
+        if mbean is None:
             return []
-        return self.__mbean.getBeanNames()
+        return mbean.getBeanNames()
 
     def getMultiBeanFields(self, name, fieldList):
-        if self.__mbean is None:
+        mbean = self.openMBeanClient()
+        if mbean is None:
             return {}
 
-        return self.__mbean.getAttributes(name, fieldList)
+        return mbean.getAttributes(name, fieldList)
 
     def getNonstoppedConnectorsString(self):
         """
@@ -330,10 +495,11 @@ class DAQClient(ComponentName):
         return csStr
 
     def getSingleBeanField(self, name, field):
-        if self.__mbean is None:
+        mbean = self.openMBeanClient()
+        if mbean is None:
             return None
 
-        return self.__mbean.get(name, field)
+        return mbean.get(name, field)
 
     def host(self):
         return self.__host
@@ -393,6 +559,24 @@ class DAQClient(ComponentName):
         "Return the monitoring value"
         return self.state()
 
+    def openMBeanClient(self):
+        """
+        Return this component's MBean client, creating it if necessary.
+        Returns None if the client could not be created.
+        """
+        self.__mbeanLock.acquire()
+        try:
+            if not self.__mbeanOpened:
+                self.__mbeanOpened = True
+                try:
+                    self.__mbean = self.createMBeanClient(self.__host,
+                                                          self.__mbeanPort)
+                except:
+                    self.__mbean = None
+            return self.__mbean
+        finally:
+            self.__mbeanLock.release()
+
     def order(self):
         return self.__cmdOrder
 
@@ -428,6 +612,10 @@ class DAQClient(ComponentName):
             self.__log.error(exc_string())
             return None
 
+    def pushesState(self):
+        "Does this component report its own state changes?"
+        return self.__pushedState is not None
+
     def startSubrun(self, data):
         "Send subrun data to stringHubs"
         try:
@@ -455,6 +643,12 @@ class DAQClient(ComponentName):
 
         return state
 
+    def stateChanged(self, newState):
+        "Record a state change reported by the component"
+        self.__pushedState = newState
+        RunSet.STATE_CACHE.record(self, newState)
+        RunSet.STATE_NOTIFIER.notify()
+
     def stopRun(self):
         "Stop component processing DAQ data"
         try:
@@ -465,7 +659,7 @@ class DAQClient(ComponentName):
 
     def terminate(self):
         "Terminate component"
-        state = self.state()
+        state = RunSet.STATE_CACHE.state(self, RunSet.STATE_MAX_AGE_SECS)
         if state != "idle" and state != "ready" and \
                 state != self.STATE_MISSING and state != self.STATE_DEAD:
             raise DAQClientException("%s state is %s" % (self, state))
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 
-import unittest
-from DAQClient import DAQClient
+import os, threading, unittest
+from BeanSchemaCache import BeanSchemaCache
+from DAQClient import DAQClient, MBeanClient, unFixValue
+from DAQRPC import RPCServer
 
-from DAQMocks import MockAppender, MockCnCLogger
+from DAQMocks import MockAppender, MockCnCLogger, MockSchemaCacheDir
 
 class MostlyDAQClient(DAQClient):
     def __init__(self, name, num, host, port, mbeanPort, connectors, appender):
@@ -22,10 +24,150 @@ class MostlyDAQClient(DAQClient):
     def createMBeanClient(self, host, port):
         return None
 
+class DeferredDAQClient(DAQClient):
+    "DAQClient which creates its MBean client in the background"
+    def __init__(self, name, num, host, port, mbeanPort, connectors, appender):
+        self.__appender = appender
+        self.numCreated = 0
+
+        super(DeferredDAQClient, self).__init__(name, num, host, port,
+                                                mbeanPort, connectors,
+                                                quiet=True, deferMBean=True)
+
+    def createClient(self, host, port):
+        return None
+
+    def createLogger(self, quiet):
+        return MockCnCLogger(self.__appender, quiet)
+
+    def createMBeanClient(self, host, port):
+        self.numCreated += 1
+        return super(DeferredDAQClient, self).createMBeanClient(host, port)
+
+class BeanServer(object):
+    "Minimal MBean server which counts listGetters() calls"
+    def __init__(self, port, beanDict, valueDict=None):
+        self.__beanDict = beanDict
+        self.__valueDict = valueDict
+        self.numGetters = 0
+
+        self.__server = RPCServer(port)
+        self.__server.register_function(self.__listGetters,
+                                        'mbean.listGetters')
+        self.__server.register_function(self.__listMBeans, 'mbean.listMBeans')
+        if valueDict is not None:
+            self.__server.register_function(self.__getDictionary,
+                                            'mbean.getDictionary')
+
+        t = threading.Thread(name="BeanServer",
+                             target=self.__server.serve_forever)
+        t.setDaemon(True)
+        t.start()
+
+    def __getDictionary(self):
+        return self.__valueDict
+
+    def __listGetters(self, bean):
+        self.numGetters += 1
+        return self.__beanDict[bean]
+
+    def __listMBeans(self):
+        return self.__beanDict.keys()
+
+    def close(self):
+        self.__server.server_close()
+
 class TestDAQClient(unittest.TestCase):
+    def setUp(self):
+        self.__cacheDir = MockSchemaCacheDir()
+
+        self.__servers = []
+
+    def tearDown(self):
+        for srvr in self.__servers:
+            srvr.close()
+
+        self.__cacheDir.restore()
+
     def testInit(self):
         appender = MockAppender('test')
         MostlyDAQClient('foo', 0, 'localhost', 543, 0, [], appender)
 
+    def testUnFixValue(self):
+        self.assertEquals(12, unFixValue("12"))
+        self.assertEquals(-3, unFixValue("-3"))
+        self.assertEquals(12345678901234567890L,
+                          unFixValue("12345678901234567890"))
+        self.assertEquals(1.5, unFixValue(1.5))
+        for s in ("abc", "1.5", "-", "", "12abc"):
+            self.assertEquals(s, unFixValue(s))
+
+        self.assertEquals({ "a" : [1, "x", [2, 3]], "b" : { "c" : -4 } },
+                          unFixValue({ "a" : ["1", "x", ["2", "3"]],
+                                       "b" : { "c" : "-4" } }))
+
+    def testSharedSchema(self):
+        beanDict = { "abc" : ["x", "y"], "def" : ["z"] }
+
+        first = BeanServer(9891, beanDict)
+        self.__servers.append(first)
+        mc = MBeanClient("fooHub#1", "localhost", 9891, compType="fooHub")
+        self.assertEquals(["z"], mc.getBeanFields("def"))
+        mc.checkBeanField("abc", "y")
+        self.assertEquals(2, first.numGetters)
+
+        # a second component of the same type only adds its own new bean
+        beanDict["ghi"] = ["w"]
+        second = BeanServer(9892, beanDict)
+        self.__servers.append(second)
+        mc = MBeanClient("fooHub#2", "localhost", 9892, compType="fooHub")
+        self.assertEquals(["w"], mc.getBeanFields("ghi"))
+        self.assertEquals(1, second.numGetters)
+
+    def testDictionary(self):
+        beanDict = { "abc" : ["x", "y"] }
+        valueDict = { "abc" : { "x" : "12", "y" : "foo" } }
+
+        self.__servers.append(BeanServer(9894, beanDict, valueDict))
+        mc = MBeanClient("barHub#1", "localhost", 9894, compType="barHub")
+        self.assertEquals({ "abc" : { "x" : 12, "y" : "foo" } },
+                          mc.getDictionary())
+
+    def testNoDictionary(self):
+        beanDict = { "abc" : ["x", "y"] }
+
+        self.__servers.append(BeanServer(9895, beanDict))
+        mc = MBeanClient("barHub#2", "localhost", 9895, compType="barHub")
+        self.assertEquals(None, mc.getDictionary())
+        self.assertEquals(None, mc.getDictionary())
+
+    def testDeferMBean(self):
+        beanDict = { "abc" : ["x", "y"] }
+
+        self.__servers.append(BeanServer(9896, beanDict))
+        dc = DeferredDAQClient("bazHub", 1, "localhost", 543, 9896, [],
+                               MockAppender('test'))
+        self.assertEquals(["abc"], dc.getBeanNames())
+        self.assertEquals(["x", "y"], dc.getBeanFields("abc"))
+
+        # the background setup and the first request share one client
+        dc.openMBeanClient()
+        self.assertEquals(1, dc.numCreated)
+
+    def testUnknownJar(self):
+        # without a jar file, a saved schema couldn't be checked for
+        # staleness so the schema stays in memory
+        schema = BeanSchemaCache.load("noSuchComp")
+        self.assertEquals(None, schema.modTime())
+        schema.setFields("abc", ["x"])
+        BeanSchemaCache.save(schema)
+        self.assertEquals([], os.listdir(BeanSchemaCache.CACHE_DIR))
+        self.failUnless(schema.isChanged())
+
+    def testNoServer(self):
+        mc = MBeanClient("fooHub#3", "localhost", 9893, compType="fooHub")
+        self.assertEquals([], mc.getBeanNames())
+        mc.checkBeanField("abc", "x")
+
 if __name__ == '__main__':
     unittest.main()
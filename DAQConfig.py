@@ -641,6 +641,12 @@ class DomConfig(object):
         self.__commentOut = False
         self.__runCfgList = []
 
+        # indexes used to find DOMs without searching the whole list
+        # (if there are duplicates, the first DOM added is used)
+        self.__idMap = {}
+        self.__nameMap = {}
+        self.__posMap = {}
+
     def __cmp__(self, other):
         val = len(self.__domList) - len(other.__domList)
         if val == 0:
@@ -683,6 +689,17 @@ class DomConfig(object):
             self.__stringMap[dom.string()] = []
         self.__stringMap[dom.string()].append(dom)
 
+        if not self.__idMap.has_key(dom.id()):
+            self.__idMap[dom.id()] = dom
+        if not self.__nameMap.has_key(dom.name()):
+            self.__nameMap[dom.name()] = dom
+        key = (dom.string(), dom.pos())
+        if not self.__posMap.has_key(key):
+            self.__posMap[key] = dom
+
+        for rc in self.__runCfgList:
+            rc.domAdded(self, dom)
+
     def addRunConfig(self, runCfg):
         self.__runCfgList.append(runCfg)
 
@@ -702,32 +719,18 @@ class DomConfig(object):
         return self.__domList
 
     def getDOMByID(self, domid):
-        for d in self.__domList:
-            if d.id() == domid:
-                return d
-        return None
+        return self.__idMap.get(domid)
 
     def getDOMByName(self, name):
-        for d in self.__domList:
-            if d.name() == name:
-                return d
-        return None
+        return self.__nameMap.get(name)
 
     def getDOMByStringPos(self, string, pos):
-        for d in self.__domList:
-            if d.string() == string and d.pos() == pos:
-                return d
-        return None
+        return self.__posMap.get((string, pos))
 
     def getDOMsByHub(self, hub):
-        hubDoms = []
-        for d in self.__domList:
-            if d.string() == hub:
-                hubDoms.append(d)
-
-        if len(hubDoms) == 0:
+        if not self.__stringMap.has_key(hub):
             return None
-        return hubDoms
+        return self.__stringMap[hub][:]
 
     def hubs(self):
         """Get the list of strings whose DOMs are referenced in this file"""
@@ -843,6 +846,11 @@ class DAQConfig(object):
         self.__monitorPeriod = None
         self.__watchdogPeriod = None
 
+        # indexes of the DOMs in all dom configuration files
+        self.__domIdMap = {}
+        self.__domNameMap = {}
+        self.__domPosMap = {}
+
     def __cmp__(self, other):
         val = len(self.__comps) - len(other.__comps)
         if val == 0:
@@ -890,6 +898,26 @@ class DAQConfig(object):
             dcType = "names"
         return "%s[C*%d]%s" % (self.__fileName, len(self.__comps), dcType)
 
+    def __buildDomIndexes(self):
+        "Rebuild the DOM indexes from all dom configuration files"
+        self.__domIdMap = {}
+        self.__domNameMap = {}
+        self.__domPosMap = {}
+
+        for dc in self.__domCfgList:
+            for dom in dc.getAllDOMs():
+                self.__indexDom(dom)
+
+    def __indexDom(self, dom):
+        "Add the DOM to the indexes unless an earlier DOM is already there"
+        if not self.__domIdMap.has_key(dom.id()):
+            self.__domIdMap[dom.id()] = dom
+        if not self.__domNameMap.has_key(dom.name()):
+            self.__domNameMap[dom.name()] = dom
+        key = (dom.string(), dom.pos())
+        if not self.__domPosMap.has_key(key):
+            self.__domPosMap[key] = dom
+
     def __hasHubs(self):
         """Does this run configuration include any DOMs or replayHubs?"""
         for c in self.__comps:
@@ -914,6 +942,9 @@ class DAQConfig(object):
         self.__domCfgList.append(domCfg)
         domCfg.addRunConfig(self)
 
+        for dom in domCfg.getAllDOMs():
+            self.__indexDom(dom)
+
         hubs = domCfg.hubs()
         if hub is not None:
             if len(hubs) != 1:
@@ -984,8 +1015,19 @@ class DAQConfig(object):
                 del self.__domCfgList[i]
                 deleted = True
                 break
+
+        # another file may hold a DOM which was hidden by a deleted entry
+        self.__buildDomIndexes()
+
         return deleted
 
+    def domAdded(self, domCfg, dom):
+        "Called by DomConfig.addDom() after 'domCfg' is added to this config"
+        for dc in self.__domCfgList:
+            if dc is domCfg:
+                self.__indexDom(dom)
+                break
+
     def filename(self): 
         return self.__fileName
 
@@ -1006,18 +1048,15 @@ class DAQConfig(object):
         return "?%d?" % baseNum
 
     def getIDbyName(self, name):
-        for dc in self.__domCfgList:
-            dom = dc.getDOMByName(name)
-            if dom is not None:
-                return "%012x" % dom.id()
+        if self.__domNameMap.has_key(name):
+            return "%012x" % self.__domNameMap[name].id()
 
         raise DOMNotInConfigException("Cannot find DOM named \"%s\"" % name)
 
     def getIDbyStringPos(self, string, pos):
-        for dc in self.__domCfgList:
-            dom = dc.getDOMByStringPos(string, pos)
-            if dom is not None:
-                return "%012x" % dom.id()
+        key = (string, pos)
+        if self.__domPosMap.has_key(key):
+            return "%012x" % self.__domPosMap[key].id()
 
         raise DOMNotInConfigException("Cannot find string %d pos %d" %
                                       (string, pos))
@@ -1030,12 +1069,7 @@ class DAQConfig(object):
             except ValueError:
                 raise BadDOMID("Invalid DOM ID \"%s\"" % domid)
 
-        for dc in self.__domCfgList:
-            dom = dc.getDOMByID(domid)
-            if dom is not None:
-                return True
-
-        return False
+        return self.__domIdMap.has_key(domid)
 
     def monitorPeriod(self): 
         return self.__monitorPeriod
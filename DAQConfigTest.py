@@ -2,7 +2,8 @@
 
 import os, unittest
 
-from DAQConfig import DAQConfigParser
+from DAQConfig import DAQConfig, DAQConfigParser, DOMNotInConfigException, \
+    DomConfig, RunDom
 
 class DAQConfigTest(unittest.TestCase):
     def initPDAQHome(self):
@@ -184,5 +185,39 @@ class DAQConfigTest(unittest.TestCase):
             except:
                 self.fail('Unexpected component "%s"' % c)
 
+    def testDOMIndexes(self):
+        cfg = DAQConfig("indexes.xml")
+
+        dc1 = DomConfig("dc1.xml")
+        dc1.addDom(RunDom(0x111, 1, 1, "Alpha", dc1))
+        dc1.addDom(RunDom(0x112, 1, 2, "Beta", dc1))
+        cfg.addDomConfig(dc1)
+
+        dc2 = DomConfig("dc2.xml")
+        dc2.addDom(RunDom(0x221, 2, 1, "Gamma", dc2))
+        cfg.addDomConfig(dc2)
+
+        # DOMs added after the file was added to the run config are indexed
+        dc2.addDom(RunDom(0x222, 2, 2, "Delta", dc2))
+
+        self.lookup(cfg, [("000000000111", "Alpha", 1, 1),
+                          ("000000000222", "Delta", 2, 2)])
+        self.assertEquals([0x221, 0x222],
+                          [d.id() for d in dc2.getDOMsByHub(2)])
+        self.assertEquals(None, dc2.getDOMsByHub(1))
+
+        dc3 = DomConfig("dc3.xml")
+        dc3.addDom(RunDom(0x331, 3, 1, "Epsilon", dc3))
+        cfg.replace(dc2, [dc3, ])
+
+        self.failIf(cfg.hasDOM(0x221), "Replaced DOM was found")
+        self.failUnless(cfg.hasDOM("000000000331"), "New DOM was not found")
+        self.assertRaises(DOMNotInConfigException, cfg.getIDbyName, "Gamma")
+        self.assertRaises(DOMNotInConfigException, cfg.getIDbyStringPos, 2, 2)
+
+        cfg.deleteDomConfig(dc1)
+        self.failIf(cfg.hasDOM(0x111), "Deleted DOM was found")
+        self.assertEquals("000000000331", cfg.getIDbyName("Epsilon"))
+
 if __name__ == '__main__':
     unittest.main()
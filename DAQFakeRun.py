@@ -694,10 +694,58 @@ class FakeClient(ServerProxy, threading.Thread):
 
         self.__createConnectorSockets()
 
-        regData = self.rpc_component_register(self.__name, self.__num,
-                                              FakeClient.LOCAL_ADDR,
-                                              self.__rpcPort, self.__mbeanPort,
-                                              self.__getConnectorList())
+        regData = self.rpc_component_register(*self.registrationData())
+        self.setRegistration(regData)
+
+        return 2
+
+    @staticmethod
+    def registerAll(clients):
+        """
+        Create input sockets for all clients and register them with
+        CnCServer in a single call.  Returns the number of components which
+        were registered.
+        """
+        regList = []
+        for c in clients:
+            if c.registrationData() is not None:
+                regList.append(c)
+        if len(regList) == 0:
+            return 0
+
+        for c in regList:
+            c.__createConnectorSockets()
+
+        regArray = [c.registrationData() for c in regList]
+        rtnList = regList[0].rpc_component_register_batch(regArray)
+
+        num = 0
+        for i in range(len(regList)):
+            if rtnList[i].has_key("error"):
+                print >>sys.stderr, "Cannot register %s: %s" % \
+                    (regList[i], rtnList[i]["error"])
+                continue
+
+            regList[i].setRegistration(rtnList[i])
+            num += 1
+
+        return num
+
+    def registrationData(self):
+        """
+        Return the arguments used to register this component with
+        CnCServer, or None if the real component should be used
+        """
+        if self.__rpcPort is None: return None
+
+        return (self.__name, self.__num, FakeClient.LOCAL_ADDR, self.__rpcPort,
+                self.__mbeanPort, self.__getConnectorList())
+
+    def setRegistration(self, regData):
+        """
+        Save the ID returned by CnCServer and open connections to the
+        loggers it specified
+        """
         self.__clientId = regData["id"]
         self.__serverId = regData["serverId"]
 
@@ -711,8 +759,6 @@ class FakeClient(ServerProxy, threading.Thread):
             self.__liveLog = self.__openLogClient(regData["liveIP"],
                                                   regData["livePort"])
 
-        return 2
-
     def run(self):
         "Run the XML-RPC server until asked to stop"
 
@@ -1296,8 +1342,14 @@ class DAQFakeRun(object):
         del self.__logThreads[:]
 
     @staticmethod
-    def createComps(compData, forkClients):
-        "create and start components"
+    def createComps(compData, forkClients, batchRegister=False):
+        """
+        create and start components
+        if 'batchRegister' is True (and clients aren't forked), all
+        components are registered with a single CnCServer call
+        """
+        batch = batchRegister and not forkClients
+
         comps = []
         for cd in compData:
             client = cd.getFakeClient()
@@ -1305,9 +1357,14 @@ class DAQFakeRun(object):
                 if client.fork() == 0: return
 
             client.start()
-            client.register()
+            if not batch:
+                client.register()
 
             comps.append(client)
+
+        if batch:
+            FakeClient.registerAll(comps)
+
         return comps
 
     @classmethod
@@ -1383,7 +1440,7 @@ class DAQFakeRun(object):
         return runsetId
 
     def runAll(self, compData, startNum, numRuns, duration, runCfgDir,
-               forkClients):
+               forkClients, batchRegister=False):
         runNum = startNum
 
         # do all the runs
@@ -1395,7 +1452,7 @@ class DAQFakeRun(object):
 
             # create components
             #
-            comps = self.createComps(compData, forkClients)
+            comps = self.createComps(compData, forkClients, batchRegister)
 
             # wait for all components to be registered
             #
@@ -1431,6 +1488,9 @@ if __name__ == "__main__":
     parser.add_option("-a", "--trackEngine", dest="trackEng",
                       action="store_true", default=False,
                       help="Use existing track engine")
+    parser.add_option("-B", "--batchRegister", dest="batchRegister",
+                      action="store_true", default=False,
+                      help="Register all components with a single call")
     parser.add_option("-c", "--config", type="string", dest="runCfgDir",
                       action="store", default="/tmp/config",
                       help="Run configuration directory")
@@ -1519,4 +1579,4 @@ if __name__ == "__main__":
     #
     runner = DAQFakeRun()
     runner.runAll(compData, opt.runNum, opt.numRuns, opt.duration,
-                  opt.runCfgDir, opt.forkClients)
+                  opt.runCfgDir, opt.forkClients, opt.batchRegister)
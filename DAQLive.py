@@ -76,7 +76,7 @@ class DAQLive(Component):
             raise LiveException("stateArgs does not contain key \"%s\"" % key)
 
         if self.__runSet is not None and not self.__runSet.isDestroyed():
-            self.__cnc.breakRunset(self.__runSet)
+            self.__cnc.breakRunset(self.__runSet, keepWarm=True)
 
         self.__runSet = self.__cnc.makeRunsetFromRunConfig(runCfg)
         if self.__runSet is None:
@@ -97,7 +97,10 @@ class DAQLive(Component):
 
         # XXX could get rid of this if 'livecmd' released runsets on exit
         #
-        self.__cnc.breakRunset(self.__runSet)
+        # (a cleanly stopped runset is kept warm so the next run can reuse it
+        # if the run configuration hasn't changed)
+        #
+        self.__cnc.breakRunset(self.__runSet, keepWarm=not gotError)
 
         if gotError:
             raise LiveException("Encountered ERROR while stopping run")
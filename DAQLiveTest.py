@@ -71,7 +71,7 @@ class MockCnC(object):
         self.__expStopErr = False
         self.__runSet = None
 
-    def breakRunset(self, rs):
+    def breakRunset(self, rs, keepWarm=False):
         rs.destroy()
 
     def makeRunsetFromRunConfig(self, runCfg):
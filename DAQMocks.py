@@ -2,8 +2,10 @@
 #
 # Classes used for pDAQ unit testing
 
-import datetime, os, re, select, socket, sys, tempfile, threading, time
+import datetime, os, re, select, shutil, socket, sys, tempfile, threading
+import time
 
+from BeanSchemaCache import BeanSchemaCache
 from CnCLogger import CnCLogger
 from Component import Component
 from DAQClient import DAQClient
@@ -554,6 +556,9 @@ class MockComponent(object):
         self.__num = num
         self.__host = host
 
+        # share DAQClient's IDs so mock and real components never collide
+        self.__id = DAQClient.ID.next()
+
         self.__connectors = []
         self.__cmdOrder = None
 
@@ -630,6 +635,9 @@ class MockComponent(object):
     def host(self):
         return self.__host
 
+    def id(self):
+        return self.__id
+
     def isBuilder(self):
         return self.__isBldr
 
@@ -664,6 +672,9 @@ class MockComponent(object):
     def prepareSubrun(self, id):
         pass
 
+    def pushesState(self):
+        return False
+
     def reset(self):
         self.__connected = False
         self.__configured = False
@@ -1127,6 +1138,19 @@ class MockRunConfigFile(object):
         return SimDOMXML(mbid)
 
 
+class MockSchemaCacheDir(object):
+    "Save BeanSchemaCache files in a temporary directory"
+
+    def __init__(self):
+        self.__origDir = BeanSchemaCache.CACHE_DIR
+        self.__dir = tempfile.mkdtemp()
+        BeanSchemaCache.CACHE_DIR = self.__dir
+
+    def restore(self):
+        "Point BeanSchemaCache back at its original directory"
+        BeanSchemaCache.CACHE_DIR = self.__origDir
+        shutil.rmtree(self.__dir, ignore_errors=True)
+
 class MockXMLRPC(object):
     LOUD = False
 
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-import shutil, tempfile, unittest
+import shutil, tempfile, threading, time, unittest
 from CnCServer import DAQPool
 from DAQClient import DAQClient
 from LiveImports import LIVE_IMPORT
@@ -21,6 +21,19 @@ class FakeTaskManager(object):
     def start(self): pass
     def stop(self): pass
 
+class HangingComponent(MockComponent):
+    def __init__(self, name, num):
+        self.__event = threading.Event()
+
+        super(HangingComponent, self).__init__(name, num)
+
+    def monitor(self):
+        self.__event.wait()
+        return super(HangingComponent, self).monitor()
+
+    def release(self):
+        self.__event.set()
+
 class MyRunSet(RunSet):
     def __init__(self, parent, runConfig, compList, logger):
         self.__logDict = {}
@@ -166,14 +179,65 @@ class TestDAQPool(unittest.TestCase):
         found = mgr.findRunset(runset.id())
         self.failIf(found is None, "Couldn't find runset #%d" % runset.id())
 
+        idList = [c.id() for c in compList]
+        self.assertEqual(len(compList), len(mgr.findComponents(idList)))
+        self.assertEqual([], mgr.findComponents(idList, includeRunsets=False))
+
         mgr.returnRunset(runset, logger)
 
         self.assertEqual(mgr.numComponents(), len(compList))
+        self.assertEqual(compList[1:], mgr.findComponents([compList[1].id(),
+                                                           -1]))
 
         for c in compList:
             mgr.remove(c)
 
         self.assertEqual(mgr.numComponents(), 0)
+        self.assertEqual([], mgr.findComponents(idList))
+
+        logger.checkStatus(10)
+
+    def testBuildWaitForComponent(self):
+        self.__runConfigDir = tempfile.mkdtemp()
+
+        mgr = MyDAQPool()
+
+        fooHub = MockComponent('fooHub', 0)
+        fooHub.addOutput('aaa')
+
+        barComp = MockComponent('bar', 0)
+        barComp.addInput('aaa', 1234)
+
+        compList = [fooHub, barComp]
+
+        mgr.add(fooHub)
+
+        runConfig = self.__createRunConfigFile(compList)
+
+        logger = MockLogger('main')
+        logger.addExpectedExact("Loading run configuration \"%s\"" %
+                                runConfig)
+        logger.addExpectedExact("Loaded run configuration \"%s\"" % runConfig)
+        logger.addExpectedExact("Waiting for [%s]" % barComp.fullName())
+        logger.addExpectedRegexp("Built runset #\d+: .*")
+
+        # the runset should be built as soon as the missing component
+        # registers, not after the next polling interval
+        adder = threading.Timer(0.5, mgr.add, (barComp, ))
+        adder.start()
+
+        start = time.time()
+        runset = mgr.makeRunset(self.__runConfigDir, runConfig, 30, logger,
+                                forceRestart=False, strict=False)
+        self.failUnless(time.time() - start < DAQPool.WAIT_LOG_SECS,
+                        "Runset was not built when component was added")
+        adder.join()
+
+        self.assertEqual(mgr.numComponents(), 0)
+
+        mgr.returnRunset(runset, logger)
+
+        self.assertEqual(mgr.numComponents(), len(compList))
 
         logger.checkStatus(10)
 
@@ -737,5 +801,68 @@ class TestDAQPool(unittest.TestCase):
         for c in compList:
             self.assertEqual(c.monitorCount(), 2)
 
+        stats = mgr.monitorStats()
+        self.assertEqual(2, stats["sweeps"])
+        self.assertEqual(3, stats["checked"])
+        self.assertEqual(1, stats["alive"])
+        self.assertEqual(1, stats["missing"])
+        self.assertEqual(1, stats["dead"])
+
+    def testMonitorPeriod(self):
+        mgr = MyDAQPool()
+
+        fooComp = MockComponent('foo', 0)
+        mgr.add(fooComp)
+        self.assertEqual(DAQPool.MONITOR_MIN_SECS, mgr.monitorPeriod())
+
+        # back off while nothing changes
+        self.assertEqual(1, mgr.monitorClients())
+        self.assertEqual(DAQPool.MONITOR_MIN_SECS, mgr.monitorPeriod())
+        mgr.monitorClients()
+        self.assertEqual(DAQPool.MONITOR_MIN_SECS * 2, mgr.monitorPeriod())
+        mgr.monitorClients()
+        self.assertEqual(DAQPool.MONITOR_MIN_SECS * 4, mgr.monitorPeriod())
+
+        # speed up as soon as another component registers
+        mgr.add(MockComponent('bar', 0))
+        self.assertEqual(DAQPool.MONITOR_MIN_SECS, mgr.monitorPeriod())
+
+        # ...or a component stops answering
+        mgr.monitorClients()
+        mgr.monitorClients()
+        self.assertEqual(DAQPool.MONITOR_MIN_SECS * 2, mgr.monitorPeriod())
+        fooComp.setMonitorState(DAQClient.STATE_MISSING)
+        self.assertEqual(1, mgr.monitorClients())
+        self.assertEqual(DAQPool.MONITOR_MIN_SECS, mgr.monitorPeriod())
+
+    def testMonitorHung(self):
+        mgr = MyDAQPool()
+        mgr.MONITOR_DEADLINE_SECS = 0.1
+
+        fooComp = MockComponent('foo', 0)
+        hungComp = HangingComponent('hung', 0)
+        for c in (fooComp, hungComp):
+            mgr.add(c)
+
+        try:
+            self.assertEqual(1, mgr.monitorClients())
+            self.assertEqual(1, mgr.monitorStats()["hung"])
+
+            # a hung component isn't checked again until it answers
+            self.assertEqual(1, mgr.monitorClients())
+            self.assertEqual(2, fooComp.monitorCount())
+            self.assertEqual(0, hungComp.monitorCount())
+        finally:
+            hungComp.release()
+
+        for i in range(20):
+            if hungComp.monitorCount() > 0:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(2, mgr.monitorClients())
+        self.assertEqual(0, mgr.monitorStats()["hung"])
+        self.assertEqual(2, hungComp.monitorCount())
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,29 +7,379 @@
 # J. Jacobsen, for UW-IceCube 2006-2007
 #
 
-import DocXMLRPCServer, datetime, math, select, socket, traceback, xmlrpclib
+import DocXMLRPCServer, Queue, bisect, httplib, math, select, socket, sys, \
+    threading, traceback, xmlrpclib
+
+from utils import clock
+
+try:
+    import json
+except ImportError:
+    json = None
+
+"content type of requests and responses using the compact encoding"
+JSON_CONTENT_TYPE = "application/json"
+
+class EncodingNotSupported(Exception): pass
+
+def _asStrings(obj):
+    """
+    JSON decoders return every string as unicode, but callers expect
+    the plain strings returned by xmlrpclib for ASCII data
+    """
+    t = type(obj)
+    if t is unicode:
+        try:
+            return obj.encode("ascii")
+        except UnicodeError:
+            return obj
+    if t is list:
+        return [_asStrings(v) for v in obj]
+    if t is dict:
+        newDict = {}
+        for k, v in obj.iteritems():
+            newDict[_asStrings(k)] = _asStrings(v)
+        return newDict
+    return obj
+
+def _jsonDefault(obj):
+    "Encode XML-RPC specific types which JSON doesn't support"
+    if isinstance(obj, xmlrpclib.DateTime):
+        return obj.value
+    if isinstance(obj, xmlrpclib.Binary):
+        return obj.data
+    raise TypeError("Cannot encode %s as JSON" % type(obj))
+
+def jsonDumps(obj):
+    return json.dumps(obj, separators=(",", ":"), default=_jsonDefault)
+
+def jsonLoads(data):
+    return _asStrings(json.loads(data))
+
+class KeepAliveTransport(xmlrpclib.Transport):
+    """
+    XML-RPC transport which keeps an HTTP/1.1 connection open and reuses it
+    for subsequent calls.  Each thread gets its own connection (a single
+    HTTPConnection cannot be shared by concurrent callers) and a stale
+    cached connection is replaced and the request is retried once.
+    """
+
+    def __init__(self, connectSecs=None, readSecs=None):
+        """
+        connectSecs - default number of seconds to wait for a connection
+        readSecs - default number of seconds to wait for a response
+        """
+        xmlrpclib.Transport.__init__(self)
+
+        self.__connectSecs = connectSecs
+        self.__readSecs = readSecs
+
+        self.__local = threading.local()
+
+        self.__statLock = threading.Lock()
+        self.__numConnects = 0
+        self.__numReused = 0
+        self.__numRetries = 0
+
+    def __closeConnection(self):
+        "Close this thread's cached connection"
+        conn = getattr(self.__local, "conn", None)
+        if conn is not None:
+            try:
+                conn.close()
+            except:
+                pass
+        self.__local.conn = None
+        self.__local.host = None
+
+    def __count(self, reused, retried=False):
+        self.__statLock.acquire()
+        try:
+            if reused:
+                self.__numReused += 1
+            else:
+                self.__numConnects += 1
+            if retried:
+                self.__numRetries += 1
+        finally:
+            self.__statLock.release()
+
+    def __getConnection(self, host):
+        """
+        Return a tuple containing this thread's connection to 'host' and
+        a flag indicating whether the connection was already open
+        """
+        conn = getattr(self.__local, "conn", None)
+        if conn is not None and self.__local.host != host:
+            self.__closeConnection()
+            conn = None
+
+        if conn is None:
+            conn = httplib.HTTPConnection(host)
+            self.__local.conn = conn
+            self.__local.host = host
+
+        # httplib drops the socket if the server asked to close it
+        return (conn, conn.sock is not None)
+
+    def __post(self, host, handler, request_body, verbose, contentType):
+        """
+        Send a request, retrying once if a cached connection has gone cold.
+        Returns a tuple of (response content type, response body)
+        """
+        for attempt in (0, 1):
+            (conn, reused) = self.__getConnection(host)
+            self.__local.reused = reused
+            self.__count(reused, attempt > 0)
+            try:
+                return self.__singleRequest(conn, host, handler, request_body,
+                                            verbose, contentType)
+            except socket.timeout:
+                self.__closeConnection()
+                raise
+            except (socket.error, httplib.HTTPException):
+                self.__closeConnection()
+                # only a cached connection which has gone cold is retried
+                if not reused or attempt > 0:
+                    raise
+
+    def __singleRequest(self, conn, host, handler, request_body, verbose,
+                        contentType):
+        (connectSecs, readSecs) = self.timeouts()
+        if conn.sock is None:
+            conn.timeout = connectSecs
+            conn.connect()
+        conn.sock.settimeout(readSecs)
+
+        conn.set_debuglevel(verbose)
+        conn.putrequest("POST", handler, skip_accept_encoding=True)
+        conn.putheader("Content-Type", contentType)
+        conn.putheader("Content-Length", str(len(request_body)))
+        conn.putheader("User-Agent", self.user_agent)
+        conn.endheaders()
+        conn.send(request_body)
+
+        resp = conn.getresponse()
+        data = resp.read()
+
+        if resp.status != 200:
+            raise xmlrpclib.ProtocolError(host + handler, resp.status,
+                                          resp.reason, resp.msg)
+
+        return (resp.getheader("Content-Type", ""), data)
+
+    def close(self):
+        "Close the calling thread's connection"
+        self.__closeConnection()
+
+    def lastReused(self):
+        "Did the calling thread's most recent request reuse a connection?"
+        return getattr(self.__local, "reused", False)
+
+    def jsonRequest(self, host, handler, methodname, params, verbose=0):
+        """
+        Call 'methodname' using the compact JSON encoding.
+        Raises EncodingNotSupported if the server didn't answer in JSON,
+        which means the method was not run and should be resent as XML-RPC
+        """
+        body = jsonDumps({ "method" : methodname, "params" : params })
+
+        try:
+            (contentType, data) = self.__post(host, handler, body, verbose,
+                                              JSON_CONTENT_TYPE)
+        except xmlrpclib.ProtocolError, pe:
+            raise EncodingNotSupported("%s returned HTTP %d" %
+                                       (host, pe.errcode))
+
+        if not contentType.startswith(JSON_CONTENT_TYPE):
+            raise EncodingNotSupported("%s returned \"%s\" data" %
+                                       (host, contentType))
+
+        rtnval = jsonLoads(data)
+        if rtnval.has_key("fault"):
+            fault = rtnval["fault"]
+            raise xmlrpclib.Fault(fault["faultCode"], fault["faultString"])
+
+        return rtnval["result"]
+
+    def request(self, host, handler, request_body, verbose=0):
+        (contentType, data) = self.__post(host, handler, request_body,
+                                          verbose, "text/xml")
+
+        (parser, unmarshaller) = self.getparser()
+        parser.feed(data)
+        parser.close()
+
+        return unmarshaller.close()
+
+    def setTimeouts(self, connectSecs, readSecs):
+        """
+        Set the connect and read timeouts used by the calling thread's
+        subsequent requests
+        """
+        self.__local.timeouts = (connectSecs, readSecs)
+
+    def stats(self):
+        "Return a tuple of (new connections, reused connections, retries)"
+        self.__statLock.acquire()
+        try:
+            return (self.__numConnects, self.__numReused, self.__numRetries)
+        finally:
+            self.__statLock.release()
+
+    def timeouts(self):
+        "Return the calling thread's (connect, read) timeouts"
+        return getattr(self.__local, "timeouts",
+                       (self.__connectSecs, self.__readSecs))
 
 class RPCClient(xmlrpclib.ServerProxy):
 
     "number of seconds before RPC call is aborted"
     TIMEOUT_SECS = 120
 
+    "number of seconds before a connection attempt is aborted"
+    CONNECT_TIMEOUT_SECS = 10
+
+    "per-method overrides for TIMEOUT_SECS"
+    METHOD_TIMEOUTS = {
+        "xmlrpc.getState" : 2,
+        "xmlrpc.configure" : 60,
+        "xmlrpc.startSubrun" : 30,
+    }
+
+    "use the compact JSON encoding with servers which support it"
+    USE_JSON = json is not None
+
+    """
+    map (host, port) to True for servers which have answered a JSON request
+    and to False for servers which only understand XML-RPC, so later
+    clients don't need to renegotiate the encoding
+    """
+    JSON_SERVERS = {}
+
     "Generic class for accessing methods on remote objects"
-    "WARNING: instantiating RPCClient sets socket default timeout duration!"
-    def __init__(self, servername, portnum, verbose=0, timeout=TIMEOUT_SECS):
-        
+    def __init__(self, servername, portnum, verbose=0, timeout=TIMEOUT_SECS,
+                 connectTimeout=CONNECT_TIMEOUT_SECS, useJSON=None):
+
         self.servername = servername
         self.portnum    = portnum
-        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-        # !!!!!! Warning - this is ugly !!!!!!!
-        # !!!! but no other way in XMLRPC? !!!!
-        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-        socket.setdefaulttimeout(timeout)
+
+        if useJSON is None:
+            useJSON = self.USE_JSON
+        self.__useJSON = useJSON and json is not None and \
+            self.JSON_SERVERS.get((servername, portnum), True)
+
+        self.__timeout = timeout
+        self.__connectTimeout = connectTimeout
+        self.__methodTimeouts = self.METHOD_TIMEOUTS.copy()
+
+        self.__transport = self.createTransport()
         xmlrpclib.ServerProxy.__init__(self,
                                        "http://%s:%s" %
                                        (self.servername, self.portnum),
+                                       transport=self.__transport,
                                        verbose=verbose)
         self.statDict = { }
+        self.__statLock = threading.Lock()
+
+    def _ServerProxy__request(self, methodname, params):
+        """
+        Send all remote calls through the keep-alive transport,
+        accumulating per-method timing statistics
+        """
+        self.__transport.setTimeouts(self.__connectTimeout,
+                                     self.timeout(methodname))
+        tstart = clock.monotonic()
+        try:
+            if self.__useJSON:
+                key = (self.servername, self.portnum)
+                negotiated = self.JSON_SERVERS.has_key(key)
+                try:
+                    rtnval = self.__jsonRequest(methodname, params)
+                except EncodingNotSupported:
+                    # server didn't understand the request, so resend it
+                    self.__disableJSON()
+                except socket.timeout:
+                    # the server may still be running the call
+                    raise
+                except (socket.error, httplib.HTTPException):
+                    if negotiated:
+                        raise
+
+                    # an XML-RPC-only server may hang up on a request it
+                    # can't parse, so try XML-RPC before giving up
+                    rtnval = self.__xmlRequest(methodname, params)
+                    self.__disableJSON()
+                    return rtnval
+                else:
+                    if not negotiated:
+                        self.JSON_SERVERS[key] = True
+                    return rtnval
+
+            return self.__xmlRequest(methodname, params)
+        finally:
+            self.__getStat(methodname).tally(clock.monotonic() - tstart,
+                                             self.__transport.lastReused())
+
+    def __disableJSON(self):
+        "Remember that this server only understands XML-RPC"
+        self.__useJSON = False
+        self.JSON_SERVERS[(self.servername, self.portnum)] = False
+
+    def __jsonRequest(self, methodname, params):
+        return self.__transport.jsonRequest(self._ServerProxy__host,
+                                            self._ServerProxy__handler,
+                                            methodname, params,
+                                            self._ServerProxy__verbose)
+
+    def __xmlRequest(self, methodname, params):
+        return xmlrpclib.ServerProxy._ServerProxy__request(self, methodname,
+                                                           params)
+
+    def __getStat(self, methodname):
+        "Return the statistics object for 'methodname', creating it if needed"
+        stat = self.statDict.get(methodname)
+        if stat is None:
+            self.__statLock.acquire()
+            try:
+                stat = self.statDict.get(methodname)
+                if stat is None:
+                    stat = RPCStat()
+                    self.statDict[methodname] = stat
+            finally:
+                self.__statLock.release()
+        return stat
+
+    def connectionStats(self):
+        """
+        Return a tuple of (new connections, reused connections, retries)
+        for this client
+        """
+        return self.__transport.stats()
+
+    def createTransport(self):
+        return KeepAliveTransport(self.__connectTimeout, self.__timeout)
+
+    def isJSON(self):
+        "Is this client using the compact JSON encoding?"
+        return self.__useJSON
+
+    def setTimeout(self, methodname, secs):
+        """
+        Override the number of seconds to wait for 'methodname' to return
+        (if 'secs' is None, revert to the default timeout)
+        """
+        if secs is None:
+            if self.__methodTimeouts.has_key(methodname):
+                del self.__methodTimeouts[methodname]
+        else:
+            self.__methodTimeouts[methodname] = secs
+
+    def timeout(self, methodname):
+        "Return the number of seconds to wait for 'methodname' to return"
+        if self.__methodTimeouts.has_key(methodname):
+            return self.__methodTimeouts[methodname]
+        return self.__timeout
 
     def showStats(self):
         "Return string representation of accumulated statistics"
@@ -37,6 +387,8 @@ class RPCClient(xmlrpclib.ServerProxy):
         r = ""
         for x in self.callList():
             r += "%25s: %s\n" % (x, self.statDict[x].report())
+        r += "%25s: %d new, %d reused, %d retried\n" % \
+            (("connections", ) + self.connectionStats())
         return r
 
     def nCalls(self):
@@ -46,27 +398,55 @@ class RPCClient(xmlrpclib.ServerProxy):
     def callList(self):
         "Return list of registered methods"
         return self.statDict.keys()
-        
+
+    def latencies(self):
+        """
+        Return a dictionary mapping each method name to a tuple of
+        (number of calls, 50th, 95th and 99th percentile latency in seconds)
+        """
+        latDict = {}
+        for x in self.callList():
+            stat = self.statDict[x]
+            pcts = stat.percentiles()
+            if pcts is not None:
+                latDict[x] = (stat.n, ) + pcts
+        return latDict
+
     def rpccall(self, method, *rest):
-        "Wrapper to benchmark speed of various RPC calls"
-        if not self.statDict.has_key(method):
-            self.statDict[method] = RPCStat()
-        tstart = datetime.datetime.now()
-        reststr = ""
-        if len(rest) > 0:
-            reststr += `rest[0]`
-            for x in rest[1:]:
-                reststr += ",%s" % `x`
-        code = "self.%s(%s)" % (method, reststr)
-        try:
-            result = eval(code)
-            self.statDict[method].tally(datetime.datetime.now()-tstart)
+        """
+        Call remote method 'method' (e.g. "rpc_ping" or "xmlrpc.getState").
+        Timing statistics are collected for every remote call, so this is
+        just a convenience for callers which have the name in a string.
+        """
+        return getattr(self, method)(*rest)
+
+class RPCRequestHandler(DocXMLRPCServer.DocXMLRPCRequestHandler):
+    "Handle XML-RPC requests as well as JSON-encoded requests"
+
+    def do_POST(self):
+        contentType = self.headers.get("Content-Type", "")
+        if json is None or not contentType.startswith(JSON_CONTENT_TYPE):
+            DocXMLRPCServer.DocXMLRPCRequestHandler.do_POST(self)
+            return
+
+        if not self.is_rpc_path_valid():
+            self.report_404()
+            return
+
+        try:
+            data = self.rfile.read(int(self.headers["content-length"]))
+            response = self.server.jsonDispatch(data)
         except:
-            self.statDict[method].tally(datetime.datetime.now()-tstart)
-            raise
-        
-        return result
-        
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-type", JSON_CONTENT_TYPE)
+        self.send_header("Content-length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
 class RPCServer(DocXMLRPCServer.DocXMLRPCServer):
     "Generic class for serving methods to remote objects"
     # also inherited: register_function
@@ -80,11 +460,34 @@ class RPCServer(DocXMLRPCServer.DocXMLRPCServer):
 
         self.allow_reuse_address = True
         DocXMLRPCServer.DocXMLRPCServer.__init__(self, ('', portnum),
+                                                 RPCRequestHandler,
                                                  logRequests=False)
         self.set_server_title("Server Methods")
         self.set_server_name("DAQ server at %s:%s" % (servername, portnum))
         self.set_server_documentation(documentation)
 
+    def jsonDispatch(self, data):
+        "Run a JSON-encoded request and return the JSON-encoded response"
+        try:
+            req = jsonLoads(data)
+            rtnval = { "result" : self._dispatch(req["method"],
+                                                 req["params"]) }
+        except xmlrpclib.Fault, fault:
+            rtnval = { "fault" : { "faultCode" : fault.faultCode,
+                                   "faultString" : fault.faultString } }
+        except:
+            # use the same fault format as SimpleXMLRPCServer
+            (excType, excValue) = sys.exc_info()[:2]
+            rtnval = { "fault" : { "faultCode" : 1,
+                                   "faultString" : "%s:%s" % (excType,
+                                                              excValue) } }
+
+        try:
+            return jsonDumps(rtnval)
+        except (TypeError, ValueError), ex:
+            return jsonDumps({ "fault" : { "faultCode" : 1,
+                                           "faultString" : str(ex) } })
+
     def server_close(self):
         self.__running = False
         DocXMLRPCServer.DocXMLRPCServer.server_close(self)
@@ -104,46 +507,297 @@ class RPCServer(DocXMLRPCServer.DocXMLRPCServer):
             if r:
                 self.handle_request()
 
+class PooledRPCServer(RPCServer):
+    """
+    RPCServer which hands requests to a fixed pool of worker threads.
+    Requests which arrive while 'maxQueued' requests are already waiting
+    are refused (the connection is closed) rather than queued.
+    Per-method latency, queue wait and in-flight counts are available
+    from serverStats().
+    """
+
+    "number of worker threads"
+    NUM_WORKERS = 16
+    "maximum number of requests waiting for a worker"
+    MAX_QUEUED = 128
+
+    def __init__(self, portnum, servername="localhost",
+                 documentation="DAQ Server", timeout=60,
+                 numWorkers=NUM_WORKERS, maxQueued=MAX_QUEUED):
+        self.__numWorkers = numWorkers
+        self.__maxQueued = maxQueued
+
+        self.__queue = Queue.Queue()
+        self.__workers = []
+
+        self.__statLock = threading.Lock()
+        self.__latency = {}
+        self.__queueWait = {}
+        self.__inFlight = {}
+        self.__numQueued = 0
+        self.__peakQueued = 0
+        self.__numRejected = 0
+        self.__numBusy = 0
+
+        # queue wait for the request being handled by each worker
+        self.__local = threading.local()
+
+        RPCServer.__init__(self, portnum, servername=servername,
+                           documentation=documentation, timeout=timeout)
+
+    def __startWorkers(self):
+        "This method assumes that self.__statLock has already been acquired"
+        while len(self.__workers) < self.__numWorkers:
+            name = "RPCServer#%d:Worker#%d" % \
+                (self.portnum, len(self.__workers) + 1)
+            thread = threading.Thread(name=name, target=self.__work)
+            thread.setDaemon(True)
+            thread.start()
+            self.__workers.append(thread)
+
+    def __work(self):
+        "Worker thread main loop"
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                break
+
+            (request, client_address, queueTime) = item
+
+            self.__statLock.acquire()
+            try:
+                self.__numQueued -= 1
+                self.__numBusy += 1
+            finally:
+                self.__statLock.release()
+
+            self.__local.queueWait = clock.monotonic() - queueTime
+            try:
+                try:
+                    self.finish_request(request, client_address)
+                except:
+                    self.handle_error(request, client_address)
+            finally:
+                self.close_request(request)
+
+                self.__statLock.acquire()
+                try:
+                    self.__numBusy -= 1
+                finally:
+                    self.__statLock.release()
+
+    def _dispatch(self, method, params):
+        "Time each method call"
+        queueWait = getattr(self.__local, "queueWait", 0.0)
+        self.__local.queueWait = 0.0
+
+        self.__statLock.acquire()
+        try:
+            if not self.__latency.has_key(method):
+                self.__latency[method] = RPCStat()
+                self.__queueWait[method] = RPCStat()
+                self.__inFlight[method] = 0
+            latency = self.__latency[method]
+            self.__inFlight[method] += 1
+        finally:
+            self.__statLock.release()
+
+        self.__queueWait[method].tally(queueWait)
+
+        start = clock.monotonic()
+        try:
+            return RPCServer._dispatch(self, method, params)
+        finally:
+            latency.tally(clock.monotonic() - start)
+
+            self.__statLock.acquire()
+            try:
+                self.__inFlight[method] -= 1
+            finally:
+                self.__statLock.release()
+
+    def process_request(self, request, client_address):
+        "Queue the request for a worker thread"
+        self.__statLock.acquire()
+        try:
+            if self.__numQueued >= self.__maxQueued:
+                self.__numRejected += 1
+                rejected = True
+            else:
+                self.__startWorkers()
+                self.__numQueued += 1
+                if self.__peakQueued < self.__numQueued:
+                    self.__peakQueued = self.__numQueued
+                rejected = False
+        finally:
+            self.__statLock.release()
+
+        if rejected:
+            self.close_request(request)
+        else:
+            self.__queue.put((request, client_address, clock.monotonic()))
+
+    def server_close(self):
+        RPCServer.server_close(self)
+
+        self.__statLock.acquire()
+        try:
+            workers = self.__workers
+            self.__workers = []
+        finally:
+            self.__statLock.release()
+
+        for w in workers:
+            self.__queue.put(None)
+
+    @staticmethod
+    def __statDict(stat):
+        "Convert an RPCStat to an XML-RPC friendly dictionary"
+        summary = stat.summaries()
+        if summary is None:
+            return { "n" : 0 }
+
+        (n, Xmin, Xmax, avg, rms) = summary
+        (p50, p95, p99) = stat.percentiles()
+        return { "n" : n, "min" : Xmin, "max" : Xmax, "avg" : avg,
+                 "p50" : p50, "p95" : p95, "p99" : p99 }
+
+    def serverStats(self):
+        """
+        Return a dictionary describing the worker pool and, for each
+        method, its latency, queue wait and number of calls in progress
+        """
+        self.__statLock.acquire()
+        try:
+            stats = { "workers" : len(self.__workers),
+                      "busy" : self.__numBusy,
+                      "queued" : self.__numQueued,
+                      "peakQueued" : self.__peakQueued,
+                      "maxQueued" : self.__maxQueued,
+                      "rejected" : self.__numRejected, }
+            methods = self.__latency.keys()
+        finally:
+            self.__statLock.release()
+
+        methodStats = {}
+        for m in methods:
+            methodStats[m] = \
+                { "latency" : self.__statDict(self.__latency[m]),
+                  "queueWait" : self.__statDict(self.__queueWait[m]),
+                  "inFlight" : self.__inFlight[m] }
+        stats["methods"] = methodStats
+
+        return stats
+
 class RPCStat(object):
     "Class for accumulating statistics about an RPC call"
+
+    "upper bounds (in seconds) of the latency histogram buckets"
+    BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+               1.0, 2.0, 5.0, 10.0, 20.0, 60.0, 120.0)
+
     def __init__(self):
         self.n     = 0
         self.min   = None
         self.max   = None
         self.sum   = 0.
         self.sumsq = 0.
+        self.nNewConn = 0
+        self.nReusedConn = 0
 
-    def tally(self, tdel):
-        secs = tdel.seconds + tdel.microseconds * 1.E-6
-        self.n += 1
-        if self.min == None or self.min > secs:
-            self.min = secs
-        if self.max == None or self.max < secs:
-            self.max = secs
-        self.sum += secs
-        self.sumsq += secs*secs
+        # final bucket holds everything slower than the last bound
+        self.__hist = [0] * (len(self.BUCKETS) + 1)
+        self.__lock = threading.Lock()
 
-    def summaries(self):
+    def tally(self, secs, reused=None):
+        """
+        Record a call which took 'secs' seconds
+        reused - True if the call reused an open connection, False if it
+                 opened a new connection, None if this is unknown
+        """
+        idx = bisect.bisect_left(self.BUCKETS, secs)
+
+        self.__lock.acquire()
+        try:
+            self.n += 1
+            if self.min is None or self.min > secs:
+                self.min = secs
+            if self.max is None or self.max < secs:
+                self.max = secs
+            self.sum += secs
+            self.sumsq += secs*secs
+            self.__hist[idx] += 1
+            if reused is not None:
+                if reused:
+                    self.nReusedConn += 1
+                else:
+                    self.nNewConn += 1
+        finally:
+            self.__lock.release()
+
+    def percentile(self, pct):
+        """
+        Return the upper bound (in seconds) of the histogram bucket holding
+        the 'pct' percentile, or None if nothing has been tallied
+        """
+        self.__lock.acquire()
+        try:
+            hist = self.__hist[:]
+            n = self.n
+            maxSecs = self.max
+        finally:
+            self.__lock.release()
+
+        if n == 0:
+            return None
+
+        target = math.ceil(n * pct / 100.0)
+        total = 0
+        for i in range(len(hist)):
+            total += hist[i]
+            if total >= target:
+                if i < len(self.BUCKETS) and self.BUCKETS[i] < maxSecs:
+                    return self.BUCKETS[i]
+                return maxSecs
+
+        return maxSecs
+
+    def percentiles(self):
+        "Return a tuple of the 50th, 95th and 99th percentile latencies"
         if self.n == 0: return None
-        avg = self.sum / self.n
+        return (self.percentile(50), self.percentile(95),
+                self.percentile(99))
+
+    def summaries(self):
+        self.__lock.acquire()
+        try:
+            (n, Xmin, Xmax, tot, totsq) = \
+                (self.n, self.min, self.max, self.sum, self.sumsq)
+        finally:
+            self.__lock.release()
+
+        if n == 0: return None
+        avg = tot / n
         # rms = sqrt(x_squared-avg - x-avg-squared)
-        x2avg = self.sumsq / self.n
+        x2avg = totsq / n
         xavg2 = avg*avg
         try:
             rms = math.sqrt(x2avg - xavg2)
         except:
             rms = None
-        return (self.n, self.min, self.max, avg, rms)
-    
+        return (n, Xmin, Xmax, avg, rms)
+
     def report(self):
+        connStr = "%d new/%d reused conns" % (self.nNewConn, self.nReusedConn)
         l = self.summaries()
-        if l == None: return "No entries."
+        if l == None: return "No entries, " + connStr
         (n, Xmin, Xmax, avg, rms) = l
-        return "%d entries, min=%.4f max=%.4f, avg=%.4f, rms=%.4f" % (self.n,
-                                                                      self.min,
-                                                                      self.max,
-                                                                      avg,
-                                                                      rms)
+        if rms is None:
+            rms = 0.0
+        (p50, p95, p99) = self.percentiles()
+        return ("%d entries, min=%.4f max=%.4f, avg=%.4f, rms=%.4f," +
+                " p50<=%.4f p95<=%.4f p99<=%.4f, %s") % \
+                (n, Xmin, Xmax, avg, rms, p50, p95, p99, connStr)
 
 if __name__ == "__main__":
     from DAQConst import DAQPort
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+import SimpleXMLRPCServer, SocketServer, socket, threading, time, unittest, \
+    xmlrpclib
+
+from DAQRPC import PooledRPCServer, RPCClient, RPCServer, RPCStat
+
+class KeepAliveHandler(SimpleXMLRPCServer.SimpleXMLRPCRequestHandler):
+    "Request handler which leaves the connection open between requests"
+    protocol_version = "HTTP/1.1"
+
+class XMLOnlyHandler(KeepAliveHandler):
+    "Request handler which hangs up on anything other than XML-RPC"
+    def do_POST(self):
+        if self.headers.getheader("Content-Type", "").startswith("text/xml"):
+            KeepAliveHandler.do_POST(self)
+        else:
+            self.close_connection = 1
+
+class KeepAliveServer(SocketServer.ThreadingMixIn,
+                      SimpleXMLRPCServer.SimpleXMLRPCServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port, handler=KeepAliveHandler):
+        SimpleXMLRPCServer.SimpleXMLRPCServer.__init__(self, ('', port),
+                                                       handler,
+                                                       logRequests=False)
+
+class TestDAQRPC(unittest.TestCase):
+    PORT = 9876
+
+    def __startServer(self, server):
+        server.register_function(lambda: 42, "rpc_ping")
+        server.register_function(lambda x, y: x + y, "xmlrpc.add")
+        server.register_function(self.__sleep, "xmlrpc.sleep")
+
+        t = threading.Thread(name="TestServer", target=server.serve_forever)
+        t.setDaemon(True)
+        t.start()
+
+        self.__server = server
+
+    @staticmethod
+    def __sleep(secs):
+        time.sleep(secs)
+        return secs
+
+    def setUp(self):
+        self.__server = None
+
+    def tearDown(self):
+        if self.__server is not None:
+            if isinstance(self.__server, KeepAliveServer):
+                self.__server.shutdown()
+            self.__server.server_close()
+
+    def testKeepAlive(self):
+        self.__startServer(KeepAliveServer(self.PORT))
+
+        cl = RPCClient("localhost", self.PORT, useJSON=False)
+        for i in range(5):
+            self.assertEquals(42, cl.rpc_ping())
+        self.assertEquals(7, cl.xmlrpc.add(3, 4))
+
+        (numNew, numReused, numRetried) = cl.connectionStats()
+        self.assertEquals(1, numNew, "Expected 1 new connection, not %d" %
+                          numNew)
+        self.assertEquals(5, numReused, "Expected 5 reused connections," +
+                          " not %d" % numReused)
+
+    def testConnectionPerThread(self):
+        self.__startServer(KeepAliveServer(self.PORT + 1))
+
+        cl = RPCClient("localhost", self.PORT + 1, useJSON=False)
+
+        numThreads = 3
+        numCalls = 4
+
+        def pinger():
+            for i in range(numCalls):
+                cl.rpc_ping()
+
+        tList = []
+        for i in range(numThreads):
+            t = threading.Thread(target=pinger)
+            t.start()
+            tList.append(t)
+        for t in tList:
+            t.join()
+
+        (numNew, numReused, numRetried) = cl.connectionStats()
+        self.assertEquals(numThreads, numNew)
+        self.assertEquals(numThreads * (numCalls - 1), numReused)
+
+    def testHTTP10Server(self):
+        self.__startServer(RPCServer(self.PORT + 2))
+
+        cl = RPCClient("localhost", self.PORT + 2)
+        for i in range(3):
+            self.assertEquals(42, cl.rpc_ping())
+
+        # server closes each connection, so nothing can be reused
+        (numNew, numReused, numRetried) = cl.connectionStats()
+        self.assertEquals(3, numNew)
+        self.assertEquals(0, numReused)
+        self.assertEquals(0, numRetried)
+
+    def testDefaultTimeoutUnchanged(self):
+        origTimeout = socket.getdefaulttimeout()
+        RPCClient("localhost", self.PORT + 3, timeout=17)
+        self.assertEquals(origTimeout, socket.getdefaulttimeout())
+
+    def testMethodTimeout(self):
+        self.__startServer(KeepAliveServer(self.PORT + 4))
+
+        cl = RPCClient("localhost", self.PORT + 4)
+        self.assertEquals(2, cl.timeout("xmlrpc.getState"))
+        self.assertEquals(RPCClient.TIMEOUT_SECS, cl.timeout("xmlrpc.sleep"))
+
+        cl.setTimeout("xmlrpc.sleep", 0.2)
+        self.assertEquals(0.2, cl.timeout("xmlrpc.sleep"))
+
+        start = time.time()
+        self.assertRaises(socket.timeout, cl.xmlrpc.sleep, 1)
+        self.failUnless(time.time() - start < 1.5,
+                        "Call was not aborted after its timeout")
+
+        # other methods still get the default timeout
+        self.assertEquals(7, cl.xmlrpc.add(3, 4))
+
+        cl.setTimeout("xmlrpc.sleep", None)
+        self.assertEquals(RPCClient.TIMEOUT_SECS, cl.timeout("xmlrpc.sleep"))
+
+    def testRPCCall(self):
+        self.__startServer(KeepAliveServer(self.PORT + 5))
+
+        cl = RPCClient("localhost", self.PORT + 5)
+        self.assertEquals(42, cl.rpccall("rpc_ping"))
+        self.assertEquals("ab", cl.rpccall("xmlrpc.add", "a", "b"))
+        self.assertEquals(["a", 1], cl.rpccall("xmlrpc.add", ["a"], [1]))
+
+        lat = cl.latencies()
+        self.assertEquals(1, lat["rpc_ping"][0])
+        self.assertEquals(2, lat["xmlrpc.add"][0])
+
+    def testPercentiles(self):
+        stat = RPCStat()
+        self.assertEquals(None, stat.percentiles())
+
+        for i in range(98):
+            stat.tally(0.0015)
+        stat.tally(0.3)
+        stat.tally(7.0)
+
+        (p50, p95, p99) = stat.percentiles()
+        self.assertEquals(0.002, p50)
+        self.assertEquals(0.002, p95)
+        self.assertEquals(0.5, p99)
+        self.assertEquals(7.0, stat.percentile(100))
+
+        (n, minSecs, maxSecs, avg, rms) = stat.summaries()
+        self.assertEquals(100, n)
+        self.assertEquals(0.0015, minSecs)
+        self.assertEquals(7.0, maxSecs)
+
+    def testPooledServer(self):
+        self.__startServer(PooledRPCServer(self.PORT + 6, numWorkers=3))
+
+        results = []
+        def sleeper():
+            cl = RPCClient("localhost", self.PORT + 6)
+            results.append(cl.xmlrpc.sleep(0.3))
+
+        tList = []
+        for i in range(6):
+            t = threading.Thread(target=sleeper)
+            t.start()
+            tList.append(t)
+        for t in tList:
+            t.join(5)
+
+        self.assertEquals(6, len(results))
+
+        RPCClient("localhost", self.PORT + 6).rpc_ping()
+        stats = self.__server.serverStats()
+        self.assertEquals(3, stats["workers"])
+        self.assertEquals(0, stats["rejected"])
+
+        sleepStats = stats["methods"]["xmlrpc.sleep"]
+        self.assertEquals(6, sleepStats["latency"]["n"])
+        self.assertEquals(0, sleepStats["inFlight"])
+        self.failUnless(sleepStats["latency"]["min"] >= 0.3)
+
+        # only three requests run at once, so the rest had to wait
+        self.failUnless(sleepStats["queueWait"]["max"] >= 0.2,
+                        "Max queue wait was only %.3f" %
+                        sleepStats["queueWait"]["max"])
+
+        self.assertEquals(1, stats["methods"]["rpc_ping"]["latency"]["n"])
+
+    def testPooledServerLimit(self):
+        self.__startServer(PooledRPCServer(self.PORT + 7, numWorkers=1,
+                                           maxQueued=1))
+
+        # settle the encoding first, since a hangup during the very first
+        # JSON request is retried as XML-RPC
+        self.assertEquals(42, RPCClient("localhost", self.PORT + 7).rpc_ping())
+
+        results = []
+        errors = []
+        def sleeper():
+            cl = RPCClient("localhost", self.PORT + 7)
+            try:
+                results.append(cl.xmlrpc.sleep(0.5))
+            except Exception, ex:
+                errors.append(ex)
+
+        tList = []
+        for i in range(4):
+            t = threading.Thread(target=sleeper)
+            t.start()
+            tList.append(t)
+            time.sleep(0.05)
+        for t in tList:
+            t.join(5)
+
+        stats = self.__server.serverStats()
+        self.assertEquals(1, stats["workers"])
+        self.assertEquals(len(errors), stats["rejected"])
+        self.failUnless(stats["rejected"] > 0, "No requests were refused")
+        self.assertEquals(4, len(results) + len(errors))
+
+    def testJSON(self):
+        self.__startServer(RPCServer(self.PORT + 8))
+
+        cl = RPCClient("localhost", self.PORT + 8)
+        self.assertEquals(42, cl.rpc_ping())
+        self.failUnless(cl.isJSON(), "Client should be using JSON")
+
+        self.assertEquals("ab", cl.xmlrpc.add("a", "b"))
+        self.assertEquals(str, type(cl.xmlrpc.add("a", "b")))
+        self.assertEquals([{ "a" : [1, 2.5] }],
+                          cl.xmlrpc.add([{ "a" : [1, 2.5] }], []))
+
+        try:
+            cl.xmlrpc.nonexistent()
+            self.fail("Call to nonexistent method should fail")
+        except xmlrpclib.Fault:
+            pass
+
+        # no call was sent twice
+        self.assertEquals((5, 0, 0), cl.connectionStats())
+
+    def testJSONFallback(self):
+        self.__startServer(KeepAliveServer(self.PORT + 9))
+
+        cl = RPCClient("localhost", self.PORT + 9)
+        self.assertEquals(42, cl.rpc_ping())
+        self.failIf(cl.isJSON(), "Client should have fallen back to XML-RPC")
+        self.assertEquals(7, cl.xmlrpc.add(3, 4))
+
+        # a new client doesn't try JSON with a server which refused it
+        cl2 = RPCClient("localhost", self.PORT + 9)
+        self.failIf(cl2.isJSON(), "Server should be known as XML-RPC only")
+        self.assertEquals(42, cl2.rpc_ping())
+        self.assertEquals((1, 0, 0), cl2.connectionStats())
+
+    def testJSONHangup(self):
+        self.__startServer(KeepAliveServer(self.PORT + 10, XMLOnlyHandler))
+
+        cl = RPCClient("localhost", self.PORT + 10)
+        self.assertEquals(42, cl.rpc_ping())
+        self.failIf(cl.isJSON(), "Client should have fallen back to XML-RPC")
+        self.assertEquals(False,
+                          RPCClient.JSON_SERVERS[("localhost", self.PORT + 10)])
+        self.assertEquals(7, cl.xmlrpc.add(3, 4))
+
+    def testJSONNoServer(self):
+        cl = RPCClient("localhost", self.PORT + 11)
+        try:
+            cl.rpc_ping()
+            self.fail("Call to missing server should fail")
+        except socket.error:
+            pass
+
+        # a server which is down hasn't told us anything about its encoding
+        self.failUnless(cl.isJSON(), "Client should still try JSON")
+        self.failIf(RPCClient.JSON_SERVERS.has_key(("localhost",
+                                                    self.PORT + 11)),
+                    "Missing server should not be marked as XML-RPC only")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,7 @@ from CnCServer import CnCServer, CnCServerException
 from DAQClient import DAQClient
 from DAQConst import DAQPort
 from DAQMocks import MockAppender, MockClusterConfig, MockCnCLogger, \
-    MockRunConfigFile, SocketReaderFactory, SocketWriter
+    MockRunConfigFile, MockSchemaCacheDir, SocketReaderFactory, SocketWriter
 from LiveImports import LIVE_IMPORT
 from RunOption import RunOption
 from RunSet import RunSet
@@ -161,7 +161,8 @@ class MockServer(CnCServer):
                                          forceRestart=forceRestart,
                                          testOnly=True)
 
-    def createClient(self, name, num, host, port, mbeanPort, connectors):
+    def createClient(self, name, num, host, port, mbeanPort, connectors,
+                     deferMBean=False):
         return TinyClient(name, num, host, port, mbeanPort, connectors)
 
     def createCnCLogger(self, quiet):
@@ -223,6 +224,7 @@ class TestDAQServer(unittest.TestCase):
         self.__logFactory = SocketReaderFactory()
 
         self.__runConfigDir = None
+        self.__cacheDir = MockSchemaCacheDir()
 
     def tearDown(self):
         try:
@@ -230,6 +232,8 @@ class TestDAQServer(unittest.TestCase):
         except:
             traceback.print_exc()
 
+        self.__cacheDir.restore()
+
         if self.__runConfigDir is not None:
             shutil.rmtree(self.__runConfigDir, ignore_errors=True)
             self.__runConfigDir = None
@@ -282,6 +286,57 @@ class TestDAQServer(unittest.TestCase):
                     "state" : "idle"}
         self.assertEqual(dc.rpc_component_list_dicts(), [fooDict, ])
 
+        # the previous query should have cached the component's state
+        cached = dc.rpc_component_list_dicts([], False, True)
+        self.assertEqual(1, len(cached))
+        self.failUnless(cached[0].has_key("stateAge"),
+                        "Cached state has no age")
+        self.failIf(cached[0]["stateAge"] < 0.0,
+                    "Bad state age %s" % cached[0]["stateAge"])
+        del cached[0]["stateAge"]
+        self.assertEqual(cached, [fooDict, ])
+
+        logger.checkStatus(100)
+        liver.checkStatus(100)
+
+    def testRegisterBatch(self):
+        logPort = 11854
+        logger = self.__createLog('file', logPort)
+
+        livePort = 35812
+        liver = self.__createLog('live', livePort, False)
+
+        dc = MockServer(logPort=logPort, livePort=livePort,
+                        logFactory=self.__logFactory)
+
+        host = 'localhost'
+        hubConns = [("rdoutReq", "i", 2001), ("rdoutData", "o", 0)]
+        badConns = [("rdoutReq", "i", "bad")]
+
+        compArray = [("stringHub", 1, host, 666, 667, hubConns),
+                     ("stringHub", 2, host, 668, 669, hubConns),
+                     ("stringHub", 3, host, 670, 671, badConns)]
+
+        expId = DAQClient.ID.peekNext()
+
+        badMsg = "Bad stringHub#3 connector#0 %s (third element should" \
+            " be int)" % str(badConns[0])
+        for log in (logger, liver):
+            log.addExpectedText(badMsg)
+            log.addExpectedText('Registered stringHub#1')
+            log.addExpectedText('Registered stringHub#2')
+
+        rtnList = dc.rpc_component_register_batch(compArray)
+        self.assertEqual(len(compArray), len(rtnList))
+
+        localAddr = self.__getInternetAddress()
+        for i in range(2):
+            self.__verifyRegArray(rtnList[i], expId + i, localAddr, logPort,
+                                  localAddr, livePort)
+        self.assertEqual({ "error" : badMsg }, rtnList[2])
+
+        self.assertEqual(dc.rpc_component_count(), 2)
+
         logger.checkStatus(100)
         liver.checkStatus(100)
 
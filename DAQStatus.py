@@ -132,9 +132,13 @@ def listVerbose(compList, indent, indent2, useNumeric=True):
             hostName = socket.getfqdn(c["host"])
             idx = hostName.find(".")
             if idx > 0: hostName = hostName[:idx]
-        print "%s%s#%d %s#%d at %s:%d M#%d %s" % \
+        if c.has_key("stateAge") and c["stateAge"] >= 1.0:
+            ageStr = " (%ds ago)" % int(c["stateAge"])
+        else:
+            ageStr = ""
+        print "%s%s#%d %s#%d at %s:%d M#%d %s%s" % \
             (indent, indent2, c["id"], c["compName"], c["compNum"], hostName,
-             c["rpcPort"], c["mbeanPort"], c["state"])
+             c["rpcPort"], c["mbeanPort"], c["state"], ageStr)
 
 if __name__ == "__main__":
     ver_info = "%(filename)s %(revision)s %(date)s %(time)s %(author)s " \
@@ -142,6 +146,9 @@ if __name__ == "__main__":
     usage = "%prog [options]\nversion: " + ver_info
     p = optparse.OptionParser(usage=usage, version=ver_info)
 
+    p.add_option("-f", "--fresh", dest="fresh",
+                 action="store_true", default=False,
+                 help="Query the current state of every component")
     p.add_option("-n", "--numeric", dest="numeric",
                  action="store_true", default=False,
                  help="Verbose listing uses IP addresses instead of hostnames")
@@ -155,7 +162,7 @@ if __name__ == "__main__":
 
     try:
         nc = cncrpc.rpc_component_count()
-        lc = cncrpc.rpc_component_list_dicts([], False)
+        lc = cncrpc.rpc_component_list_dicts([], False, not opt.fresh)
         ns = cncrpc.rpc_runset_count()
         ids = cncrpc.rpc_runset_list_ids()
         versInfo = cncrpc.rpc_version()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#
+# Compare indexed DAQConfig DOM lookups against the original linear search
+# on a full-detector configuration and a large flasher subrun list
+
+import optparse, random, time
+
+from DAQConfig import DAQConfig, DomConfig, RunDom
+
+def buildConfig(numStrings, domsPerString, numIceTop):
+    "Build a run configuration with one dom configuration file per hub"
+    runCfg = DAQConfig("bench-config.xml")
+
+    mbid = 0x123456789abc
+    for s in range(1, numStrings + 1) + range(201, 201 + numIceTop):
+        if s < 200:
+            numDOMs = domsPerString
+        else:
+            numDOMs = 4
+
+        domCfg = DomConfig("hub%d.xml" % s)
+        for p in range(1, numDOMs + 1):
+            domCfg.addDom(RunDom(mbid, s, p, "Dom_%03d_%02d" % (s, p),
+                                 domCfg))
+            mbid += 1
+
+        runCfg.addDomConfig(domCfg)
+
+    return runCfg
+
+def oldHasDOM(runCfg, domid):
+    for d in runCfg.getAllDOMs():
+        if d.id() == domid:
+            return True
+    return False
+
+def oldGetIDbyName(runCfg, name):
+    for d in runCfg.getAllDOMs():
+        if d.name() == name:
+            return "%012x" % d.id()
+    return None
+
+def oldGetIDbyStringPos(runCfg, string, pos):
+    for d in runCfg.getAllDOMs():
+        if d.string() == string and d.pos() == pos:
+            return "%012x" % d.id()
+    return None
+
+def buildFlasherList(runCfg, numEntries):
+    "Build a mixed list of mainboard IDs, names and string/position pairs"
+    doms = runCfg.getAllDOMs()
+
+    entries = []
+    for i in range(numEntries):
+        d = random.choice(doms)
+        entries.append((d.id(), d.name(), d.string(), d.pos()))
+    return entries
+
+def timeLookups(runCfg, entries, hasDOM, getIDbyName, getIDbyStringPos):
+    start = time.time()
+    for (mbid, name, string, pos) in entries:
+        if not hasDOM(mbid):
+            raise SystemExit("Cannot find %012x" % mbid)
+        if getIDbyName(name) != "%012x" % mbid:
+            raise SystemExit("Bad ID for %s" % name)
+        if getIDbyStringPos(string, pos) != "%012x" % mbid:
+            raise SystemExit("Bad ID for %d-%d" % (string, pos))
+    return time.time() - start
+
+if __name__ == "__main__":
+    op = optparse.OptionParser()
+    op.add_option("-f", "--flashers", type="int", dest="numFlashers",
+                  default=1000, help="Number of flasher entries")
+    op.add_option("-s", "--strings", type="int", dest="numStrings",
+                  default=86, help="Number of in-ice strings")
+    opt, args = op.parse_args()
+
+    runCfg = buildConfig(opt.numStrings, 60, 81)
+    entries = buildFlasherList(runCfg, opt.numFlashers)
+
+    oldSecs = timeLookups(runCfg, entries,
+                          lambda x: oldHasDOM(runCfg, x),
+                          lambda x: oldGetIDbyName(runCfg, x),
+                          lambda x, y: oldGetIDbyStringPos(runCfg, x, y))
+    newSecs = timeLookups(runCfg, entries, runCfg.hasDOM, runCfg.getIDbyName,
+                          runCfg.getIDbyStringPos)
+
+    print "%d flasher entries, %d DOMs" % \
+        (opt.numFlashers, len(runCfg.getAllDOMs()))
+    print "  linear: %.3f secs" % oldSecs
+    print "  indexed: %.3f secs" % newSecs
+    if newSecs > 0.0:
+        print "  speedup: %.0fx" % (oldSecs / newSecs)
@@ -24,7 +24,8 @@ except SystemExit:
 from DAQMocks \
     import MockAppender, MockClusterConfig, MockCnCLogger, \
     MockDeployComponent, MockIntervalTimer, MockParallelShell, \
-    MockRunConfigFile, SocketReader, SocketReaderFactory, SocketWriter
+    MockRunConfigFile, MockSchemaCacheDir, SocketReader, SocketReaderFactory, \
+    SocketWriter
 
 class MostlyLive:
     def __init__(self, port):
@@ -298,7 +299,8 @@ class MostlyCnCServer(CnCServer):
                                               liveIP=liveIP, livePort=livePort,
                                               forceRestart=False, quiet=True)
 
-    def createClient(self, name, num, host, port, mbeanPort, connectors):
+    def createClient(self, name, num, host, port, mbeanPort, connectors,
+                     deferMBean=False):
         if self.__liveOnly:
             appender = None
         else:
@@ -1478,6 +1480,7 @@ class IntegrationTest(unittest.TestCase):
         self.__logFactory = SocketReaderFactory()
 
         IntegrationTest.LOG_DIR = tempfile.mkdtemp()
+        self.__cacheDir = MockSchemaCacheDir()
 
         DAQLive.STATE_WARNING = False
 
@@ -1514,6 +1517,8 @@ class IntegrationTest(unittest.TestCase):
         shutil.rmtree(IntegrationTest.LOG_DIR, ignore_errors=True)
         IntegrationTest.LOG_DIR = None
 
+        self.__cacheDir.restore()
+
         if True:
             reps = 5
             for n in range(reps):
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# Compare the speed of DAQClient.unFixValue() against the original
+# exception-driven decoder on a typical stringHub getAttributes() payload
+
+import optparse, time
+
+from DAQClient import unFixValue
+
+def oldUnFixValue(obj):
+    "The original recursive decoder, which tries int() on every string"
+    if type(obj) is dict:
+        for k in obj.keys():
+            obj[k] = oldUnFixValue(obj[k])
+    elif type(obj) is list:
+        for i in xrange(0, len(obj)):
+            obj[i] = oldUnFixValue(obj[i])
+    elif type(obj) is str:
+        try:
+            return int(obj)
+        except ValueError:
+            pass
+    return obj
+
+def buildPayload(numDOMs):
+    "Build a dictionary resembling a stringHub's bean attributes"
+    attrs = {}
+    for i in range(numDOMs):
+        attrs["MainboardId-%02d" % i] = "%012x" % (0x123456789abc + i)
+        attrs["HitRate-%02d" % i] = 512.25 + i
+        attrs["NumHits-%02d" % i] = str(1234567890123 + i)
+        attrs["RunState-%02d" % i] = "RUNNING"
+    attrs["Histogram"] = [str(x * 1000003) for x in range(256)]
+    attrs["ActiveAndTotal"] = ["60", "64"]
+    return attrs
+
+def timeDecoder(decoder, numDOMs, reps):
+    elapsed = 0.0
+    for r in xrange(reps):
+        payload = buildPayload(numDOMs)
+        start = time.time()
+        decoder(payload)
+        elapsed += time.time() - start
+    return elapsed
+
+if __name__ == "__main__":
+    op = optparse.OptionParser()
+    op.add_option("-d", "--doms", type="int", dest="numDOMs", default=64,
+                  help="Number of DOMs in each payload")
+    op.add_option("-r", "--reps", type="int", dest="reps", default=2000,
+                  help="Number of payloads to decode")
+    opt, args = op.parse_args()
+
+    if oldUnFixValue(buildPayload(opt.numDOMs)) != \
+            unFixValue(buildPayload(opt.numDOMs)):
+        raise SystemExit("Decoders do not agree")
+
+    oldSecs = timeDecoder(oldUnFixValue, opt.numDOMs, opt.reps)
+    newSecs = timeDecoder(unFixValue, opt.numDOMs, opt.reps)
+
+    print "%d payloads of %d DOMs" % (opt.reps, opt.numDOMs)
+    print "  old: %.3f secs (%.1f usec/payload)" % \
+        (oldSecs, oldSecs * 1000000.0 / opt.reps)
+    print "  new: %.3f secs (%.1f usec/payload)" % \
+        (newSecs, newSecs * 1000000.0 / opt.reps)
+    if newSecs > 0.0:
+        print "  speedup: %.2fx" % (oldSecs / newSecs)
@@ -19,13 +19,55 @@ class MonitorThread(CnCThread):
         self.__now = now
         self.__refused = refused
         self.__warned = False
+        self.__savedCalls = 0
 
         super(MonitorThread, self).__init__(comp.fullName(), dashlog)
 
+    @staticmethod
+    def __isRefused(se):
+        "Was this socket error caused by a refused connection?"
+        try:
+            msg = se[1]
+        except IndexError:
+            msg = None
+        return msg is not None and msg == "Connection refused"
+
+    def __report(self, bean, attrs):
+        "report monitoring data"
+        if attrs is not None and len(attrs) > 0 and \
+               self.__reporter is not None:
+            self.__reporter.send(self.__now, bean, attrs)
+
     def _run(self):
         if self.__reporter is None:
             return
 
+        # try to fetch all beans in a single round trip
+        try:
+            beanDict = self.__comp.getBeanDictionary()
+        except socket.error, se:
+            if self.__isRefused(se):
+                self.__refused += 1
+                return
+            beanDict = None
+        except:
+            beanDict = None
+            self.__dashlog.error("Cannot get %s bean snapshot: %s" %
+                                 (str(self.__comp), exc_string()))
+
+        if beanDict is not None:
+            self.__refused = 0
+
+            bSrt = beanDict.keys()
+            bSrt.sort()
+            for b in bSrt:
+                self.__report(b, beanDict[b])
+
+            # one snapshot replaced a getMultiBeanFields() call per bean
+            if len(bSrt) > 1:
+                self.__savedCalls = len(bSrt) - 1
+            return
+
         bSrt = self.__comp.getBeanNames()
         bSrt.sort()
         for b in bSrt:
@@ -35,12 +77,7 @@ class MonitorThread(CnCThread):
                 self.__refused = 0
             except socket.error, se:
                 attrs = None
-                msg = None
-                try:
-                    msg = se[1]
-                except IndexError:
-                    msg = None
-                if msg is not None and msg == "Connection refused":
+                if self.__isRefused(se):
                     self.__refused += 1
                     break
             except:
@@ -48,10 +85,7 @@ class MonitorThread(CnCThread):
                 self.__dashlog.error("Ignoring %s:%s: %s" %
                                      (str(self.__comp), b, exc_string()))
 
-            # report monitoring data
-            if attrs is not None and len(attrs) > 0 and \
-                   self.__reporter is not None:
-                self.__reporter.send(self.__now, b, attrs)
+            self.__report(b, attrs)
 
     def close(self):
         if self.__reporter is not None:
@@ -67,6 +101,10 @@ class MonitorThread(CnCThread):
 
     def refusedCount(self): return self.__refused
 
+    def savedCalls(self):
+        "Number of round trips saved by this thread's bean snapshot"
+        return self.__savedCalls
+
     def setWarned(self): self.__warned = True
 
 class MonitorToFile(object):
@@ -129,6 +167,8 @@ class MonitorTask(CnCTask):
     def __init__(self, taskMgr, runset, dashlog, live, runDir, runOptions,
                  period=None):
         self.__threadList = {}
+        self.__cycleSavedCalls = 0
+        self.__totalSavedCalls = 0
         if not RunOption.isMoniToNone(runOptions):
             for c in runset.components():
                 reporter = self.__createReporter(c, runDir, live, runOptions)
@@ -154,6 +194,7 @@ class MonitorTask(CnCTask):
 
     def _check(self):
         now = None
+        saved = 0
         for c in self.__threadList.keys():
             thrd = self.__threadList[c]
             if not thrd.isAlive():
@@ -165,15 +206,30 @@ class MonitorTask(CnCTask):
                         self.logError(msg)
                         thrd.setWarned()
                     continue
+                saved += thrd.savedCalls()
                 if now is None:
                     now = datetime.datetime.now()
                 self.__threadList[c] = thrd.getNewThread(now)
                 self.__threadList[c].start()
 
+        self.__cycleSavedCalls = saved
+        self.__totalSavedCalls += saved
+
     def close(self):
         for c in self.__threadList.keys():
             self.__threadList[c].close()
 
+    def cycleSavedCalls(self):
+        """
+        Number of round trips saved by bean snapshots during the most
+        recently finished monitoring cycle
+        """
+        return self.__cycleSavedCalls
+
+    def totalSavedCalls(self):
+        "Number of round trips saved by bean snapshots during this run"
+        return self.__totalSavedCalls
+
     def waitUntilFinished(self):
         for c in self.__threadList.keys():
             if self.__threadList[c].isAlive():
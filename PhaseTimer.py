@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# Record how long each phase of a run transition (building a runset,
+# starting or stopping a run) takes, both overall and for each component
+
+import threading
+
+from utils import clock
+
+try:
+    import json
+except ImportError:
+    json = None
+
+class PhaseTimer(object):
+    "Accumulate per-phase (and per-component) run transition times"
+
+    "name of the file written to the run directory"
+    FILENAME = "timing.json"
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__times = []
+
+    def __str__(self):
+        return "PhaseTimer[%d entries]" % len(self.__times)
+
+    def add(self, phase, secs, comp=None):
+        "Record that 'phase' (optionally for component 'comp') took 'secs'"
+        self.__lock.acquire()
+        try:
+            self.__times.append((phase, comp, secs))
+        finally:
+            self.__lock.release()
+
+    def addComponents(self, phase, timeDict):
+        """
+        Record the times from ComponentOperationGroup.completionTimes()
+        (a time of None means the component's operation never finished)
+        """
+        for c in timeDict:
+            self.add(phase, timeDict[c], c.fullName())
+
+    def isEnabled(self):
+        return True
+
+    def reset(self):
+        "Discard all recorded times"
+        self.__lock.acquire()
+        try:
+            self.__times = []
+        finally:
+            self.__lock.release()
+
+    def start(self):
+        "Return a value to be passed to stop() when the phase ends"
+        return clock.monotonic()
+
+    def stop(self, phase, startVal, comp=None):
+        "Record the time since start() returned 'startVal'"
+        self.add(phase, clock.monotonic() - startVal, comp)
+
+    def summary(self):
+        "Return a one-line summary of the overall (non-component) phases"
+        self.__lock.acquire()
+        try:
+            times = self.__times[:]
+        finally:
+            self.__lock.release()
+
+        sumStr = None
+        for (phase, comp, secs) in times:
+            if comp is not None:
+                continue
+
+            entry = "%s=%.3f" % (phase, secs)
+            if sumStr is None:
+                sumStr = entry
+            else:
+                sumStr += " " + entry
+
+        if sumStr is None:
+            return ""
+        return sumStr
+
+    def times(self):
+        "Return a list of (phase, component, seconds) tuples"
+        self.__lock.acquire()
+        try:
+            return self.__times[:]
+        finally:
+            self.__lock.release()
+
+    def write(self, path):
+        """
+        Write all times to 'path' as a JSON list of dictionaries.
+        Nothing is written if the json module is not available.
+        """
+        if json is None:
+            return
+
+        entries = []
+        for (phase, comp, secs) in self.times():
+            entry = { "phase" : phase, "secs" : secs }
+            if comp is not None:
+                entry["component"] = comp
+            entries.append(entry)
+
+        fd = open(path, "w")
+        try:
+            json.dump(entries, fd, indent=1)
+        finally:
+            fd.close()
+
+class NullPhaseTimer(PhaseTimer):
+    "Do-nothing timer used when timing is disabled"
+
+    def add(self, phase, secs, comp=None): pass
+    def addComponents(self, phase, timeDict): pass
+    def isEnabled(self): return False
+    def start(self): return None
+    def stop(self, phase, startVal, comp=None): pass
+    def summary(self): return ""
+    def write(self, path): pass
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+import os, shutil, sys, tempfile, unittest
+
+from PhaseTimer import NullPhaseTimer, PhaseTimer
+
+try:
+    import json
+except ImportError:
+    json = None
+
+class FakeComponent(object):
+    def __init__(self, name):
+        self.__name = name
+
+    def fullName(self):
+        return self.__name
+
+class TestPhaseTimer(unittest.TestCase):
+    def setUp(self):
+        self.__tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmpDir, ignore_errors=True)
+
+    def testSummary(self):
+        timer = PhaseTimer()
+        self.assertEquals("", timer.summary())
+
+        timer.add("connect", 1.5)
+        timer.add("connect", 0.5, "inIceTrigger#0")
+        timer.add("configure", 2.25)
+
+        self.assertEquals("connect=1.500 configure=2.250", timer.summary())
+        self.assertEquals(3, len(timer.times()))
+
+        timer.reset()
+        self.assertEquals([], timer.times())
+
+    def testComponents(self):
+        timer = PhaseTimer()
+
+        hub = FakeComponent("stringHub#1001")
+        ebldr = FakeComponent("eventBuilder#0")
+        timer.addComponents("startRun", { hub : 0.25, ebldr : None })
+
+        times = timer.times()
+        times.sort()
+        self.assertEquals([("startRun", "eventBuilder#0", None),
+                           ("startRun", "stringHub#1001", 0.25)], times)
+        self.assertEquals("", timer.summary())
+
+    def testStartStop(self):
+        timer = PhaseTimer()
+
+        startVal = timer.start()
+        timer.stop("stopRun", startVal)
+
+        (phase, comp, secs) = timer.times()[0]
+        self.assertEquals("stopRun", phase)
+        self.assertEquals(None, comp)
+        self.failUnless(secs >= 0.0)
+
+    def testWrite(self):
+        timer = PhaseTimer()
+        timer.add("configure", 3.0)
+        timer.add("configure", 1.0, "globalTrigger#0")
+
+        path = os.path.join(self.__tmpDir, PhaseTimer.FILENAME)
+        timer.write(path)
+
+        if json is not None:
+            fd = open(path)
+            try:
+                entries = json.load(fd)
+            finally:
+                fd.close()
+
+            self.assertEquals([{ "phase" : "configure", "secs" : 3.0 },
+                               { "phase" : "configure", "secs" : 1.0,
+                                 "component" : "globalTrigger#0" }], entries)
+
+    def testWriteNoJSON(self):
+        timer = PhaseTimer()
+        timer.add("configure", 3.0)
+
+        module = sys.modules[PhaseTimer.__module__]
+        origJSON = module.json
+        module.json = None
+        try:
+            path = os.path.join(self.__tmpDir, PhaseTimer.FILENAME)
+            timer.write(path)
+        finally:
+            module.json = origJSON
+
+        self.failIf(os.path.exists(path),
+                    "%s should not be written without json" % path)
+
+    def testNull(self):
+        timer = NullPhaseTimer()
+        self.failIf(timer.isEnabled())
+
+        timer.stop("connect", timer.start())
+        timer.add("configure", 1.0)
+        self.assertEquals([], timer.times())
+        self.assertEquals("", timer.summary())
+
+        path = os.path.join(self.__tmpDir, PhaseTimer.FILENAME)
+        timer.write(path)
+        self.failIf(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
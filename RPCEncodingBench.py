@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+# Compare XML-RPC and the compact JSON encoding used by DAQRPC on
+# payloads shaped like stringHub MBean snapshots and connector states
+
+import optparse, time, xmlrpclib
+
+from DAQRPC import jsonDumps, jsonLoads
+
+def beanPayload(numDOMs):
+    "Build a getDictionary() result resembling a stringHub's beans"
+    beans = {}
+    for i in range(numDOMs):
+        beans["DataCollectorMonitor-%02d" % i] = {
+            "MainboardId" : "%012x" % (0x123456789abc + i),
+            "HitRate" : 512.25 + i,
+            "NumHits" : str(1234567890123 + i),
+            "RunState" : "RUNNING",
+            "NumLBMOverflows" : 0,
+            "AcquisitionLoopCount" : 1000 + i,
+        }
+    beans["sender"] = {
+        "NumHitsReceived" : str(987654321098),
+        "NumReadoutRequestsReceived" : 12345,
+        "NumReadoutsSent" : 12340,
+    }
+    beans["stringhub"] = {
+        "NumberOfActiveChannels" : numDOMs,
+        "NumberOfActiveAndTotalChannels" : [numDOMs, 64],
+        "HitRateHistogram" : [x * 3 for x in range(256)],
+    }
+    return beans
+
+def connectorPayload(numConns):
+    "Build a listConnectorStates() result"
+    states = []
+    for i in range(numConns):
+        states.append({ "type" : "stringHit%d" % i, "state" : "running",
+                        "numChan" : i % 4 })
+    return states
+
+def timeCodec(encode, decode, payload, reps):
+    encSecs = 0.0
+    decSecs = 0.0
+    for r in xrange(reps):
+        start = time.time()
+        data = encode(payload)
+        mid = time.time()
+        decode(data)
+        encSecs += mid - start
+        decSecs += time.time() - mid
+    return (len(data), encSecs, decSecs)
+
+def xmlEncode(payload):
+    return xmlrpclib.dumps((payload, ), methodresponse=True)
+
+def xmlDecode(data):
+    return xmlrpclib.loads(data)[0][0]
+
+def jsonEncode(payload):
+    return jsonDumps({ "result" : payload })
+
+def jsonDecode(data):
+    return jsonLoads(data)["result"]
+
+def report(name, payload, reps):
+    print "%s (%d reps):" % (name, reps)
+    for (codec, encode, decode) in (("xml-rpc", xmlEncode, xmlDecode),
+                                    ("json", jsonEncode, jsonDecode)):
+        if decode(encode(payload)) != payload:
+            raise SystemExit("%s changed the %s payload" % (codec, name))
+        (size, encSecs, decSecs) = timeCodec(encode, decode, payload, reps)
+        print "  %-8s %7d bytes, encode %7.1f usec, decode %7.1f usec" % \
+            (codec, size, encSecs * 1000000.0 / reps,
+             decSecs * 1000000.0 / reps)
+
+if __name__ == "__main__":
+    op = optparse.OptionParser()
+    op.add_option("-d", "--doms", type="int", dest="numDOMs", default=60,
+                  help="Number of DOM monitoring beans")
+    op.add_option("-r", "--reps", type="int", dest="reps", default=200,
+                  help="Number of times each payload is encoded/decoded")
+    opt, args = op.parse_args()
+
+    report("MBean snapshot", beanPayload(opt.numDOMs), opt.reps)
+    report("connector states", connectorPayload(8), opt.reps * 10)
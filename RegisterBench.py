@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Compare registering a full detector's worth of DAQFakeRun components one
+# at a time against a single rpc_component_register_batch() call
+
+import optparse, time, xmlrpclib
+
+from CnCServer import CnCServer
+from DAQConst import DAQPort
+from DAQFakeRun import ComponentData, FakeClient
+
+class NullLogServer(object):
+    "Catchall log server which doesn't open a socket"
+    def port(self): return DAQPort.CATCHALL
+    def startServing(self): pass
+    def stopServing(self): pass
+
+class BenchCnCServer(CnCServer):
+    "CnCServer which handles registrations without an XML-RPC server"
+    def __init__(self):
+        super(BenchCnCServer, self).__init__(name="RegisterBench",
+                                             testOnly=True, quiet=True)
+
+    def monitorLoop(self):
+        pass
+
+    def openLogServer(self, port, logDir):
+        return NullLogServer()
+
+def call(method, *args):
+    "Marshal the arguments and result as they would be sent over XML-RPC"
+    args = xmlrpclib.loads(xmlrpclib.dumps(args))[0]
+    result = method(*args)
+    return xmlrpclib.loads(xmlrpclib.dumps((result, ),
+                                           methodresponse=True))[0][0]
+
+def emptyPool(cnc):
+    for c in cnc.components():
+        cnc.remove(c)
+        c.close()
+
+def timeSerial(cnc, regArray):
+    start = time.time()
+    for reg in regArray:
+        call(cnc.rpc_component_register, *reg)
+    return time.time() - start
+
+def timeBatch(cnc, regArray):
+    start = time.time()
+    rtnList = call(cnc.rpc_component_register_batch, regArray)
+    secs = time.time() - start
+
+    for r in rtnList:
+        if r.has_key("error"):
+            raise SystemExit("Batch registration failed: " + r["error"])
+    return secs
+
+if __name__ == "__main__":
+    op = optparse.OptionParser()
+    op.add_option("-H", "--numberOfHubs", type="int", dest="numHubs",
+                  default=86, help="Number of in-ice hubs")
+    op.add_option("-r", "--reps", type="int", dest="reps", default=5,
+                  help="Number of times to register the detector")
+    opt, args = op.parse_args()
+
+    compData = ComponentData.createAll(opt.numHubs, False)
+    regArray = [cd.getFakeClient().registrationData() for cd in compData]
+
+    cnc = BenchCnCServer()
+    try:
+        serialSecs = 0.0
+        batchSecs = 0.0
+        for r in range(opt.reps):
+            serialSecs += timeSerial(cnc, regArray)
+            if cnc.numComponents() != len(regArray):
+                raise SystemExit("Expected %d components, not %d" %
+                                 (len(regArray), cnc.numComponents()))
+            emptyPool(cnc)
+
+            batchSecs += timeBatch(cnc, regArray)
+            if cnc.numComponents() != len(regArray):
+                raise SystemExit("Expected %d components, not %d" %
+                                 (len(regArray), cnc.numComponents()))
+            emptyPool(cnc)
+    finally:
+        cnc.closeServer()
+
+    print "%d components, %d reps" % (len(regArray), opt.reps)
+    print "  one at a time: %.3f secs" % serialSecs
+    print "  batch: %.3f secs" % batchSecs
+    if batchSecs > 0.0:
+        print "  speedup: %.1fx" % (serialSecs / batchSecs)
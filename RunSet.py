@@ -1,23 +1,27 @@
 #!/usr/bin/env python
 
-import datetime, os, socket, time
+import datetime, os, shutil, socket, tempfile, threading, time
 
 import SpadeQueue
 
 from CnCThread import CnCThread
 from CompOp import ComponentOperation, ComponentOperationGroup, Result
+from ConnGraph import ConnectionGraph, ConnectionGraphException
 from DAQConfig import DOMNotInConfigException
 from DAQConst import DAQPort
 from DAQLaunch import killJavaComponents, startJavaComponents
 from DAQLog import DAQLog, FileAppender, LiveSocketAppender, LogSocketServer
 from DAQRPC import RPCClient
 from LiveImports import MoniClient, Prio
+from PhaseTimer import NullPhaseTimer, PhaseTimer
 from RunOption import RunOption
 from RunSetDebug import RunSetDebug
 from RunSetState import RunSetState
 from RunStats import PayloadTime, RunStats
+from StateCache import StateCache
 from TaskManager import TaskManager
 from UniqueID import UniqueID
+from utils import clock
 from utils import ip
 from utils import DashXMLLog
 
@@ -111,23 +115,15 @@ class ConnTypeEntry(object):
 
         # if there are no inputs, throw an error
         if inLen == 0:
-            outStr = ''
-            for outComp in self.__outList + self.__optOutList:
-                if len(outStr) == 0:
-                    outStr = str(outComp)
-                else:
-                    outStr += ', ' + str(outComp)
+            outStr = ", ".join([str(c) for c in
+                                self.__outList + self.__optOutList])
             raise ConnectionException('No inputs found for %s outputs (%s)' %
                                       (self.__type, outStr))
 
         # if there are no outputs, throw an error
         if outLen == 0:
-            inStr = ''
-            for inPair in self.__inList + self.__optInList:
-                if len(inStr) == 0:
-                    inStr = str(inPair[1])
-                else:
-                    inStr += ', ' + str(inPair[1])
+            inStr = ", ".join([str(p[1]) for p in
+                               self.__inList + self.__optInList])
             raise ConnectionException('No outputs found for %s inputs (%s)' %
                                       (self.__type, inStr))
 
@@ -147,11 +143,8 @@ class ConnTypeEntry(object):
             inComp = inObj[1]
 
             for outComp in self.__outList + self.__optOutList:
-                entry = Connection(inConn, inComp)
-
-                if not connMap.has_key(outComp):
-                    connMap[outComp] = []
-                connMap[outComp].append(entry)
+                connMap.setdefault(outComp, []).append(Connection(inConn,
+                                                                  inComp))
         else:
             if len(self.__outList) == 1:
                 outComp = self.__outList[0]
@@ -159,45 +152,186 @@ class ConnTypeEntry(object):
                 outComp = self.__optOutList[0]
 
             for inConn, inComp in self.__inList + self.__optInList:
-                entry = Connection(inConn, inComp)
+                connMap.setdefault(outComp, []).append(Connection(inConn,
+                                                                  inComp))
+
+class StateNotifier(object):
+    """
+    Wake threads which are waiting for components to change state
+    whenever a component reports a new state to CnCServer
+    """
+
+    def __init__(self):
+        self.__cond = threading.Condition()
+        self.__generation = 0
+
+    def generation(self):
+        "Return a value which changes each time a component reports a state"
+        self.__cond.acquire()
+        try:
+            return self.__generation
+        finally:
+            self.__cond.release()
+
+    def notify(self):
+        "Wake all waiting threads"
+        self.__cond.acquire()
+        try:
+            self.__generation += 1
+            self.__cond.notifyAll()
+        finally:
+            self.__cond.release()
+
+    def wait(self, generation, secs):
+        """
+        Wait up to 'secs' seconds for a state report made after
+        generation() returned 'generation'.  Return True if one arrived.
+        """
+        endSecs = clock.monotonic() + secs
 
-                if not connMap.has_key(outComp):
-                    connMap[outComp] = []
-                connMap[outComp].append(entry)
+        self.__cond.acquire()
+        try:
+            while self.__generation == generation:
+                waitSecs = endSecs - clock.monotonic()
+                if waitSecs <= 0.0:
+                    break
+                self.__cond.wait(waitSecs)
+            return self.__generation != generation
+        finally:
+            self.__cond.release()
 
-class SubrunThread(CnCThread):
-    "A thread which starts the subrun in an individual stringHub"
+class FinalizeThread(CnCThread):
+    "Run a RunData's end-of-run jobs in the order they were queued"
 
-    def __init__(self, comp, data, log):
-        self.__comp = comp
-        self.__data = data
-        self.__log = log
-        self.__time = None
+    def __init__(self, runData, runNumber, log):
+        self.__runData = runData
 
-        super(SubrunThread, self).__init__(comp.fullName() + ":subrun", log)
+        super(FinalizeThread, self).__init__("Finalize#%d" % runNumber, log)
 
     def _run(self):
-        tStr = self.__comp.startSubrun(self.__data)
-        if tStr is not None:
-            try:
-                self.__time = long(tStr)
-            except ValueError:
-                self.__log.error(("Component %s startSubrun returned bad" +
-                                  " value \"%s\"") %
-                                 (str(self.__comp), tStr))
-                self.__time = 0
+        self.__runData.runFinalizeJobs()
+
+class LogStage(object):
+    """
+    Component log servers for the next run, opened while the previous run
+    is still stopping.  Log files are written to a temporary directory in
+    the log directory and are moved into the run directory by commit().
+    """
 
-    def comp(self):
-        return self.__comp
+    def __init__(self, runSet, logDir, compList, quiet):
+        """
+        LogStage constructor
+        runSet - run set which creates the log servers
+        logDir - top-level logging directory
+        compList - list of components, in log port order
+        quiet - True if log servers should not echo messages to the console
+        """
+        self.__runSet = runSet
+        self.__logDir = logDir
+        self.__compList = compList[:]
+        self.__quiet = quiet
 
-    def finished(self):
-        return self.__time is not None
+        self.__stageDir = None
+        self.__logs = {}
+        self.__complete = False
+        self.__thread = None
 
-    def fullName(self):
-        return self.__comp.fullName()
+    def __str__(self):
+        return "LogStage[%d comps, %s]" % \
+            (len(self.__compList), self.__stageDir)
 
-    def time(self):
-        return self.__time
+    def build(self):
+        "Create the staging directory and a log server for each component"
+        self.__stageDir = tempfile.mkdtemp(prefix=".logstage-",
+                                           dir=self.__logDir)
+
+        host = ip.getLocalIpAddr()
+        port = DAQPort.RUNCOMP_BASE
+        for c in self.__compList:
+            self.__logs[c] = \
+                self.__runSet.createComponentLog(self.__stageDir, c, host,
+                                                 port, None, None,
+                                                 quiet=self.__quiet)
+            port += 1
+
+        self.__complete = True
+
+    def commit(self, runDir, compList, quiet):
+        """
+        Move the staged log files into 'runDir' and return a dictionary
+        mapping each component to its log server.  If the staged servers
+        don't match 'compList' or the files cannot all be moved, the stage
+        is discarded and None is returned.
+        """
+        self.wait()
+
+        if not self.__complete or self.__quiet != quiet or \
+                len(compList) != len(self.__compList):
+            self.discard()
+            return None
+        for i in range(len(compList)):
+            if compList[i] is not self.__compList[i]:
+                self.discard()
+                return None
+
+        moved = []
+        try:
+            for c in self.__compList:
+                name = RunSet.componentLogName(c)
+                src = os.path.join(self.__stageDir, name)
+                if os.path.exists(src):
+                    dst = os.path.join(runDir, name)
+                    os.rename(src, dst)
+                    moved.append((src, dst))
+        except OSError:
+            for (src, dst) in moved:
+                try:
+                    os.rename(dst, src)
+                except OSError:
+                    pass
+            self.discard()
+            return None
+
+        shutil.rmtree(self.__stageDir, ignore_errors=True)
+        self.__stageDir = None
+
+        logs = self.__logs
+        self.__logs = {}
+        return logs
+
+    def discard(self):
+        "Stop all staged log servers and remove the staging directory"
+        self.wait()
+
+        for c in self.__logs:
+            self.__logs[c].stopServing()
+        self.__logs = {}
+
+        if self.__stageDir is not None:
+            shutil.rmtree(self.__stageDir, ignore_errors=True)
+            self.__stageDir = None
+
+    def start(self, log):
+        "Build the log servers in a background thread"
+        self.__thread = LogStageThread(self, log)
+        self.__thread.start()
+
+    def wait(self):
+        "Wait for the background thread to finish"
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+class LogStageThread(CnCThread):
+    "Build a LogStage's log servers"
+
+    def __init__(self, stage, log):
+        self.__stage = stage
+
+        super(LogStageThread, self).__init__("LogStage", log)
+
+    def _run(self):
+        self.__stage.build()
 
 class RunData(object):
     def __init__(self, runSet, runNumber, clusterConfigName, runConfig,
@@ -258,6 +392,12 @@ class RunData(object):
 
         self.__firstPayTime = -1
 
+        # end-of-run jobs (SPADE tarball, run.xml) which have not finished
+        self.__jobCond = threading.Condition()
+        self.__jobs = []
+        self.__jobThread = None
+        self.__closeLogWhenDone = False
+
     def __str__(self):
         return "Run#%d %s" % (self.__runNumber, self.__runStats)
 
@@ -349,10 +489,35 @@ class RunData(object):
             self.__liveMoniClient.sendMoni("runstop", data, prio=Prio.SCP,
                                            time=time)
 
+    def addFinalizeJob(self, name, method, *args):
+        """
+        Queue an end-of-run job which will be run in the background after
+        any previously queued jobs have finished
+        """
+        self.__jobCond.acquire()
+        try:
+            self.__jobs.append((name, method, args))
+            if self.__jobThread is None:
+                self.__jobThread = FinalizeThread(self, self.__runNumber,
+                                                  self.__dashlog)
+                self.__jobThread.start()
+        finally:
+            self.__jobCond.release()
+
     def destroy(self):
         self.stop()
         if self.__liveMoniClient is not None:
             self.__liveMoniClient.close()
+
+        self.__jobCond.acquire()
+        try:
+            if self.__jobThread is not None:
+                # the finalize thread still needs dash.log
+                self.__closeLogWhenDone = True
+                return
+        finally:
+            self.__jobCond.release()
+
         if self.__dashlog is not None:
             self.__dashlog.close()
             self.__dashlog = None
@@ -461,6 +626,37 @@ class RunData(object):
     def runDirectory(self):
         return self.__runDir
 
+    def runFinalizeJobs(self):
+        "Run queued end-of-run jobs until none are left"
+        while True:
+            self.__jobCond.acquire()
+            try:
+                if len(self.__jobs) == 0:
+                    self.__jobThread = None
+                    closeLog = self.__closeLogWhenDone
+                    self.__jobCond.notifyAll()
+                    break
+                (name, method, args) = self.__jobs[0]
+            finally:
+                self.__jobCond.release()
+
+            try:
+                method(*args)
+            except:
+                self.__dashlog.error("Run#%d %s failed: %s" %
+                                     (self.__runNumber, name, exc_string()))
+
+            self.__jobCond.acquire()
+            try:
+                del self.__jobs[0]
+                self.__jobCond.notifyAll()
+            finally:
+                self.__jobCond.release()
+
+        if closeLog and self.__dashlog is not None:
+            self.__dashlog.close()
+            self.__dashlog = None
+
     def runNumber(self):
         return self.__runNumber
 
@@ -470,6 +666,14 @@ class RunData(object):
     def firstPayTime(self):
         return self.__firstPayTime
 
+    def pendingFinalizeJobs(self):
+        "Return the names of end-of-run jobs which have not yet finished"
+        self.__jobCond.acquire()
+        try:
+            return [job[0] for job in self.__jobs]
+        finally:
+            self.__jobCond.release()
+
     def sendEventCounts(self, state, comps):
         "Report run monitoring quantities"
         moniData = self.getEventCounts(state, comps)
@@ -518,6 +722,29 @@ class RunData(object):
                               " %s SN events, %s tcals")  %
                              (numEvts, rateStr, numMoni, numSN, numTcal))
 
+    def waitForFinalize(self, timeoutSecs=None):
+        """
+        Wait for all queued end-of-run jobs to finish.
+        Return True if there are no more pending jobs.
+        """
+        if timeoutSecs is not None:
+            endSecs = clock.monotonic() + timeoutSecs
+
+        self.__jobCond.acquire()
+        try:
+            while len(self.__jobs) > 0:
+                if timeoutSecs is None:
+                    self.__jobCond.wait()
+                else:
+                    remaining = endSecs - clock.monotonic()
+                    if remaining <= 0.0:
+                        break
+                    self.__jobCond.wait(remaining)
+
+            return len(self.__jobs) == 0
+        finally:
+            self.__jobCond.release()
+
     def warn(self, msg):
         self.__dashlog.warn(msg)
 
@@ -533,11 +760,50 @@ class RunSet(object):
     #
     TIMEOUT_SECS = RPCClient.TIMEOUT_SECS - 5
 
+    # maximum number of seconds to wait for each level of non-source
+    # components to start (as long as a single startRun() call may take)
+    #
+    START_LEVEL_SECS = RPCClient.METHOD_TIMEOUTS.get("xmlrpc.startRun",
+                                                     RPCClient.TIMEOUT_SECS)
+
     # True if we've printed a warning about the failed IceCube Live code import
     LIVE_WARNING = False
 
+    # maximum number of seconds to wait for each step of a subrun to finish
+    #
+    SUBRUN_SECS = 30
+
     STATE_DEAD = "DEAD"
 
+    # components report state changes through this object
+    #
+    STATE_NOTIFIER = StateNotifier()
+
+    # most recently seen state of each component
+    #
+    STATE_CACHE = StateCache()
+
+    # status requests accept component states which are up to this many
+    # seconds old, so simultaneous requests share a single query
+    #
+    STATE_MAX_AGE_SECS = 1.0
+
+    # number of seconds before the first and between later state polls
+    # of components which don't report their state changes
+    #
+    POLL_MIN_SECS = 0.05
+    POLL_MAX_SECS = 1.0
+
+    # number of seconds between state polls if every component
+    # reports its state changes
+    #
+    PUSH_POLL_SECS = 5.0
+
+    # minimum number of seconds between repeated "Waiting for ..." messages
+    # if the list of components being waited on hasn't changed
+    #
+    WAIT_MSG_SECS = 1.0
+
     def __init__(self, parent, cfg, set, logger):
         """
         RunSet constructor:
@@ -565,8 +831,28 @@ class RunSet(object):
         self.__compLog = {}
         self.__stopping = False
 
+        # duration of the run being stopped, used to queue it for SPADE
+        self.__stopDuration = None
+
         self.__debugBits = 0x0
 
+        # records run transition times if RunSetDebug.TIMING is set
+        self.__timer = NullPhaseTimer()
+
+        # (subrun number, {hub name : seconds}) for the most recent subrun
+        self.__subrunLatency = None
+
+        # connection map from the last connect(), used to repair the runset
+        self.__connMap = None
+
+        # data for the most recently stopped run, which may still have
+        # end-of-run jobs running in the background
+        self.__stoppedRunData = None
+
+        # log servers opened for the next run while the last run stopped
+        self.__logStage = None
+        self.__logQuiet = True
+
     def __repr__(self):
         return str(self)
 
@@ -596,14 +882,10 @@ class RunSet(object):
         """
         slst = []
 
-        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
-        for c in self.__set:
-            tGroup.start(c, self.__logger, ())
-        tGroup.wait()
-        states = tGroup.results()
+        states = self.STATE_CACHE.states(self.__set, 0, self.__logger)
         for c in self.__set:
             if states.has_key(c):
-                stateStr = str(states[c])
+                stateStr = states[c]
             else:
                 stateStr = self.STATE_DEAD
             if stateStr != newState:
@@ -621,6 +903,80 @@ class RunSet(object):
 
         return slst
 
+    @staticmethod
+    def __orderLevels(compList, backToFront):
+        """
+        Group components by their order() level, returning a list of
+        lists sorted either back to front (for starting) or
+        front to back (for stopping)
+        """
+        levelDict = {}
+        for c in compList:
+            if not levelDict.has_key(c.order()):
+                levelDict[c.order()] = []
+            levelDict[c.order()].append(c)
+
+        keys = levelDict.keys()
+        keys.sort()
+        if backToFront:
+            keys.reverse()
+
+        return [levelDict[k] for k in keys]
+
+    def __pauseForStateChange(self, compList, generation, pollSecs):
+        """
+        Wait until a component reports a state change (or until the
+        polling interval has passed) and return the next polling interval.
+        Polling backs off from POLL_MIN_SECS to POLL_MAX_SECS, and when
+        every component in 'compList' reports its own state changes
+        the poll is only a fallback.
+        """
+        pushAll = True
+        for c in compList:
+            if not c.pushesState():
+                pushAll = False
+                break
+
+        if pushAll:
+            waitSecs = self.PUSH_POLL_SECS
+        else:
+            waitSecs = pollSecs
+
+        if self.STATE_NOTIFIER.wait(generation, waitSecs):
+            return self.POLL_MIN_SECS
+
+        return min(pollSecs * 2, self.POLL_MAX_SECS)
+
+    def __runLevel(self, debugBit, prefix, op, level, opData, logger,
+                   method, phase, waitSecs=None):
+        """
+        Run an operation in parallel on all components in one level,
+        waiting up to 'waitSecs' seconds (or the default group wait) for
+        them to finish.  Return the ComponentOperationGroup.
+        """
+        self.__logDebug(debugBit, "%s level %d: %s", prefix, level[0].order(),
+                        self.__listComponentsCommaSep(level))
+        startSecs = time.time()
+        startVal = self.__timer.start()
+
+        tGroup = ComponentOperationGroup(op)
+        for c in level:
+            tGroup.start(c, logger, opData)
+        if waitSecs is None:
+            tGroup.wait()
+        else:
+            tGroup.wait(waitSecs=waitSecs)
+        tGroup.reportErrors(logger, method)
+
+        levelPhase = "%s.level%d" % (phase, level[0].order())
+        self.__timer.stop(levelPhase, startVal)
+        self.__timer.addComponents(levelPhase, tGroup.completionTimes())
+
+        self.__logDebug(debugBit, "%s level %d done in %.3f secs", prefix,
+                        level[0].order(), time.time() - startSecs)
+
+        return tGroup
+
     @staticmethod
     def __listComponentsCommaSep(compList):
         """
@@ -650,21 +1006,46 @@ class RunSet(object):
         else:
             logger.error(args[0] % args[1:])
 
+    def __discardLogStage(self):
+        "Throw away any log servers staged for the next run"
+        if self.__logStage is not None:
+            self.__logStage.discard()
+            self.__logStage = None
+
+    def __stageLogs(self, logDir):
+        "Start opening the next run's component log servers"
+        self.__discardLogStage()
+
+        self.__logStage = LogStage(self, logDir, self.__set, self.__logQuiet)
+        self.__logStage.start(self.__logger)
+
     def __startComponents(self, quiet):
         liveHost = None
         livePort = None
 
+        startVal = self.__timer.start()
+
         tGroup = ComponentOperationGroup(ComponentOperation.CONFIG_LOGGING)
 
         host = ip.getLocalIpAddr()
 
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP initLogs")
+        runDir = self.__runData.runDirectory()
+        staged = None
+        if self.__logStage is not None:
+            staged = self.__logStage.commit(runDir, self.__set, quiet)
+            self.__logStage = None
+            self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP %s staged logs",
+                            staged is None and "discarded" or "using")
+
         port = DAQPort.RUNCOMP_BASE
         for c in self.__set:
-            self.__compLog[c] = \
-                self.createComponentLog(self.__runData.runDirectory(), c,
-                                        host, port, liveHost, livePort,
-                                        quiet=quiet)
+            if staged is not None:
+                self.__compLog[c] = staged[c]
+            else:
+                self.__compLog[c] = \
+                    self.createComponentLog(runDir, c, host, port, liveHost,
+                                            livePort, quiet=quiet)
             tGroup.start(c, self.__runData, (host, port, liveHost, livePort))
 
             port += 1
@@ -672,6 +1053,7 @@ class RunSet(object):
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP waitLogs")
         tGroup.wait()
         tGroup.reportErrors(self.__runData, "startLogging")
+        self.__timer.stop("startLogging", startVal)
 
         self.__runData.error("Starting run %d..." % self.__runData.runNumber())
 
@@ -696,16 +1078,32 @@ class RunSet(object):
 
         self.__state = RunSetState.STARTING
 
-        # start non-sources in order (back to front)
+        # start non-sources level by level (back to front), starting
+        # all components within a level in parallel.  A level must have
+        # started before the next one is started.
         #
-        otherSet.sort(self.sortCmp)
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP startOther")
-        for c in otherSet:
-            c.startRun(self.__runData.runNumber())
+        opData = (self.__runData.runNumber(), )
+        for level in self.__orderLevels(otherSet, True):
+            tGroup = self.__runLevel(RunSetDebug.START_RUN, "STARTCOMP",
+                                     ComponentOperation.START_RUN, level,
+                                     opData, self.__runData, "startRun",
+                                     "startOther",
+                                     waitSecs=self.START_LEVEL_SECS)
+
+            (numAlive, numErrors) = tGroup.getErrors()
+            if numAlive > 0 or numErrors > 0:
+                raise RunSetException(("Could not start runset#%d run#%d" +
+                                       " level %d components (%d hanging," +
+                                       " %d failed): %s") %
+                                      (self.__id, self.__runData.runNumber(),
+                                       level[0].order(), numAlive, numErrors,
+                                       self.__listComponentsCommaSep(level)))
 
         # start sources in parallel
         #
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP startSrcs")
+        phaseVal = self.__timer.start()
         tGroup = ComponentOperationGroup(ComponentOperation.START_RUN)
         opData = (self.__runData.runNumber(), )
         for c in srcSet:
@@ -713,9 +1111,13 @@ class RunSet(object):
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP waitSrcs")
         tGroup.wait()
         tGroup.reportErrors(self.__runData, "startRun")
+        self.__timer.stop("startSources", phaseVal)
+        self.__timer.addComponents("startSources", tGroup.completionTimes())
 
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP waitStChg")
+        phaseVal = self.__timer.start()
         self.__waitForStateChange(self.__runData, 30)
+        self.__timer.stop("waitForRunning", phaseVal)
 
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP chkRunning")
         badList = self.__checkState(RunSetState.RUNNING)
@@ -726,6 +1128,7 @@ class RunSet(object):
                                   (self.__id, self.__runData.runNumber(),
                                    self.__badStateString(badList)))
 
+        self.__timer.stop("startComponents", startVal)
         self.__logDebug(RunSetDebug.START_RUN, "STARTCOMP done")
 
     def __stopLogging(self):
@@ -745,6 +1148,7 @@ class RunSet(object):
             raise RunSetException("RunSet #%d is not running" % self.__id)
 
         self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING %s", self.__runData)
+        stopVal = self.__timer.start()
         self.__runData.stop()
 
         srcSet = []
@@ -767,10 +1171,12 @@ class RunSet(object):
                 self.__state = RunSetState.STOPPING
                 srcOp = ComponentOperation.STOP_RUN
                 timeoutSecs = int(RunSet.TIMEOUT_SECS * .75)
+                phase = "stopRun"
             else:
                 self.__state = RunSetState.FORCING_STOP
                 srcOp = ComponentOperation.FORCED_STOP
                 timeoutSecs = int(RunSet.TIMEOUT_SECS * .25)
+                phase = "forcedStop"
 
             waitList = srcSet + otherSet
             if i == 1:
@@ -782,23 +1188,24 @@ class RunSet(object):
             #
             self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING SRC create *%d",
                             len(srcSet))
+            phaseVal = self.__timer.start()
             tGroup = ComponentOperationGroup(srcOp)
             for c in srcSet:
                 tGroup.start(c, self.__runData, ())
             tGroup.wait()
             tGroup.reportErrors(self.__runData, self.__state)
+            self.__timer.stop(phase + ".sources", phaseVal)
+            self.__timer.addComponents(phase + ".sources",
+                                       tGroup.completionTimes())
             self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING SRC done")
 
-            # stop non-sources in order
+            # stop non-sources level by level (front to back), stopping
+            # all components within a level in parallel
             #
-            for c in otherSet:
-                self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING OTHER %s", c)
-                tGroup = ComponentOperationGroup(srcOp)
-                tGroup.start(c, self.__runData, ())
-                tGroup.wait()
-                tGroup.reportErrors(self.__runData, self.__state)
-                self.__logDebug(RunSetDebug.STOP_RUN,
-                                "STOPPING OTHER %s done", c)
+            for level in self.__orderLevels(otherSet, False):
+                self.__runLevel(RunSetDebug.STOP_RUN, "STOPPING", srcOp,
+                                level, (), self.__runData, self.__state,
+                                phase)
 
             connDict = {}
 
@@ -811,17 +1218,18 @@ class RunSet(object):
             #
             waitMsgPeriod = 5
 
+            phaseVal = self.__timer.start()
+
+            pollSecs = self.POLL_MIN_SECS
+
             while len(waitList) > 0 and curSecs < endSecs:
                 self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING WAITCHK top")
+                generation = self.STATE_NOTIFIER.generation()
                 newList = waitList[:]
-                tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
-                for c in waitList:
-                    tGroup.start(c, self.__logger, ())
-                tGroup.wait()
-                states = tGroup.results()
+                states = self.STATE_CACHE.states(waitList, 0, self.__logger)
                 for c in waitList:
                     if states.has_key(c):
-                        stateStr = str(states[c])
+                        stateStr = states[c]
                     else:
                         stateStr = self.STATE_DEAD
                     if stateStr != self.__state:
@@ -851,8 +1259,11 @@ class RunSet(object):
                     #
                     # hmmm ... we may be hanging
                     #
-                    time.sleep(1)
+                    pollSecs = self.__pauseForStateChange(waitList,
+                                                          generation,
+                                                          pollSecs)
                 else:
+                    pollSecs = self.POLL_MIN_SECS
                     #
                     # one or more components must have stopped
                     #
@@ -878,6 +1289,8 @@ class RunSet(object):
                                 "STOPPING WAITCHK - %d secs, %d comps",
                                 endSecs - curSecs, len(waitList))
 
+            self.__timer.stop(phase + ".wait", phaseVal)
+
             # if the components all stopped normally, don't force-stop them
             #
             if len(waitList) == 0:
@@ -891,9 +1304,11 @@ class RunSet(object):
         self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING reset done")
 
         self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING report")
+        phaseVal = self.__timer.start()
         duration = self.__runData.reportRates(self.__set, xmlLog)
         if duration < 0:
             hadError = True
+        self.__timer.stop("reportRates", phaseVal)
         self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING report done")
 
         if hadError:
@@ -902,15 +1317,21 @@ class RunSet(object):
             self.__runData.error("Run terminated SUCCESSFULLY.")
 
         self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING saveCatchall")
+        phaseVal = self.__timer.start()
         self.__parent.saveCatchall(self.__runData.runDirectory())
+        self.__timer.stop("saveCatchall", phaseVal)
 
-        self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING queueSpade")
-        self.queueForSpade(duration)
+        # stopRun() queues this for SPADE once the run's logs are complete
+        self.__stopDuration = duration
 
         self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING stopLog")
+        phaseVal = self.__timer.start()
         self.__stopLogging()
+        self.__timer.stop("stopLogging", phaseVal)
         self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING stopLog done")
 
+        self.__timer.stop("stopComponents", stopVal)
+
         if len(waitList) > 0:
             self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING rptZombies")
             waitStr = None
@@ -936,6 +1357,22 @@ class RunSet(object):
 
         return hadError
 
+    def __writeRunLog(self, xmlLog, path):
+        "Write the run xml log file"
+        try:
+            xmlLog.writeLog(path)
+        except DashXMLLog.DashXMLLogException:
+            self.__logger.error("Could not write run xml log file: %s" % path)
+
+    def __writeTimes(self, logDir):
+        "Write this run's transition times and start a new set of times"
+        path = os.path.join(logDir, PhaseTimer.FILENAME)
+        try:
+            self.__timer.write(path)
+        except IOError, ioe:
+            self.__logger.error("Could not write %s: %s" % (path, ioe))
+        self.__timer.reset()
+
     def __validateSubrunDOMs(self, subrunData):
         """
         Check that all DOMs in the subrun are valid.
@@ -982,17 +1419,16 @@ class RunSet(object):
         """
         waitList = self.__set[:]
 
+        pollSecs = self.POLL_MIN_SECS
+
         endSecs = time.time() + timeoutSecs
         while len(waitList) > 0 and time.time() < endSecs:
+            generation = self.STATE_NOTIFIER.generation()
             newList = waitList[:]
-            tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
-            for c in waitList:
-                tGroup.start(c, self.__logger, ())
-            tGroup.wait()
-            states = tGroup.results()
+            states = self.STATE_CACHE.states(waitList, 0, self.__logger)
             for c in waitList:
                 if states.has_key(c):
-                    stateStr = str(states[c])
+                    stateStr = states[c]
                 else:
                     stateStr = self.STATE_DEAD
                 if stateStr != self.__state:
@@ -1001,8 +1437,10 @@ class RunSet(object):
             # if one or more components changed state...
             #
             if len(waitList) == len(newList):
-                time.sleep(1)
+                pollSecs = self.__pauseForStateChange(waitList, generation,
+                                                      pollSecs)
             else:
+                pollSecs = self.POLL_MIN_SECS
                 waitList = newList
                 if len(waitList) > 0:
                     waitStr = self.__listComponentsCommaSep(waitList)
@@ -1026,9 +1464,10 @@ class RunSet(object):
 
         for comp in self.__set:
             for n in comp.connectors():
-                if not connDict.has_key(n.name()):
-                    connDict[n.name()] = ConnTypeEntry(n.name())
-                connDict[n.name()].add(n, comp)
+                name = n.name()
+                if not connDict.has_key(name):
+                    connDict[name] = ConnTypeEntry(name)
+                connDict[name].add(n, comp)
 
         connMap = {}
 
@@ -1050,36 +1489,48 @@ class RunSet(object):
         self.__logDebug(RunSetDebug.START_RUN, "RSConfig TOP")
         self.__state = RunSetState.CONFIGURING
 
+        startVal = self.__timer.start()
+
         data = (self.configName(), )
         tGroup = ComponentOperationGroup(ComponentOperation.CONFIG_COMP)
         for c in self.__set:
             tGroup.start(c, self.__logger, data)
         tGroup.wait()
         tGroup.reportErrors(self.__logger, "configure")
+        self.__timer.addComponents("configure", tGroup.completionTimes())
 
-        for i in range(60):
+        pollSecs = self.POLL_MIN_SECS
+
+        prevWaitStr = None
+        nextMsgSecs = 0.0
+
+        endSecs = time.time() + 60
+        while True:
+            generation = self.STATE_NOTIFIER.generation()
             waitList = []
-            tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
-            for c in self.__set:
-                tGroup.start(c, self.__logger, ())
-            tGroup.wait()
-            states = tGroup.results()
+            states = self.STATE_CACHE.states(self.__set, 0, self.__logger)
             for c in self.__set:
                 if states.has_key(c):
-                    stateStr = str(states[c])
+                    stateStr = states[c]
                 else:
                     stateStr = self.STATE_DEAD
                 if stateStr != RunSetState.CONFIGURING and \
                         stateStr != RunSetState.READY:
                     waitList.append(c)
 
-            if len(waitList) == 0:
+            if len(waitList) == 0 or time.time() >= endSecs:
                 break
-            self.__logger.info('%s: Waiting for %s: %s' %
-                               (str(self), self.__state,
-                                self.__listComponentsCommaSep(waitList)))
 
-            time.sleep(1)
+            waitStr = self.__listComponentsCommaSep(waitList)
+            now = time.time()
+            if waitStr != prevWaitStr or now >= nextMsgSecs:
+                self.__logger.info('%s: Waiting for %s: %s' %
+                                   (str(self), self.__state, waitStr))
+                prevWaitStr = waitStr
+                nextMsgSecs = now + self.WAIT_MSG_SECS
+
+            pollSecs = self.__pauseForStateChange(waitList, generation,
+                                                  pollSecs)
 
         self.__waitForStateChange(self.__logger, 60)
 
@@ -1090,6 +1541,7 @@ class RunSet(object):
             raise RunSetException(msg)
 
         self.__configured = True
+        self.__timer.stop("configure", startVal)
         self.__logDebug(RunSetDebug.START_RUN, "RSConfig DONE")
 
     def configured(self):
@@ -1099,6 +1551,9 @@ class RunSet(object):
         self.__logDebug(RunSetDebug.START_RUN, "RSConn TOP")
 
         self.__state = RunSetState.CONNECTING
+        self.__connMap = connMap
+
+        startVal = self.__timer.start()
 
         # connect all components
         #
@@ -1108,6 +1563,7 @@ class RunSet(object):
             tGroup.start(c, self.__logger, connMap)
         tGroup.wait()
         tGroup.reportErrors(self.__logger, "connect")
+        self.__timer.addComponents("connect", tGroup.completionTimes())
 
         try:
             self.__waitForStateChange(self.__logger, 20)
@@ -1123,6 +1579,7 @@ class RunSet(object):
         if errMsg:
             raise RunSetException(errMsg)
 
+        self.__timer.stop("connect", startVal)
         self.__logDebug(RunSetDebug.START_RUN, "RSConn DONE")
 
     @staticmethod
@@ -1132,12 +1589,17 @@ class RunSet(object):
             raise RunSetException("Run directory \"%s\" does not exist" %
                                   runDir)
 
-        logName = os.path.join(runDir, "%s-%d.log" % (comp.name(), comp.num()))
+        logName = os.path.join(runDir, RunSet.componentLogName(comp))
         sock = LogSocketServer(port, comp.fullName(), logName, quiet=quiet)
         sock.startServing()
 
         return sock
 
+    @staticmethod
+    def componentLogName(comp):
+        "Return the name of the component's log file in the run directory"
+        return "%s-%d.log" % (comp.name(), comp.num())
+
     def createRunData(self, runNum, clusterConfigName, runOptions, versionInfo,
                       spadeDir, copyDir, logDir, testing=False):
         return RunData(self, runNum, clusterConfigName, self.__cfg,
@@ -1189,6 +1651,8 @@ class RunSet(object):
         if self.__runData is not None:
             self.__runData.destroy()
 
+        self.__discardLogStage()
+
         self.__id = None
         self.__configured = False
         self.__state = RunSetState.DESTROYED
@@ -1232,12 +1696,20 @@ class RunSet(object):
         else:
             self.__logger.error(msg)
 
+    def pendingFinalizeJobs(self):
+        "Return the names of the previous run's unfinished end-of-run jobs"
+        if self.__stoppedRunData is None:
+            return []
+        return self.__stoppedRunData.pendingFinalizeJobs()
+
     def queueForSpade(self, duration):
+        "Queue a background job to build the run's SPADE tarball"
         if self.__runData is None:
             self.__logger.error("No run data; cannot queue for SPADE")
             return
 
-        self.__runData.queueForSpade(duration)
+        self.__runData.addFinalizeJob("queueForSpade",
+                                      self.__runData.queueForSpade, duration)
 
     def reset(self):
         "Reset all components in the runset back to the idle state"
@@ -1278,6 +1750,81 @@ class RunSet(object):
                                dashDir, logPort, livePort, verbose, killWith9,
                                eventCheck)
 
+    def replaceComponents(self, oldList, newList, logger):
+        """
+        Add the restarted components in 'newList' in place of the components
+        in 'oldList', then reconnect and reconfigure the runset using the
+        saved connection map
+        """
+        if self.__connMap is None:
+            raise RunSetException("RunSet #%d has not been connected" %
+                                  self.__id)
+
+        newDict = {}
+        for c in newList:
+            newDict[c.fullName()] = c
+
+        replaced = {}
+        for old in oldList:
+            if not newDict.has_key(old.fullName()):
+                raise RunSetException("No replacement for %s" % old)
+            new = newDict[old.fullName()]
+            replaced[old] = new
+            if not new in self.__set:
+                self.__set.append(new)
+
+        if len(replaced) > 0:
+            self.__connMap = self.__replaceConnections(self.__connMap,
+                                                       replaced)
+
+        self.connect(self.__connMap, logger)
+
+        # surviving components keep their order, so only the replacements
+        # need to be ordered unless something is missing
+        needOrder = False
+        for old in replaced:
+            if old.order() is None:
+                needOrder = True
+                break
+            replaced[old].setOrder(old.order())
+        if needOrder:
+            self.setOrder(self.__connMap, logger)
+
+        self.configure()
+
+    @staticmethod
+    def __replaceConnections(connMap, replaced):
+        """
+        Return a copy of 'connMap' where every component which is a key in
+        'replaced' is swapped for the restarted component
+        """
+        newMap = {}
+        for comp in connMap:
+            newConns = []
+            for entry in connMap[comp]:
+                if not replaced.has_key(entry.comp):
+                    newConns.append(entry)
+                    continue
+
+                # restarted components may be listening on new ports
+                newComp = replaced[entry.comp]
+                newConn = None
+                for n in newComp.connectors():
+                    if n.name() == entry.conn.name() and n.isInput():
+                        newConn = n
+                        break
+                if newConn is None:
+                    raise ConnectionException("%s has no %s input" %
+                                              (newComp, entry.conn.name()))
+                newConns.append(Connection(newConn, newComp))
+
+            if replaced.has_key(comp):
+                newMap[replaced[comp]] = newConns
+            else:
+                newMap[comp] = newConns
+
+        return newMap
+
     def restartComponents(self, compList, clusterConfig, configDir, dashDir,
                           logPort, livePort, verbose, killWith9, eventCheck):
         """
@@ -1314,6 +1861,28 @@ class RunSet(object):
         self.cycleComponents(cluCfgList, configDir, dashDir, logPort, livePort,
                              verbose, killWith9, eventCheck)
 
+    def restartFailedComponents(self, clusterConfig, configDir, dashDir,
+                                logPort, livePort, verbose, killWith9,
+                                eventCheck):
+        """
+        Reset all components and restart those which do not return to the
+        idle state.  Return the list of restarted components.
+        """
+        badPairs = self.reset()
+
+        badComps = []
+        for pair in badPairs:
+            self.__logger.error("Restarting %s (state '%s' after reset)" %
+                                (pair[0], pair[1]))
+            badComps.append(pair[0])
+
+        if len(badComps) > 0:
+            self.restartComponents(badComps, clusterConfig, configDir, dashDir,
+                                   logPort, livePort, verbose, killWith9,
+                                   eventCheck)
+
+        return badComps
+
     def returnComponents(self, pool, clusterConfig, configDir, dashDir,
                          logPort, livePort, verbose, killWith9, eventCheck):
         badPairs = self.reset()
@@ -1344,6 +1913,9 @@ class RunSet(object):
         if len(badComps) > 0:
             raise RunSetException('Could not reset %s' % str(badComps))
 
+    def runConfig(self):
+        return self.__cfg
+
     def runNumber(self):
         if self.__runData is None:
             return None
@@ -1361,9 +1933,18 @@ class RunSet(object):
         else:
             self.__debugBits |= debugBit
 
+        if (self.__debugBits & RunSetDebug.TIMING) != RunSetDebug.TIMING:
+            self.__timer = NullPhaseTimer()
+        elif not self.__timer.isEnabled():
+            self.__timer = PhaseTimer()
+
         if self.__runData is not None:
             self.__runData.setDebugBits(self.__debugBits)
 
+    def phaseTimer(self):
+        "Return the object which records run transition times"
+        return self.__timer
+
     def setError(self):
         self.__logDebug(RunSetDebug.STOP_RUN, "SetError %s", self.__runData)
         try:
@@ -1377,79 +1958,22 @@ class RunSet(object):
     def setOrder(self, connMap, logger):
         "set the order in which components are started/stopped"
         self.__logDebug(RunSetDebug.START_RUN, "RSOrder TOP")
+        startVal = self.__timer.start()
 
-        # build initial lists of source components
-        #
-        allComps = {}
-        curLevel = []
         for c in self.__set:
-            # complain if component has already been added
-            #
-            if allComps.has_key(c):
-                logger.error('Found multiple instances of %s' % str(c))
-                continue
-
-            # clear order
-            #
             c.setOrder(None)
+            if c.isSource() and not connMap.has_key(c):
+                logger.warn('No connection map entry for %s' % str(c))
 
-            # add component to the list
-            #
-            allComps[c] = 1
-
-            # if component is a source, save it to the initial list
-            #
-            if c.isSource():
-                curLevel.append(c)
-
-        if len(curLevel) == 0:
-            raise RunSetException("No sources found")
-
-        # walk through detector, setting order number for each component
-        #
-        level = 1
-        while len(allComps) > 0 and len(curLevel) > 0 and \
-                level < len(self.__set) + 2:
-            tmp = {}
-            for c in curLevel:
-
-                # if we've already ordered this component, skip it
-                #
-                if not allComps.has_key(c):
-                    continue
-
-                del allComps[c]
-
-                c.setOrder(level)
-
-                if not connMap.has_key(c):
-                    if c.isSource():
-                        logger.warn('No connection map entry for %s' % str(c))
-                else:
-                    for m in connMap[c]:
-                        # XXX hack -- ignore source->builder links
-                        if not c.isSource() or not m.comp.isBuilder():
-                            tmp[m.comp] = 1
-
-            curLevel = tmp.keys()
-            level += 1
-
-        if len(allComps) > 0:
-            errStr = 'Unordered:'
-            for c in allComps:
-                errStr += ' ' + str(c)
-            logger.error(errStr)
+        try:
+            levels = ConnectionGraph(self.__set, connMap).levels()
+        except ConnectionGraphException, cge:
+            raise RunSetException(str(cge))
 
         for c in self.__set:
-            failStr = None
-            if not c.order():
-                if not failStr:
-                    failStr = 'No order set for ' + str(c)
-                else:
-                    failStr += ', ' + str(c)
-            if failStr:
-                raise RunSetException(failStr)
+            c.setOrder(levels[c.name()])
 
+        self.__timer.stop("setOrder", startVal)
         self.__logDebug(RunSetDebug.START_RUN, "RSOrder DONE")
 
     def size(self):
@@ -1484,6 +2008,7 @@ class RunSet(object):
                                             spadeDir, copyDir, logDir)
         self.__runData.setDebugBits(self.__debugBits)
         self.__logDebug(RunSetDebug.START_RUN, "STARTING startComps")
+        self.__logQuiet = quiet
         self.__startComponents(quiet)
         self.__logDebug(RunSetDebug.START_RUN, "STARTING finishSetup")
         self.__runData.finishSetup(self)
@@ -1497,16 +2022,13 @@ class RunSet(object):
         Return a dictionary of components in the runset
         and their current state
         """
-        tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
-        for c in self.__set:
-            tGroup.start(c, self.__logger, ())
-        tGroup.wait()
-        states = tGroup.results()
+        states = self.STATE_CACHE.states(self.__set, self.STATE_MAX_AGE_SECS,
+                                         self.__logger)
 
         setStats = {}
         for c in self.__set:
             if states.has_key(c):
-                setStats[c] = str(states[c])
+                setStats[c] = states[c]
             else:
                 setStats[c] = self.STATE_DEAD
 
@@ -1526,6 +2048,7 @@ class RunSet(object):
             return False
 
         self.__stopping = True
+        self.__stopDuration = None
         try:
             try:
                 xmlLog = DashXMLLog.DashXMLLog()
@@ -1551,15 +2074,30 @@ class RunSet(object):
                         logDir = "."
                         logFile = "run-%d.xml"% self.__runData.runNumber()
                     
+                    if self.__timer.isEnabled():
+                        xmlLog.setField("TransitionTimes",
+                                        self.__timer.summary())
+                        self.__writeTimes(logDir)
+
                     xmlLogFileName = os.path.join(logDir, logFile)
-                    try:
-                        xmlLog.writeLog(xmlLogFileName)
-                    except DashXMLLog.DashXMLLogException:
-                        self.__logger.error("Could not write run xml log file: %s" % xmlLogFileName)
+                    self.__runData.addFinalizeJob("writeRunLog",
+                                                  self.__writeRunLog, xmlLog,
+                                                  xmlLogFileName)
+
+                    self.__stoppedRunData = self.__runData
+
+                    runDir = self.__runData.runDirectory()
+                    if not rtnVal and runDir is not None:
+                        self.__stageLogs(os.path.dirname(runDir))
             except:
                 self.__logger.error("Could not stop run: " + exc_string())
                 raise
         finally:
+            # SPADE job goes after stopLogging, timing.json and run.xml
+            if self.__stopDuration is not None:
+                self.__logDebug(RunSetDebug.STOP_RUN, "STOPPING queueSpade")
+                self.queueForSpade(self.__stopDuration)
+                self.__stopDuration = None
             self.__stopping = False
 
         return rtnVal
@@ -1567,6 +2105,15 @@ class RunSet(object):
     def stopping(self):
         return self.__stopping
 
+    def waitForFinalize(self, timeoutSecs=None):
+        """
+        Wait for the previous run's end-of-run jobs to finish.
+        Return True if there are no more pending jobs.
+        """
+        if self.__stoppedRunData is None:
+            return True
+        return self.__stoppedRunData.waitForFinalize(timeoutSecs)
+
     def subrun(self, id, data):
         "Start a subrun with all components in the runset"
         if self.__runData is None or self.__state != RunSetState.RUNNING:
@@ -1598,29 +2145,64 @@ class RunSet(object):
                                  (id, sStr, str(data)))
         else:
             self.__runData.error("Subrun %d: stopping flashers" % id)
-        for c in self.__set:
-            if c.isBuilder():
-                c.prepareSubrun(id)
 
-        shThreads = []
+        builders = []
+        sources = []
         for c in self.__set:
+            if c.isBuilder():
+                builders.append(c)
             if c.isSource():
-                thread = SubrunThread(c, data, self.__runData)
-                thread.start()
-                shThreads.append(thread)
+                sources.append(c)
 
-        badComps = []
+        tGroup = ComponentOperationGroup(ComponentOperation.PREPARE_SUBRUN)
+        for c in builders:
+            tGroup.start(c, self.__runData, (id, ))
+        tGroup.wait(waitSecs=self.SUBRUN_SECS)
+        tGroup.reportErrors(self.__runData, "prepareSubrun")
+
+        # the group is notified as each hub finishes, so this returns as
+        # soon as the last hub responds or the deadline passes
+        #
+        tGroup = ComponentOperationGroup(ComponentOperation.START_SUBRUN)
+        for c in sources:
+            tGroup.start(c, self.__runData, (data, ))
+        tGroup.wait(waitSecs=self.SUBRUN_SECS)
+
+        results = tGroup.results()
+        times = tGroup.completionTimes()
 
+        latency = {}
+        for c in sources:
+            latency[c.fullName()] = times[c]
+        self.__subrunLatency = (id, latency)
+        self.__timer.addComponents("subrun%d" % id, times)
+
+        badComps = []
         latestTime = None
-        while len(shThreads) > 0:
-            time.sleep(0.1)
-            for thread in shThreads:
-                if not thread.isAlive():
-                    if not thread.finished():
-                        badComps.append(thread.comp())
-                    elif latestTime is None or thread.time() > latestTime:
-                        latestTime = thread.time()
-                    shThreads.remove(thread)
+        for c in sources:
+            result = results[c]
+            if result is None or type(result) == Result:
+                badComps.append(c)
+                continue
+
+            try:
+                tVal = long(result)
+            except ValueError:
+                self.__runData.error(("Component %s startSubrun returned" +
+                                      " bad value \"%s\"") % (c, result))
+                tVal = 0
+
+            if latestTime is None or tVal > latestTime:
+                latestTime = tVal
+
+        slowList = tGroup.slowest(ComponentOperationGroup.NUM_SLOWEST,
+                                  ComponentOperationGroup.SLOW_SECS)
+        if len(slowList) > 0:
+            slowStr = []
+            for comp, secs in slowList:
+                slowStr.append("%s(%.2fs)" % (comp.fullName(), secs))
+            self.__runData.info("Subrun %d: slowest hubs: %s" %
+                                (id, ", ".join(slowStr)))
 
         if latestTime is None:
             raise RunSetException("Couldn't start subrun on any string hubs")
@@ -1629,9 +2211,19 @@ class RunSet(object):
             raise RunSetException("Couldn't start subrun on %s" %
                                   self.__listComponentsCommaSep(badComps))
 
-        for c in self.__set:
-            if c.isBuilder():
-                c.commitSubrun(id, repr(latestTime))
+        tGroup = ComponentOperationGroup(ComponentOperation.COMMIT_SUBRUN)
+        for c in builders:
+            tGroup.start(c, self.__runData, (id, repr(latestTime)))
+        tGroup.wait(waitSecs=self.SUBRUN_SECS)
+        tGroup.reportErrors(self.__runData, "commitSubrun")
+
+    def subrunLatency(self):
+        """
+        Return a (subrun number, {hub name : seconds}) tuple describing how
+        long each hub took to start the most recent subrun (seconds are
+        None for hubs which did not answer before the deadline)
+        """
+        return self.__subrunLatency
 
     def updateRates(self):
         if self.__runData is not None:
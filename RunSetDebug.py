@@ -9,9 +9,10 @@ class RunSetDebug(object):
 
     START_RUN = 0x100
     STOP_RUN = 0x200
+    TIMING = 0x400
 
     ALL = ACTDOM_TASK | MONI_TASK | RADAR_TASK | RATE_TASK | WATCH_TASK | \
-          START_RUN | STOP_RUN
+          START_RUN | STOP_RUN | TIMING
 
     NAME_MAP = {
         "activeDomsTask" : ACTDOM_TASK,
@@ -21,5 +22,6 @@ class RunSetDebug(object):
         "watchdogTask" : WATCH_TASK,
         "startRun" : START_RUN,
         "stopRun" : STOP_RUN,
+        "timing" : TIMING,
         "all" : ALL,
         }
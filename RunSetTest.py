@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 
-import unittest
+import os, shutil, tempfile, threading, time, unittest
 from LiveImports import LIVE_IMPORT
 from RunOption import RunOption
-from RunSet import RunSet, RunSetException
+from RunSet import LogStage, RunSet, RunSetException, StateNotifier
 
 CAUGHT_WARNING = False
 
@@ -13,6 +13,20 @@ class FakeLogger(object):
     def __init__(self): pass
     def stopServing(self): pass
 
+class FileLogger(object):
+    def __init__(self, path):
+        self.__fd = open(path, "a")
+        self.serving = True
+
+    def stopServing(self):
+        self.__fd.close()
+        self.serving = False
+
+class StagingRunSet(object):
+    def createComponentLog(self, runDir, c, host, port, liveHost, livePort,
+                           quiet=True):
+        return FileLogger(os.path.join(runDir, RunSet.componentLogName(c)))
+
 class FakeTaskManager(object):
     def __init__(self): pass
     def reset(self): pass
@@ -231,6 +245,13 @@ class TestRunSet(unittest.TestCase):
                 self.fail("Expected subrun to fail with \"%s\", not \"%s\"" %
                           (expectError, str(ve)))
 
+        (latencyNum, latency) = runset.subrunLatency()
+        self.assertEquals(subrunNum, latencyNum)
+        for c in compList:
+            if c.isSource():
+                self.failUnless(latency.has_key(c.fullName()),
+                                "No subrun latency for %s" % c.fullName())
+
         self.__checkStatus(runset, compList, expState)
         logger.checkStatus(10)
 
@@ -241,6 +262,9 @@ class TestRunSet(unittest.TestCase):
         expState = "ready"
 
         self.failIf(runset.stopRun(), "stopRun() encountered error")
+        self.failUnless(runset.waitForFinalize(10),
+                        "End-of-run jobs did not finish: %s" %
+                        runset.pendingFinalizeJobs())
 
         self.assertEqual(str(runset), 'RunSet #%d run#%d (%s)' %
                          (runset.id(), runNum, expState))
@@ -283,6 +307,8 @@ class TestRunSet(unittest.TestCase):
 
         expState = "configuring"
 
+        # configure() only repeats an unchanged wait message once a second
+        prevWaitStr = None
         i = 0
         while True:
             cfgWaitStr = None
@@ -296,8 +322,11 @@ class TestRunSet(unittest.TestCase):
             if cfgWaitStr is None:
                 break
 
-            logger.addExpectedExact("RunSet #%d (%s): Waiting for %s: %s" %
-                                    (expId, expState, expState, cfgWaitStr))
+            if cfgWaitStr != prevWaitStr:
+                logger.addExpectedExact("RunSet #%d (%s): Waiting for %s: %s" %
+                                        (expId, expState, expState,
+                                         cfgWaitStr))
+                prevWaitStr = cfgWaitStr
             i += 1
 
         runset.configure()
@@ -413,6 +442,61 @@ class TestRunSet(unittest.TestCase):
 
         self.__runTests(compList, 2)
 
+    def testStartLevelFailure(self):
+        compList = self.__buildCompList(("foo", "bar", "bazHub"))
+
+        runConfig = FakeRunConfig("XXXrunCfgXXX")
+        logger = MockLogger('LOG')
+
+        runset = MyRunSet(MyParent(), runConfig, compList, logger)
+        runset.configure()
+        logger.checkStatus(10)
+
+        # 'bar' is in the first level to be started
+        compList[1].reset()
+
+        global CAUGHT_WARNING
+        if not LIVE_IMPORT and not CAUGHT_WARNING:
+            CAUGHT_WARNING = True
+            logger.addExpectedRegexp(r"^Cannot import IceCube Live.*")
+
+        runNum = 543
+        clusterName = "cluster-foo"
+
+        logger.addExpectedExact("Starting run #%d with \"%s\"" %
+                                (runNum, clusterName))
+        logger.addExpectedRegexp(r"Version info: .*")
+        logger.addExpectedExact("Cluster configuration: %s" % clusterName)
+        logger.addExpectedExact("Run configuration: %s" % runConfig.basename())
+        logger.addExpectedExact("Starting run %d..." % runNum)
+        logger.addExpectedRegexp(r"START_RUN\(%s\): .*" %
+                                 compList[1].fullName())
+        logger.addExpectedExact("Thread group encountered 1 error during" +
+                                " startRun")
+
+        versionInfo = {"filename": "fName",
+                       "revision": "1234",
+                       "date": "date",
+                       "time": "time",
+                       "author": "author",
+                       "release": "rel",
+                       "repo_rev": "1repoRev",
+                       }
+
+        try:
+            runset.startRun(runNum, clusterName, RunOption.MONI_TO_NONE,
+                            versionInfo, "/tmp", None, "/tmp")
+            self.fail("startRun() should fail")
+        except RunSetException, rse:
+            self.failUnless(str(rse).find(compList[1].fullName()) > 0,
+                            "Unexpected exception \"%s\"" % rse)
+
+        # later levels are not started after a level fails
+        self.assertEquals(None, compList[0].runNum)
+        self.assertEquals(None, compList[2].runNum)
+
+        logger.checkStatus(10)
+
     def testSubrunGood(self):
 
         compList = self.__buildCompList(("fooHub", "barHub", "bazBuilder"))
@@ -548,5 +632,93 @@ class TestRunSet(unittest.TestCase):
         runset.restartAllComponents(clusterCfg, None, None, None, None,
                                     False, False, False)
 
+    def testReplaceComponents(self):
+        hub = MockComponent("fooHub", 1001)
+        hub.addOutput("hitData")
+        trig = MockComponent("barTrigger", 1)
+        trig.addInput("hitData", 1234)
+        compList = [hub, trig]
+
+        runConfig = FakeRunConfig("XXXrunCfgXXX")
+        logger = MockLogger('foo#0')
+
+        runset = MyRunSet(MyParent(), runConfig, compList, logger)
+
+        connMap = runset.buildConnectionMap()
+        runset.connect(connMap, logger)
+        runset.setOrder(connMap, logger)
+        runset.configure()
+        self.failUnless(runset.isReady(), "Runset should be ready")
+
+        clusterCfg = self.__buildClusterConfig([trig, ], "replace")
+
+        logger.addExpectedExact("Cycling components [%s]" % trig.fullName())
+
+        runset.reset()
+        runset.restartComponents([trig, ], clusterCfg, None, None, None,
+                                 None, False, False, False)
+
+        newTrig = MockComponent("barTrigger", 1)
+        newTrig.addInput("hitData", 5678)
+
+        runset.replaceComponents([trig, ], [newTrig, ], logger)
+
+        self.failUnless(runset.isReady(), "Repaired runset should be ready")
+        self.assertEquals(trig.order(), newTrig.order())
+        self.failUnless(self.__isCompListConfigured([hub, newTrig]),
+                        'Components should be configured')
+        self.__checkStatus(runset, [hub, newTrig], "ready")
+
+        logger.checkStatus(10)
+
+    def testLogStage(self):
+        logDir = tempfile.mkdtemp()
+        try:
+            runDir = os.path.join(logDir, "daqrun00123")
+            os.mkdir(runDir)
+
+            compList = [MockComponent("fooHub", 1001),
+                        MockComponent("barTrigger", 1)]
+
+            stage = LogStage(StagingRunSet(), logDir, compList, True)
+            stage.start(MockLogger("stage"))
+
+            logs = stage.commit(runDir, compList, True)
+            self.failIf(logs is None, "Staged logs were not committed")
+            for c in compList:
+                self.failUnless(logs[c].serving)
+                self.failUnless(os.path.exists(os.path.join(runDir,
+                                        RunSet.componentLogName(c))))
+                logs[c].stopServing()
+            self.assertEquals(["daqrun00123"], os.listdir(logDir))
+
+            # a stage built for different components is thrown away
+            stage = LogStage(StagingRunSet(), logDir, compList, True)
+            stage.start(MockLogger("stage"))
+            self.assertEquals(None, stage.commit(runDir, compList[:1], True))
+            self.assertEquals(["daqrun00123"], os.listdir(logDir))
+        finally:
+            shutil.rmtree(logDir, ignore_errors=True)
+
+    def testStateNotifier(self):
+        notifier = StateNotifier()
+
+        gen = notifier.generation()
+        start = time.time()
+        self.failIf(notifier.wait(gen, 0.1), "Unexpected notification")
+        self.failUnless(time.time() - start >= 0.1)
+
+        t = threading.Timer(0.1, notifier.notify)
+        t.start()
+        start = time.time()
+        self.failUnless(notifier.wait(gen, 5), "Notification was lost")
+        self.failUnless(time.time() - start < 1.0)
+        t.join()
+
+        # a notification which arrived before the wait isn't missed
+        gen = notifier.generation()
+        notifier.notify()
+        self.failUnless(notifier.wait(gen, 0))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#
+# Remember the most recent state seen for each component so that status
+# requests don't need to query every component
+
+import threading
+
+from CompOp import ComponentOperation, ComponentOperationGroup
+from utils import clock
+
+class StateQuery(object):
+    "A component state query which other callers can wait for"
+
+    def __init__(self, startSecs):
+        self.startSecs = startSecs
+        self.state = None
+        self.done = threading.Event()
+
+class StateCache(object):
+    """
+    Last known state of each component, along with the time it was seen.
+    States are recorded by the pool's liveness sweep, by components which
+    report their own state changes and by any caller which asks for a
+    state newer than the one in the cache.
+    """
+
+    def __init__(self):
+        # map component to (state, monotonic time)
+        self.__states = {}
+        # map component to the StateQuery currently asking for its state
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+    def __str__(self):
+        return "StateCache[%d components, %d pending]" % \
+            (len(self.__states), len(self.__pending))
+
+    def __recordInternal(self, comp, state, stamp):
+        "This method assumes that self.__lock has already been acquired"
+        if type(state) != str:
+            # ignore failed operations (exceptions, timeouts, etc.)
+            return
+
+        # don't replace a newer state (e.g. one reported by the component
+        # while we were querying it)
+        if not self.__states.has_key(comp) or \
+                self.__states[comp][1] <= stamp:
+            self.__states[comp] = (state, stamp)
+
+    def forget(self, comp):
+        "Discard the cached state for 'comp'"
+        self.__lock.acquire()
+        try:
+            if self.__states.has_key(comp):
+                del self.__states[comp]
+        finally:
+            self.__lock.release()
+
+    def get(self, comp):
+        """
+        Return a tuple containing the cached state for 'comp' and its age
+        in seconds, or None if no state has been recorded
+        """
+        self.__lock.acquire()
+        try:
+            if not self.__states.has_key(comp):
+                return None
+            (state, stamp) = self.__states[comp]
+        finally:
+            self.__lock.release()
+
+        return (state, clock.monotonic() - stamp)
+
+    def record(self, comp, state):
+        "Remember the current state of 'comp'"
+        self.__lock.acquire()
+        try:
+            self.__recordInternal(comp, state, clock.monotonic())
+        finally:
+            self.__lock.release()
+
+    def state(self, comp, maxAgeSecs, logger=None):
+        "Return the state of 'comp', no more than 'maxAgeSecs' seconds old"
+        return self.states([comp], maxAgeSecs, logger)[comp]
+
+    def states(self, compList, maxAgeSecs, logger=None):
+        """
+        Return a dictionary mapping each component in 'compList' to its
+        state.  Cached states which are no more than 'maxAgeSecs' seconds
+        old are used as-is, and the remaining components are queried in
+        parallel.  If another caller is already querying a component,
+        its answer is shared rather than sending a second request.
+        A 'maxAgeSecs' of 0 always queries the components.
+        """
+        now = clock.monotonic()
+        oldest = now - maxAgeSecs
+
+        rtnDict = {}
+        waitDict = {}
+        queryDict = {}
+
+        self.__lock.acquire()
+        try:
+            for c in compList:
+                if maxAgeSecs > 0 and self.__states.has_key(c) and \
+                        self.__states[c][1] >= oldest:
+                    rtnDict[c] = self.__states[c][0]
+                elif maxAgeSecs > 0 and self.__pending.has_key(c) and \
+                        self.__pending[c].startSecs >= oldest:
+                    waitDict[c] = self.__pending[c]
+                else:
+                    query = StateQuery(now)
+                    self.__pending[c] = query
+                    queryDict[c] = query
+        finally:
+            self.__lock.release()
+
+        if len(queryDict) > 0:
+            results = {}
+            try:
+                tGroup = ComponentOperationGroup(ComponentOperation.GET_STATE)
+                for c in queryDict:
+                    tGroup.start(c, logger, ())
+                tGroup.wait()
+                results = tGroup.results()
+            finally:
+                self.__lock.acquire()
+                try:
+                    for c in queryDict:
+                        query = queryDict[c]
+                        if results.has_key(c):
+                            self.__recordInternal(c, results[c], now)
+                            query.state = str(results[c])
+                        else:
+                            query.state = \
+                                str(ComponentOperation.RESULT_ERROR)
+
+                        if self.__pending.get(c) == query:
+                            del self.__pending[c]
+                        query.done.set()
+                        rtnDict[c] = query.state
+                finally:
+                    self.__lock.release()
+
+        for c in waitDict:
+            waitDict[c].done.wait()
+            rtnDict[c] = waitDict[c].state
+
+        return rtnDict
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import threading, time, unittest
+
+from CompOp import ComponentOperation
+from StateCache import StateCache
+
+class FakeComponent(object):
+    def __init__(self, name, state="idle", delay=None):
+        self.__name = name
+        self.__state = state
+        self.__delay = delay
+
+        self.numQueries = 0
+
+    def __str__(self):
+        return self.__name
+
+    def setState(self, state):
+        self.__state = state
+
+    def state(self):
+        self.numQueries += 1
+        if self.__delay is not None:
+            time.sleep(self.__delay)
+        if self.__state is None:
+            raise Exception("No state for %s" % self.__name)
+        return self.__state
+
+class StateCacheTest(unittest.TestCase):
+    def testEmpty(self):
+        cache = StateCache()
+        comp = FakeComponent("foo")
+
+        self.assertEquals(None, cache.get(comp))
+        self.assertEquals({}, cache.states([], 1.0))
+
+    def testMaxAge(self):
+        cache = StateCache()
+        comp = FakeComponent("foo")
+
+        self.assertEquals("idle", cache.state(comp, 10.0))
+        self.assertEquals(1, comp.numQueries)
+
+        comp.setState("ready")
+        self.assertEquals("idle", cache.state(comp, 10.0))
+        self.assertEquals(1, comp.numQueries)
+
+        (state, age) = cache.get(comp)
+        self.assertEquals("idle", state)
+        self.failIf(age < 0.0 or age > 10.0, "Bad age %s" % age)
+
+        # a maximum age of zero always queries the component
+        self.assertEquals("ready", cache.state(comp, 0))
+        self.assertEquals(2, comp.numQueries)
+        self.assertEquals("ready", cache.get(comp)[0])
+
+        cache.forget(comp)
+        self.assertEquals(None, cache.get(comp))
+
+    def testRecord(self):
+        cache = StateCache()
+        comp = FakeComponent("foo")
+
+        cache.record(comp, "running")
+        self.assertEquals("running", cache.state(comp, 10.0))
+        self.assertEquals(0, comp.numQueries)
+
+        # operation failures are not cached
+        cache.record(comp, ComponentOperation.RESULT_HANGING)
+        self.assertEquals("running", cache.get(comp)[0])
+
+    def testError(self):
+        cache = StateCache()
+        comp = FakeComponent("foo", state=None)
+
+        self.assertEquals(str(ComponentOperation.RESULT_ERROR),
+                          cache.state(comp, 10.0))
+        self.assertEquals(None, cache.get(comp))
+
+    def testSharedQuery(self):
+        cache = StateCache()
+        comp = FakeComponent("foo", delay=0.5)
+
+        results = []
+        def getState():
+            results.append(cache.state(comp, 10.0))
+
+        threads = []
+        for i in range(4):
+            t = threading.Thread(target=getState)
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join()
+
+        self.assertEquals(["idle", "idle", "idle", "idle"], results)
+        self.assertEquals(1, comp.numQueries)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 
-import datetime, sys, time, unittest
+import datetime, shutil, sys, tempfile, time, unittest
 
 from LiveImports import Prio
+from MonitorTask import MonitorTask
 from RadarTask import RadarThread
 from RunOption import RunOption
 from TaskManager import TaskManager
@@ -100,6 +101,12 @@ class MockComponent(object):
     def fileName(self):
         return "%s-%d" % (self.__name, self.__num)
 
+    def getBeanDictionary(self):
+        beanDict = {}
+        for b in self.__beanData:
+            beanDict[b] = self.__beanData[b].copy()
+        return beanDict
+
     def getBeanFields(self, beanName):
         return self.__beanData[beanName].keys()
 
@@ -144,6 +151,11 @@ class MockComponent(object):
 
     def wasUpdated(self): return self.__updatedRates
 
+class NoSnapshotComponent(MockComponent):
+    def getBeanDictionary(self):
+        # force MonitorThread to fall back to per-bean requests
+        return None
+
 class MockLiveMoni(object):
     def __init__(self):
         self.__expMoni = {}
@@ -218,6 +230,14 @@ class MockRunConfig(object):
     def monitorPeriod(self): return None
     def watchdogPeriod(self): return None
 
+class MonitorTaskManager(object):
+    def __init__(self):
+        self.timer = None
+
+    def createIntervalTimer(self, name, period):
+        self.timer = MockIntervalTimer(name)
+        return self.timer
+
 class MyTaskManager(TaskManager):
     def __init__(self, runset, dashlog, live, runDir, runCfg, moniType):
         self.__timerDict = {}
@@ -480,5 +500,38 @@ class TaskManagerTest(unittest.TestCase):
         runset.stopRunning()
         rst.stop()
 
+    def testSavedCalls(self):
+        snap = MockComponent("stringHub", 1)
+        snap.addBeanData("DataCollectorMonitor-XXX", "HitRate", 1.0)
+        single = MockComponent("eventBuilder", 0)
+        perBean = NoSnapshotComponent("secondaryBuilders", 0)
+
+        runset = MockRunSet([snap, single, perBean])
+
+        runDir = tempfile.mkdtemp()
+        try:
+            taskMgr = MonitorTaskManager()
+            task = MonitorTask(taskMgr, runset, MockLog(), None, runDir,
+                               RunOption.MONI_TO_FILE)
+
+            # nothing has been monitored before the first cycle
+            taskMgr.timer.trigger()
+            task.check()
+            task.waitUntilFinished()
+            self.assertEquals(0, task.cycleSavedCalls())
+
+            # the 3-bean snapshot saves 2 calls, a 1-bean snapshot saves
+            # nothing and the per-bean fallback saves nothing
+            for i in range(2):
+                taskMgr.timer.trigger()
+                task.check()
+                task.waitUntilFinished()
+                self.assertEquals(2, task.cycleSavedCalls())
+            self.assertEquals(4, task.totalSavedCalls())
+
+            task.close()
+        finally:
+            shutil.rmtree(runDir, ignore_errors=True)
+
 if __name__ == '__main__':
     unittest.main()
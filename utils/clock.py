@@ -0,0 +1,60 @@
+import time
+
+try:
+    import ctypes, ctypes.util
+except ImportError:
+    ctypes = None
+
+# from <linux/time.h>
+CLOCK_MONOTONIC = 1
+
+def __findClockGettime():
+    """Find the C library's clock_gettime() function.
+
+    Returns:
+        A ctypes function, or None if clock_gettime() is unavailable
+    """
+    if ctypes is None:
+        return None
+
+    for libname in ("rt", "c"):
+        path = ctypes.util.find_library(libname)
+        if path is None:
+            continue
+
+        try:
+            lib = ctypes.CDLL(path, use_errno=True)
+            func = lib.clock_gettime
+        except (OSError, AttributeError):
+            continue
+
+        func.argtypes = [ctypes.c_int, ctypes.POINTER(_TimeSpec)]
+        return func
+
+    return None
+
+if ctypes is not None:
+    class _TimeSpec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+__clock_gettime = __findClockGettime()
+
+def monotonic():
+    """Return the value (in fractional seconds) of a clock which never
+    goes backwards.  Only differences between values are meaningful.
+    Falls back to the wall clock if no monotonic clock is available.
+
+    Args:
+        None
+
+    Returns:
+        A float holding the number of seconds
+    """
+    if __clock_gettime is None:
+        return time.time()
+
+    ts = _TimeSpec()
+    if __clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+        return time.time()
+
+    return ts.tv_sec + ts.tv_nsec * 1.0E-9